@@ -3,35 +3,78 @@ Module AI Auto Input - Nhập liệu tự động bằng AI
 Người dùng chat văn bản, AI phân tích và tạo giao dịch
 """
 
-import google.generativeai as genai
-from config import GOOGLE_API_KEY_AUTO_INPUT
+from llm_backend import get_backend, backend_configured, generate_json, GeminiError
 from datetime import datetime
-import json
-import re
+from concurrent.futures import ThreadPoolExecutor
+from json_extract import JSONExtractError, ParseStats
+from transaction_parser import LocalTransactionParser, is_single_amount
+
+# Độ tin cậy tối thiểu để dùng kết quả phân tích cục bộ, thấp hơn thì hỏi AI
+LOCAL_CONFIDENCE_THRESHOLD = 0.8
+
+# Chế độ dán nhiều dòng: số dòng mỗi lần gọi AI và số lời gọi chạy song song tối đa
+BULK_CHUNK_LINES = 15
+BULK_MAX_CONCURRENCY = 3
+
+# Schema structured output của Gemini
+TRANSACTION_PROPERTIES = {
+    'type': {'type': 'STRING'},
+    'category': {'type': 'STRING'},
+    'amount': {'type': 'NUMBER'},
+    'description': {'type': 'STRING'},
+    'date': {'type': 'STRING'},
+}
+TRANSACTION_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': dict(TRANSACTION_PROPERTIES, is_transaction={'type': 'BOOLEAN'}),
+    'required': ['is_transaction'],
+}
+TRANSACTION_LIST_SCHEMA = {
+    'type': 'ARRAY',
+    'items': {
+        'type': 'OBJECT',
+        'properties': TRANSACTION_PROPERTIES,
+        'required': ['type', 'category', 'amount', 'description', 'date'],
+    },
+}
+
+try:
+    from config import GOOGLE_API_KEY_AUTO_INPUT
+except ImportError:
+    GOOGLE_API_KEY_AUTO_INPUT = None
 
 class AIAutoInput:
-    def __init__(self):
-        """Khởi tạo AI Auto Input"""
+    def __init__(self, backend=None):
+        """
+        Khởi tạo AI Auto Input
+        
+        Args:
+            backend: Backend LLM (mặc định theo cấu hình, xem llm_backend.py)
+        """
         self.api_key = GOOGLE_API_KEY_AUTO_INPUT
         
-        if not self.api_key or self.api_key.strip() == "":
-            self.model = None
-            return
+        # Bộ phân tích cục bộ cho các câu phổ biến ("cafe 50k", "nhận lương 15 triệu")
+        self.local_parser = LocalTransactionParser()
+        self.stats = {'local': 0, 'ai': 0}
+        self.last_error = None
+        # Thống kê phản hồi lệch định dạng JSON (dùng chung cho mọi lời gọi)
+        self.json_stats = ParseStats()
         
         try:
-            # Cấu hình Google Gemini
-            genai.configure(api_key=self.api_key)
-            
-            # Khởi tạo model
-            self.model = genai.GenerativeModel('gemini-2.5-flash')
-            
+            # Backend LLM dùng key riêng (None nếu chưa cấu hình key)
+            self.client = backend or get_backend(self.api_key)
         except Exception as e:
             print(f"Lỗi khởi tạo AI Auto Input: {e}")
-            self.model = None
+            self.client = None
     
     def is_available(self):
         """Kiểm tra AI có sẵn sàng không"""
-        return self.model is not None
+        return self.client is not None
+    
+    @staticmethod
+    def is_configured():
+        """Kiểm tra nhanh (chưa tạo AIAutoInput) đã cấu hình API key và thư viện chưa"""
+        return backend_configured(GOOGLE_API_KEY_AUTO_INPUT)
     
     def parse_transaction(self, user_message, available_categories):
         """
@@ -44,8 +87,17 @@ class AIAutoInput:
         Returns:
             dict: Thông tin giao dịch hoặc None nếu không phải giao dịch
         """
+        # Thử phân tích cục bộ trước, chỉ gọi AI khi độ tin cậy thấp
+        local_result, confidence = self.local_parser.parse(user_message, available_categories)
+        if local_result and confidence >= LOCAL_CONFIDENCE_THRESHOLD:
+            self.stats['local'] += 1
+            return local_result
+        
         if not self.is_available():
-            return None
+            return local_result
+        
+        self.stats['ai'] += 1
+        self.last_error = None
         
         # Tạo danh sách danh mục
         income_cats = ", ".join(available_categories.get('income', []))
@@ -102,25 +154,19 @@ CHỈ TRẢ VỀ JSON:
 """
         
         try:
-            # Gọi AI
-            response = self.model.generate_content(prompt)
-            result_text = response.text.strip()
-            
-            # Loại bỏ markdown code block nếu có
-            result_text = result_text.replace('```json', '').replace('```', '').strip()
+            # Gọi AI (structured output: phản hồi là JSON theo schema)
+            return generate_json(self.client, prompt, TRANSACTION_SCHEMA,
+                                 stats=self.json_stats, expect=dict)
             
-            # Parse JSON
-            result = json.loads(result_text)
-            
-            return result
-            
-        except json.JSONDecodeError as e:
-            print(f"Lỗi parse JSON: {e}")
-            print(f"Response: {result_text}")
-            return None
+        except JSONExtractError:
+            self.last_error = "AI trả về dữ liệu không đúng định dạng."
+            return local_result
+        except GeminiError as e:
+            self.last_error = e.message
+            return local_result
         except Exception as e:
-            print(f"Lỗi khi phân tích: {e}")
-            return None
+            self.last_error = f"Lỗi khi phân tích: {e}"
+            return local_result
     
     def extract_multiple_transactions(self, user_message, available_categories):
         """
@@ -131,6 +177,28 @@ CHỈ TRẢ VỀ JSON:
         if not self.is_available():
             return []
         
+        try:
+            return self._request_transactions(user_message, available_categories)
+            
+        except JSONExtractError:
+            self.last_error = "AI trả về dữ liệu không đúng định dạng."
+            return []
+        except GeminiError as e:
+            self.last_error = e.message
+            return []
+        except Exception as e:
+            self.last_error = f"Lỗi: {e}"
+            return []
+    
+    def _request_transactions(self, user_message, available_categories):
+        """
+        Một lời gọi AI trích xuất danh sách giao dịch
+        
+        Returns:
+            list giao dịch ([] nếu tin nhắn không có giao dịch)
+        Raises:
+            JSONExtractError, GeminiError hoặc lỗi khác khi gọi AI thất bại
+        """
         income_cats = ", ".join(available_categories.get('income', []))
         expense_cats = ", ".join(available_categories.get('expense', []))
         
@@ -141,10 +209,19 @@ DANH MỤC:
 - Thu nhập: {income_cats}
 - Chi tiêu: {expense_cats}
 
-TIN NHẮN: "{user_message}"
+TIN NHẮN (có thể gồm nhiều dòng, mỗi dòng một hoặc nhiều giao dịch):
+---
+{user_message}
+---
 
 Trả về JSON array các giao dịch, mỗi giao dịch có:
-- type, category, amount, description, date
+- type: "income" hoặc "expense"
+- category: Chọn từ danh sách trên, không phù hợp → "Khác"
+- amount: Số tiền (chỉ số; k = nghìn, tr = triệu)
+- description: Mô tả ngắn gọn
+- date: YYYY-MM-DD (hôm nay là {datetime.now().strftime('%Y-%m-%d')})
+
+Bỏ qua các dòng không phải giao dịch.
 
 VÍ DỤ:
 Input: "Hôm nay ăn sáng 30k, trưa 50k, tối 60k"
@@ -159,18 +236,107 @@ Nếu không có giao dịch → []
 CHỈ TRẢ VỀ JSON ARRAY:
 """
         
+        return generate_json(self.client, prompt, TRANSACTION_LIST_SCHEMA,
+                             stats=self.json_stats, expect=list)
+    
+    def extract_bulk(self, text, available_categories,
+                     chunk_lines=BULK_CHUNK_LINES, max_workers=BULK_MAX_CONCURRENCY):
+        """
+        Trích xuất giao dịch từ văn bản dán nhiều dòng (nhật ký, tin nhắn...)
+        
+        Dòng có đúng một số tiền và phân tích cục bộ đủ tin cậy thì không gọi AI;
+        các dòng còn lại được gộp thành từng nhóm chunk_lines dòng, mỗi nhóm một
+        lời gọi AI, chạy song song tối đa max_workers lời gọi.
+        Không truy cập database nên có thể gọi từ luồng nền.
+        
+        Returns:
+            dict: {'transactions': [...], 'api_calls': int, 'failed_chunks': int}
+            failed_chunks chỉ đếm nhóm gọi AI lỗi / trả dữ liệu sai định dạng,
+            không đếm nhóm không có giao dịch nào.
+        """
+        lines = [line.strip() for line in text.splitlines() if line.strip()]
+        
+        transactions = []
+        remaining = []
+        for line in lines:
+            if not is_single_amount(line):
+                remaining.append(line)
+                continue
+            result, confidence = self.local_parser.parse(line, available_categories)
+            if result and confidence >= LOCAL_CONFIDENCE_THRESHOLD:
+                transactions.append(result)
+            else:
+                remaining.append(line)
+        self.stats['local'] += len(transactions)
+        
+        chunks = [remaining[i:i + chunk_lines] for i in range(0, len(remaining), chunk_lines)]
+        if not chunks or not self.is_available():
+            return {'transactions': transactions, 'api_calls': 0, 'failed_chunks': len(chunks)}
+        
+        def run_chunk(chunk):
+            # None = lời gọi lỗi; [] = nhóm không có giao dịch (không phải lỗi)
+            try:
+                return self._request_transactions("\n".join(chunk), available_categories)
+            except JSONExtractError:
+                self.last_error = "AI trả về dữ liệu không đúng định dạng."
+            except GeminiError as e:
+                self.last_error = e.message
+            except Exception as e:
+                self.last_error = f"Lỗi: {e}"
+            return None
+        
+        self.stats['ai'] += len(chunks)
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as executor:
+            chunk_results = list(executor.map(run_chunk, chunks))
+        
+        failed = 0
+        for items in chunk_results:
+            if items is None:
+                failed += 1
+                continue
+            for item in items:
+                normalized = self._normalize_transaction(item, available_categories)
+                if normalized:
+                    transactions.append(normalized)
+        
+        return {'transactions': transactions, 'api_calls': len(chunks), 'failed_chunks': failed}
+    
+    @staticmethod
+    def _normalize_transaction(item, available_categories):
+        """Kiểm tra và chuẩn hóa một giao dịch do AI trả về, None nếu không hợp lệ"""
+        if not isinstance(item, dict):
+            return None
+        
+        trans_type = item.get('type')
+        if trans_type not in ('income', 'expense'):
+            return None
+        
         try:
-            response = self.model.generate_content(prompt)
-            result_text = response.text.strip()
-            result_text = result_text.replace('```json', '').replace('```', '').strip()
-            
-            transactions = json.loads(result_text)
-            
-            return transactions if isinstance(transactions, list) else []
-            
-        except Exception as e:
-            print(f"Lỗi: {e}")
-            return []
+            amount = float(item.get('amount', 0))
+        except (TypeError, ValueError):
+            return None
+        if amount <= 0:
+            return None
+        
+        category = item.get('category')
+        if category not in available_categories.get(trans_type, []):
+            category = 'Khác'
+        
+        date = str(item.get('date') or '')
+        try:
+            datetime.strptime(date, '%Y-%m-%d')
+        except ValueError:
+            date = datetime.now().strftime('%Y-%m-%d')
+        
+        return {
+            'is_transaction': True,
+            'type': trans_type,
+            'category': category,
+            'amount': amount,
+            'description': str(item.get('description') or category),
+            'date': date,
+            'source': 'ai'
+        }
     
     def confirm_transaction(self, transaction_info):
         """
@@ -0,0 +1,14 @@
+"""
+Module đọc cấu hình tùy chọn từ config.py
+Dùng chung cho các module AI, dịch vụ giá và quét hóa đơn; thiếu config.py
+hoặc thiếu tên cấu hình thì dùng giá trị mặc định.
+"""
+
+
+def config_value(name, default):
+    """Giá trị name trong config.py, default nếu không có"""
+    try:
+        import config
+        return getattr(config, name, default)
+    except ImportError:
+        return default
@@ -0,0 +1,181 @@
+"""
+Đo hiệu năng các tính năng AI bằng backend giả lập (không cần API key / mạng)
+
+Chạy:
+    python benchmark_ai.py
+    python benchmark_ai.py --latency 0.5 --lines 100
+    python benchmark_ai.py --cassette llm_cassette.json   (phát lại phản hồi đã ghi)
+    python benchmark_ai.py --malformed-rate 0.2           (phản hồi lệch định dạng JSON)
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from llm_backend import FakeBackend, CassetteBackend
+from ledger_version import init_ledger_version
+from ai_auto_input import AIAutoInput
+from chatbot import FinanceChatBot, ADVICE_QUESTION
+
+CATEGORIES = {
+    'income': ['Lương', 'Thưởng', 'Đầu tư', 'Khác'],
+    'expense': ['Ăn uống', 'Đi lại', 'Giải trí', 'Mua sắm', 'Hóa đơn', 'Y tế', 'Giáo dục', 'Khác'],
+}
+
+SIMPLE_MESSAGES = ["cafe 50k", "nhận lương 15 triệu", "hôm qua đổ xăng 1tr2",
+                   "thứ 2 mua sách 120k", "tiền điện 1 triệu 250"]
+VAGUE_MESSAGES = ["trả lại bạn tiền hôm trước đi chơi", "góp quỹ lớp một ít",
+                  "chuyển khoản cho mẹ như mọi tháng"]
+CHAT_QUESTIONS = ["Tháng này tôi chi tiêu thế nào?", "Làm sao để tiết kiệm hiệu quả?"]
+
+
+def create_database(path=':memory:'):
+    """Tạo database (mặc định trong bộ nhớ) với một ít giao dịch mẫu"""
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            type TEXT NOT NULL, category TEXT NOT NULL, amount REAL NOT NULL,
+            description TEXT, date TEXT NOT NULL, user_id INTEGER
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE budget_limits (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL,
+            month INTEGER NOT NULL, year INTEGER NOT NULL, limit_amount REAL NOT NULL,
+            UNIQUE(user_id, month, year)
+        )
+    ''')
+    init_ledger_version(cursor)
+    today = time.strftime('%Y-%m-%d')
+    cursor.executemany('''
+        INSERT INTO transactions (type, category, amount, description, date, user_id)
+        VALUES (?, ?, ?, ?, ?, 1)
+    ''', [('income', 'Lương', 15000000, 'Lương tháng', today),
+          ('expense', 'Ăn uống', 50000, 'Cafe', today),
+          ('expense', 'Đi lại', 200000, 'Đổ xăng', today)])
+    conn.commit()
+    return conn
+
+
+def report(name, seconds, **details):
+    extra = ", ".join(f"{key}={value}" for key, value in details.items())
+    print(f"{name:<38} {seconds * 1000:>10.1f} ms   {extra}")
+
+
+def bench_parse(backend, repeat):
+    """Nhập bằng AI từng câu: đường nhanh cục bộ so với câu phải hỏi LLM"""
+    ai = AIAutoInput(backend=backend)
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for message in SIMPLE_MESSAGES:
+            ai.parse_transaction(message, CATEGORIES)
+    elapsed = time.perf_counter() - start
+    report("parse_transaction (cục bộ)", elapsed / (repeat * len(SIMPLE_MESSAGES)),
+           local=ai.stats['local'], ai=ai.stats['ai'])
+
+    start = time.perf_counter()
+    for message in VAGUE_MESSAGES:
+        ai.parse_transaction(message, CATEGORIES)
+    elapsed = time.perf_counter() - start
+    report("parse_transaction (gọi LLM)", elapsed / len(VAGUE_MESSAGES), ai=ai.stats['ai'])
+
+
+def bench_bulk(backend, lines):
+    """Dán nhiều dòng: số lời gọi, thời gian và mức song song thực tế"""
+    ai = AIAutoInput(backend=backend)
+    text = "\n".join((SIMPLE_MESSAGES + VAGUE_MESSAGES)[i % 8] for i in range(lines))
+    calls_before = backend.stats.get('calls', 0)
+
+    start = time.perf_counter()
+    result = ai.extract_bulk(text, CATEGORIES)
+    elapsed = time.perf_counter() - start
+    report(f"extract_bulk ({lines} dòng)", elapsed,
+           transactions=len(result['transactions']), api_calls=result['api_calls'],
+           backend_calls=backend.stats.get('calls', 0) - calls_before,
+           max_concurrency=backend.stats.get('max_concurrency', '-'))
+
+
+def bench_json(backend, repeat):
+    """Tỉ lệ phản hồi JSON lệch định dạng và số lần phải gọi AI sửa lại"""
+    ai = AIAutoInput(backend=backend)
+    calls_before = backend.stats.get('calls', 0)
+
+    start = time.perf_counter()
+    for index in range(repeat):
+        ai.extract_multiple_transactions(VAGUE_MESSAGES[index % len(VAGUE_MESSAGES)], CATEGORIES)
+    elapsed = time.perf_counter() - start
+    stats = ai.json_stats.snapshot()
+    report(f"đọc JSON x{repeat}", elapsed / repeat,
+           clean=stats['clean'], recovered=stats['recovered'], repaired=stats['repaired'],
+           failed=stats['failed'], first_pass_fail=f"{stats['first_pass_failure_rate']:.0%}",
+           backend_calls=backend.stats.get('calls', 0) - calls_before)
+
+
+def bench_chat(backend, repeat, db_path):
+    """ChatBot: thời gian tới chunk đầu tiên, token mỗi lượt và hiệu quả cache phản hồi tư vấn"""
+    conn = create_database(db_path)
+
+    # Ghim tổng quan tháng vào mọi tin nhắn so với để model tự gọi hàm truy vấn
+    for use_tools in (False, True):
+        for question in CHAT_QUESTIONS:
+            bot = FinanceChatBot(1, conn, backend=backend, use_tools=use_tools)
+            request = bot.prepare_message(question, include_data=True)
+            start = time.perf_counter()
+            first_chunk = None
+            for _ in bot.stream_message(request):
+                if first_chunk is None:
+                    first_chunk = time.perf_counter() - start
+            total = time.perf_counter() - start
+            stats = bot.get_token_stats()
+            report(f"chat {'gọi hàm' if use_tools else 'ghim tổng quan'}: {question[:16]}",
+                   first_chunk or total, total_ms=f"{total * 1000:.1f}",
+                   prompt_tokens=stats.get('prompt_tokens'), tool_calls=stats.get('tool_calls', 0))
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        bot.run_request(bot.prepare_advice_request())
+    elapsed = time.perf_counter() - start
+    stats = bot.get_cache_stats()
+    report(f"'{ADVICE_QUESTION}' x{repeat}", elapsed / repeat,
+           hits=stats['hits'], misses=stats['misses'], hit_rate=f"{stats['hit_rate']:.0%}")
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Đo hiệu năng các tính năng AI offline")
+    parser.add_argument('--latency', type=float, default=0.3, help="Độ trễ mỗi lời gọi LLM (giây)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Độ trễ ngẫu nhiên thêm (giây)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Tỉ lệ lời gọi lỗi")
+    parser.add_argument('--malformed-rate', type=float, default=0.0,
+                        help="Tỉ lệ phản hồi JSON bị lệch định dạng")
+    parser.add_argument('--lines', type=int, default=50, help="Số dòng cho bài đo dán nhiều dòng")
+    parser.add_argument('--repeat', type=int, default=20, help="Số lần lặp")
+    parser.add_argument('--cassette', help="Phát lại phản hồi từ file cassette thay vì backend giả lập")
+    args = parser.parse_args()
+
+    if args.cassette:
+        backend = CassetteBackend(args.cassette, mode='replay')
+        print(f"Backend: cassette {args.cassette}")
+    else:
+        backend = FakeBackend(latency=args.latency, jitter=args.jitter,
+                              error_rate=args.error_rate, malformed_rate=args.malformed_rate,
+                              chunk_delay=0.01)
+        print(f"Backend: giả lập, độ trễ {args.latency}s, lỗi {args.error_rate:.0%}, "
+              f"JSON lệch {args.malformed_rate:.0%}")
+    print("-" * 90)
+
+    bench_parse(backend, args.repeat)
+    bench_bulk(backend, args.lines)
+    bench_json(backend, args.repeat)
+    # ChatBot gọi hàm bằng kết nối riêng nên cần database dạng file
+    with tempfile.TemporaryDirectory() as temp_dir:
+        bench_chat(backend, args.repeat, os.path.join(temp_dir, 'benchmark.db'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""
+Đo đánh đổi giữa dung lượng / độ trễ và độ chính xác của tiền xử lý ảnh hóa đơn
+
+Chạy:
+    python benchmark_ocr.py                      (tự tạo 3 hóa đơn mẫu 12 MP, đo offline)
+    python benchmark_ocr.py receipts/ --live     (gọi Gemini thật, cần GOOGLE_API_KEY_OCR)
+    python benchmark_ocr.py --batch 1 3 5        (thông lượng quét nhiều ảnh theo số luồng)
+
+Thư mục ảnh có thể kèm expected.json dạng
+    {"ten_anh.jpg": {"amount": 45000, "date": "2025-11-08", "merchant": "Highlands"}}
+để tính độ chính xác. Không có --live thì thời gian upload được ước lượng theo
+--bandwidth (Mbit/s) và phản hồi lấy từ backend giả lập.
+"""
+
+import argparse
+import glob
+import json
+import os
+import random
+import tempfile
+
+from PIL import Image, ImageDraw, ImageFont
+
+from llm_backend import FakeBackend
+from receipt_ocr import ReceiptOCR
+from receipt_batch import run_batch
+from transaction_parser import fold_text
+
+# (tên, tham số ReceiptOCR)
+CONFIGS = [
+    ("gốc (không xử lý)", {'preprocess': False}),
+    ("2048px JPEG q85", {'max_edge': 2048, 'quality': 85}),
+    ("1536px JPEG q75", {'max_edge': 1536, 'quality': 75}),
+    ("1536px WebP q75", {'max_edge': 1536, 'quality': 75, 'image_format': 'WEBP'}),
+    ("1536px JPEG q75 màu", {'max_edge': 1536, 'quality': 75, 'grayscale': False}),
+    ("1024px JPEG q70", {'max_edge': 1024, 'quality': 70}),
+    ("768px JPEG q60", {'max_edge': 768, 'quality': 60}),
+]
+
+SAMPLE_ITEMS = [("Cafe đen đá", 29000), ("Bạc xỉu", 35000), ("Bánh mì thịt", 25000),
+                ("Trà đào cam sả", 45000), ("Nước suối", 10000), ("Croissant", 32000)]
+
+
+def _load_font(size):
+    for name in ("DejaVuSans.ttf", "arial.ttf", "Arial.ttf"):
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
+
+def create_synthetic_receipts(folder, count, seed=0):
+    """Tạo ảnh hóa đơn giả 4032x3024 (như ảnh điện thoại, xoay bằng EXIF) kèm expected.json"""
+    rng = random.Random(seed)
+    font = _load_font(64)
+    expected = {}
+
+    for index in range(count):
+        photo = Image.effect_noise((4032, 3024), 40).convert('RGB')
+        photo = Image.blend(photo, Image.new('RGB', photo.size, (120, 90, 60)), 0.6)
+        draw = ImageDraw.Draw(photo)
+
+        left, top = rng.randint(900, 1300), rng.randint(150, 300)
+        draw.rectangle((left, top, left + 1700, top + 2600), fill=(245, 245, 240))
+
+        merchant = rng.choice(["HIGHLANDS COFFEE", "PHUC LONG", "CIRCLE K", "KATINAT"])
+        date = f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        lines = [merchant, f"Ngày: {date}", "-" * 28]
+        total = 0
+        for name, price in rng.sample(SAMPLE_ITEMS, 4):
+            quantity = rng.randint(1, 3)
+            total += price * quantity
+            lines.append(f"{quantity} x {name:<16} {price * quantity:>9,}")
+        lines += ["-" * 28, f"TỔNG CỘNG: {total:,} VND", "Cảm ơn quý khách!"]
+        for row, text in enumerate(lines):
+            draw.text((left + 80, top + 120 + row * 150), text, fill=(40, 40, 40), font=font)
+
+        # Ảnh lưu nằm ngang, EXIF yêu cầu xoay 90° như ảnh chụp dọc từ điện thoại
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        filename = f"receipt_{index + 1}.jpg"
+        photo.rotate(90, expand=True).save(os.path.join(folder, filename),
+                                          quality=95, exif=exif)
+        expected[filename] = {'amount': total, 'date': date, 'merchant': merchant}
+
+    with open(os.path.join(folder, 'expected.json'), 'w', encoding='utf-8') as f:
+        json.dump(expected, f, ensure_ascii=False, indent=1)
+
+
+def score(data, expected):
+    """Tỉ lệ trường khớp (số tiền, ngày, cửa hàng)"""
+    if not expected:
+        return None
+    checks = []
+    if 'amount' in expected:
+        checks.append(abs(float(data.get('amount', 0)) - float(expected['amount'])) < 1)
+    if 'date' in expected:
+        checks.append(data.get('date') == expected['date'])
+    if 'merchant' in expected:
+        checks.append(fold_text(expected['merchant']) in fold_text(str(data.get('merchant', ''))))
+    return sum(checks) / len(checks) if checks else None
+
+
+def run(images, expected, live, bandwidth_mbps):
+    print(f"{'Cấu hình':<22} {'Gốc':>9} {'Gửi đi':>9} {'Giảm':>6} {'Xử lý':>8} "
+          f"{'Upload*':>9} {'API':>8} {'Đúng':>6}")
+    print("-" * 86)
+
+    for name, options in CONFIGS:
+        backend = None if live else FakeBackend()
+        ocr = ReceiptOCR(backend=backend, **options)
+        totals = {'original': 0, 'upload': 0, 'prep': 0.0, 'api': 0.0}
+        scores = []
+
+        for path in images:
+            result = ocr.extract_receipt_info(path)
+            stats = result.get('stats', {})
+            totals['original'] += stats.get('original_bytes', 0)
+            totals['upload'] += stats.get('upload_bytes', 0)
+            totals['prep'] += stats.get('preprocess_ms', 0.0)
+            totals['api'] += stats.get('api_ms', 0.0)
+            if live and result['success']:
+                value = score(result['data'], expected.get(os.path.basename(path)))
+                if value is not None:
+                    scores.append(value)
+
+        count = len(images)
+        original_kb = totals['original'] / count / 1024
+        upload_kb = totals['upload'] / count / 1024
+        upload_ms = totals['upload'] / count * 8 / (bandwidth_mbps * 1e6) * 1000
+        accuracy = f"{sum(scores) / len(scores):.0%}" if scores else "-"
+        api = f"{totals['api'] / count:.0f}ms" if live else "-"
+        print(f"{name:<22} {original_kb:>7.0f}KB {upload_kb:>7.0f}KB "
+              f"{1 - upload_kb / original_kb:>6.0%} {totals['prep'] / count:>6.0f}ms "
+              f"{upload_ms:>7.0f}ms {api:>8} {accuracy:>6}")
+
+    print(f"* Ước lượng thời gian upload với đường truyền {bandwidth_mbps} Mbit/s")
+
+
+def run_batch_throughput(images, worker_counts, latency):
+    """Thông lượng quét nhiều ảnh theo số luồng (backend giả lập với độ trễ cố định)"""
+    print(f"{'Số luồng':<10} {'Tổng':>9} {'Ảnh/phút':>10} {'Lỗi':>5}")
+    print("-" * 38)
+    for workers in worker_counts:
+        ocr = ReceiptOCR(backend=FakeBackend(latency=latency))
+        results, elapsed, stats = run_batch(ocr, images, max_workers=workers)
+        print(f"{workers:<10} {elapsed:>8.1f}s {len(results) / elapsed * 60:>10.0f} "
+              f"{stats['failed']:>5}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tiền xử lý ảnh hóa đơn")
+    parser.add_argument('folder', nargs='?', help="Thư mục ảnh hóa đơn (mặc định: tạo ảnh mẫu)")
+    parser.add_argument('--synthetic', type=int, default=3, help="Số ảnh mẫu tự tạo")
+    parser.add_argument('--live', action='store_true', help="Gọi Gemini thật để đo độ chính xác")
+    parser.add_argument('--bandwidth', type=float, default=5.0, help="Băng thông upload (Mbit/s)")
+    parser.add_argument('--batch', type=int, nargs='+', metavar='N',
+                        help="Đo thông lượng quét nhiều ảnh với N luồng")
+    parser.add_argument('--latency', type=float, default=1.0,
+                        help="Độ trễ mỗi lời gọi của backend giả lập khi đo --batch (giây)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        folder = args.folder
+        if not folder:
+            folder = temp_dir
+            create_synthetic_receipts(folder, args.synthetic)
+
+        images = sorted(path for pattern in ('*.jpg', '*.jpeg', '*.png', '*.webp')
+                        for path in glob.glob(os.path.join(folder, pattern)))
+        if not images:
+            print(f"Không tìm thấy ảnh trong {folder}")
+            return
+
+        expected = {}
+        expected_path = os.path.join(folder, 'expected.json')
+        if os.path.exists(expected_path):
+            with open(expected_path, 'r', encoding='utf-8') as f:
+                expected = json.load(f)
+
+        if args.batch:
+            print(f"{len(images)} ảnh hóa đơn - backend giả lập, độ trễ {args.latency}s")
+            run_batch_throughput(images, args.batch, args.latency)
+            return
+
+        print(f"{len(images)} ảnh hóa đơn - {'Gemini' if args.live else 'backend giả lập'}")
+        run(images, expected, args.live, args.bandwidth)
+
+
+if __name__ == '__main__':
+    main()
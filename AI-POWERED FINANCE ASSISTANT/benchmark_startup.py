@@ -0,0 +1,153 @@
+"""
+Đo thời gian khởi động ứng dụng tới màn hình đăng nhập
+Mỗi lần đo chạy một tiến trình Python mới (khởi động lạnh của trình thông
+dịch, nhưng đã có file .pyc):
+    - python -X importtime -c "import finance_manager": tổng thời gian import
+      và các module nặng nhất;
+    - tạo LoginWindow và vẽ xong cửa sổ (cần màn hình; bỏ qua nếu không có).
+Thư viện nặng (matplotlib, reportlab, google-generativeai) chỉ được nạp khi
+dùng lần đầu; nếu chúng bị import lúc khởi động, hoặc thời gian vượt ngưỡng,
+script trả mã lỗi 1 để dùng làm bước kiểm tra hồi quy.
+
+Chạy:
+    python benchmark_startup.py
+    python benchmark_startup.py --runs 10 --max-import 0.4 --max-login 1.0
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Ngưỡng mặc định (giây)
+MAX_IMPORT_SECONDS = 0.5
+MAX_LOGIN_SECONDS = 1.0
+# Module không được import trước khi người dùng mở biểu đồ / xuất PDF / dùng AI
+DEFERRED_MODULES = ('matplotlib', 'reportlab', 'google.generativeai')
+
+# Mã thoát của tiến trình con khi không mở được cửa sổ Tk (không có màn hình)
+_NO_DISPLAY = 3
+
+_LOGIN_SCRIPT = f'''
+import sys, tkinter
+import finance_manager
+try:
+    window = finance_manager.LoginWindow()
+except tkinter.TclError as e:
+    print(e, file=sys.stderr)
+    sys.exit({_NO_DISPLAY})
+window.root.update()
+print('ready', flush=True)
+window.root.destroy()
+'''
+
+
+def _run_python(args, workdir):
+    # Chạy trong thư mục tạm để LoginWindow không tạo / sửa finance.db thật
+    env = dict(os.environ, PYTHONPATH=APP_DIR)
+    return subprocess.run([sys.executable, *args], cwd=workdir, env=env,
+                          capture_output=True, text=True, encoding='utf-8')
+
+
+def parse_importtime(stderr):
+    """
+    Đọc kết quả -X importtime
+
+    Returns:
+        list (tên module, thời gian riêng, thời gian tích lũy, độ sâu), thời gian tính bằng giây
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # dòng tiêu đề
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), int(fields[0]) / 1e6, int(fields[1]) / 1e6, depth))
+    return modules
+
+
+def measure_import(workdir):
+    """Một lần import finance_manager: (tổng thời gian, danh sách module)"""
+    result = _run_python(['-X', 'importtime', '-c', 'import finance_manager'], workdir)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    modules = parse_importtime(result.stderr)
+    total = next(cumulative for name, _, cumulative, _ in modules if name == 'finance_manager')
+    return total, modules
+
+
+def measure_login(workdir):
+    """Thời gian từ lúc chạy python tới khi cửa sổ đăng nhập vẽ xong; None nếu không có màn hình"""
+    start = time.perf_counter()
+    result = _run_python(['-c', _LOGIN_SCRIPT], workdir)
+    elapsed = time.perf_counter() - start
+    if result.returncode == _NO_DISPLAY:
+        return None
+    if result.returncode != 0 or 'ready' not in result.stdout:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return elapsed
+
+
+def heaviest(modules, count=10):
+    """Các module import trực tiếp từ finance_manager (hoặc cấp cao nhất) tốn nhiều thời gian nhất"""
+    top = [(name, cumulative) for name, _, cumulative, depth in modules
+           if depth <= 1 and name != 'finance_manager']
+    return sorted(top, key=lambda item: item[1], reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Đo thời gian khởi động tới màn hình đăng nhập")
+    parser.add_argument('--runs', type=int, default=5, help="Số lần đo (lấy trung vị)")
+    parser.add_argument('--max-import', type=float, default=MAX_IMPORT_SECONDS,
+                        help="Ngưỡng thời gian import finance_manager (giây)")
+    parser.add_argument('--max-login', type=float, default=MAX_LOGIN_SECONDS,
+                        help="Ngưỡng thời gian tới khi cửa sổ đăng nhập hiện (giây)")
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as workdir:
+        # Lần đầu có thể phải biên dịch .pyc: chạy bỏ đi một lần
+        _, modules = measure_import(workdir)
+        imports = [measure_import(workdir)[0] for _ in range(args.runs)]
+        import_time = statistics.median(imports)
+
+        print(f"Import finance_manager: trung vị {import_time * 1000:.0f} ms "
+              f"(min {min(imports) * 1000:.0f}, max {max(imports) * 1000:.0f}, {args.runs} lần)")
+        print("Module nặng nhất:")
+        for name, cumulative in heaviest(modules):
+            print(f"    {cumulative * 1000:8.1f} ms  {name}")
+
+        loaded = {name for name, _, _, _ in modules}
+        for module in DEFERRED_MODULES:
+            if module in loaded:
+                failures.append(f"{module} bị import lúc khởi động")
+        if import_time > args.max_import:
+            failures.append(f"import {import_time:.3f} s > {args.max_import} s")
+
+        login = measure_login(workdir)
+        if login is None:
+            print("Cửa sổ đăng nhập: bỏ qua (không có màn hình)")
+        else:
+            logins = [login] + [measure_login(workdir) for _ in range(args.runs - 1)]
+            login_time = statistics.median(logins)
+            print(f"Tới cửa sổ đăng nhập: trung vị {login_time * 1000:.0f} ms "
+                  f"(min {min(logins) * 1000:.0f}, max {max(logins) * 1000:.0f})")
+            if login_time > args.max_login:
+                failures.append(f"cửa sổ đăng nhập {login_time:.3f} s > {args.max_login} s")
+
+    if failures:
+        print("HỒI QUY: " + "; ".join(failures))
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+"""
+Module phân loại danh mục giao dịch ngay trên máy (không gọi AI)
+Dùng Naive Bayes trên các từ / cặp từ của mô tả, học dần từ các cặp
+(mô tả, danh mục) của chính người dùng và lưu số đếm trong SQLite.
+"""
+
+import math
+import threading
+from collections import defaultdict
+from transaction_parser import fold_text
+
+
+def tokenize(text):
+    """Tách mô tả thành từ đơn và cặp từ đã bỏ dấu (VD: 'Ăn phở' -> an, pho, an_pho)"""
+    words = [word for word in ''.join(ch if ch.isalnum() else ' '
+                                      for ch in fold_text(text or '')).split()
+             if not word.isdigit()]
+    return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+
+class CategoryClassifier:
+    """
+    Bộ phân loại Naive Bayes cho danh mục, mỗi người dùng một mô hình riêng
+
+    learn() / apply_learned() chạy trên luồng giao diện, predict() có thể được
+    gọi từ luồng nền (Nhập bằng AI): số đếm trong bộ nhớ được bảo vệ bằng khóa.
+    """
+
+    def __init__(self, conn, user_id):
+        """
+        Args:
+            conn: Kết nối SQLite của ứng dụng (chỉ dùng trên luồng giao diện)
+            user_id: ID người dùng
+        """
+        self.conn = conn
+        self.user_id = user_id
+
+        # Số đếm theo loại giao dịch: type -> category -> ...
+        self.doc_counts = defaultdict(lambda: defaultdict(int))
+        self.token_totals = defaultdict(lambda: defaultdict(int))
+        self.token_counts = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+        self.vocab = defaultdict(set)
+        # Số đếm đã ghi SQL nhưng chưa commit: chỉ cộng vào bộ nhớ khi commit xong
+        self._pending = []
+        self._lock = threading.Lock()
+
+        self._init_tables()
+        self._load()
+        if not self.doc_counts:
+            self.train_from_history()
+
+    def _init_tables(self):
+        """Tạo bảng lưu mô hình nếu chưa có"""
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS category_model_docs (
+                user_id INTEGER NOT NULL,
+                type TEXT NOT NULL,
+                category TEXT NOT NULL,
+                doc_count INTEGER NOT NULL DEFAULT 0,
+                token_total INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, type, category)
+            )
+        ''')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS category_model_tokens (
+                user_id INTEGER NOT NULL,
+                type TEXT NOT NULL,
+                category TEXT NOT NULL,
+                token TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, type, category, token)
+            )
+        ''')
+        self.conn.commit()
+
+    def _load(self):
+        """Nạp số đếm của người dùng vào bộ nhớ"""
+        rows = self.conn.execute('''
+            SELECT type, category, doc_count, token_total
+            FROM category_model_docs WHERE user_id = ?
+        ''', (self.user_id,)).fetchall()
+        for trans_type, category, doc_count, token_total in rows:
+            self.doc_counts[trans_type][category] = doc_count
+            self.token_totals[trans_type][category] = token_total
+
+        rows = self.conn.execute('''
+            SELECT type, category, token, count
+            FROM category_model_tokens WHERE user_id = ?
+        ''', (self.user_id,)).fetchall()
+        for trans_type, category, token, count in rows:
+            self.token_counts[trans_type][category][token] = count
+            self.vocab[trans_type].add(token)
+
+    def train_from_history(self):
+        """Huấn luyện lần đầu từ các giao dịch đã có của người dùng"""
+        try:
+            rows = self.conn.execute('''
+                SELECT type, category, description FROM transactions
+                WHERE user_id = ? AND description IS NOT NULL AND description != ''
+            ''', (self.user_id,)).fetchall()
+        except Exception as e:
+            print(f"Lỗi đọc lịch sử giao dịch để huấn luyện: {e}")
+            return 0
+
+        for trans_type, category, description in rows:
+            self.learn(description, category, trans_type)
+        self.conn.commit()
+        self.apply_learned()
+        return len(rows)
+
+    def learn(self, description, category, trans_type):
+        """
+        Cập nhật mô hình với một giao dịch mới (chi phí O(số từ trong mô tả))
+
+        Không gọi commit, để ghi cùng transaction với lệnh INSERT giao dịch.
+        Số đếm trong bộ nhớ chỉ đổi khi gọi apply_learned() sau commit (hoặc
+        bị bỏ bằng discard_learned() khi rollback).
+        """
+        tokens = tokenize(description)
+        if not tokens or not category:
+            return
+
+        self.conn.execute('''
+            INSERT INTO category_model_docs (user_id, type, category, doc_count, token_total)
+            VALUES (?, ?, ?, 1, ?)
+            ON CONFLICT(user_id, type, category) DO UPDATE SET
+                doc_count = doc_count + 1,
+                token_total = token_total + excluded.token_total
+        ''', (self.user_id, trans_type, category, len(tokens)))
+        self.conn.executemany('''
+            INSERT INTO category_model_tokens (user_id, type, category, token, count)
+            VALUES (?, ?, ?, ?, 1)
+            ON CONFLICT(user_id, type, category, token) DO UPDATE SET
+                count = count + 1
+        ''', [(self.user_id, trans_type, category, token) for token in tokens])
+        self._pending.append((trans_type, category, tokens))
+
+    def apply_learned(self):
+        """Cộng các lần learn() đã commit vào số đếm trong bộ nhớ"""
+        with self._lock:
+            for trans_type, category, tokens in self._pending:
+                self.doc_counts[trans_type][category] += 1
+                self.token_totals[trans_type][category] += len(tokens)
+                counts = self.token_counts[trans_type][category]
+                for token in tokens:
+                    counts[token] += 1
+                    self.vocab[trans_type].add(token)
+        self._pending = []
+
+    def discard_learned(self):
+        """Bỏ các lần learn() chưa commit (sau khi rollback)"""
+        self._pending = []
+
+    def predict(self, text, trans_type, allowed=None):
+        """
+        Dự đoán danh mục cho mô tả
+
+        Args:
+            text: Mô tả giao dịch
+            trans_type: 'income' hoặc 'expense'
+            allowed: Danh sách danh mục hợp lệ (None = tất cả danh mục đã học)
+
+        Returns:
+            (tên danh mục, xác suất 0..1) hoặc (None, 0.0) nếu chưa đủ dữ liệu
+        """
+        tokens = tokenize(text)
+        with self._lock:
+            return self._predict(tokens, trans_type, allowed)
+
+    def _predict(self, tokens, trans_type, allowed):
+        # Gọi khi đang giữ self._lock
+        doc_counts = self.doc_counts.get(trans_type)
+        if not doc_counts:
+            return None, 0.0
+
+        vocab = self.vocab.get(trans_type, ())
+        tokens = [token for token in tokens if token in vocab]
+        if not tokens:
+            return None, 0.0
+
+        categories = [c for c in doc_counts if allowed is None or c in allowed]
+        if not categories:
+            return None, 0.0
+
+        total_docs = sum(doc_counts.values())
+        vocab_size = len(vocab)
+        token_counts = self.token_counts[trans_type]
+        token_totals = self.token_totals[trans_type]
+
+        scores = {}
+        for category in categories:
+            counts = token_counts[category]
+            denominator = token_totals[category] + vocab_size
+            score = math.log(doc_counts[category] / total_docs)
+            for token in tokens:
+                score += math.log((counts.get(token, 0) + 1) / denominator)
+            scores[category] = score
+
+        best = max(scores, key=scores.get)
+        top = scores[best]
+        probability = 1.0 / sum(math.exp(score - top) for score in scores.values())
+        return best, probability
@@ -0,0 +1,399 @@
+"""
+Module quản lý cửa sổ biểu đồ thu chi (theo danh mục, theo tháng, theo năm)
+Mỗi loại biểu đồ chỉ có một cửa sổ; bấm lại nút thì đưa cửa sổ cũ lên trước và
+vẽ lại bằng dữ liệu mới. Figure được tạo một lần, lần sau chỉ đổi chiều cao cột
+và nhãn (set_height, set_y) rồi render Agg trên một luồng nền riêng;
+luồng Tk chỉ truy vấn SQL (một câu GROUP BY) và đặt ảnh kết quả lên cửa sổ.
+
+Các cửa sổ đang mở tự vẽ lại khi sổ giao dịch hoặc bộ lọc thay đổi: refresh()
+được gọi sau mỗi lần tải lại danh sách giao dịch và chỉ truy vấn lại khi
+phiên bản sổ (LedgerVersion) hoặc bộ lọc khác lần vẽ trước.
+"""
+
+import queue
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from tkinter import messagebox
+
+from ledger_version import LedgerVersion
+
+# Màu các phần biểu đồ tròn
+PIE_COLORS = ['#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', '#9966FF', '#FF9F40']
+INCOME_COLOR = '#4CAF50'
+EXPENSE_COLOR = '#f44336'
+BAR_WIDTH = 0.35
+
+# Độ phân giải Figure: kích thước pixel cửa sổ = inch x DPI
+DPI = 100
+# Kích thước nhỏ nhất khi render (cửa sổ đang thu nhỏ / kéo rất hẹp)
+MIN_SIZE = (200, 150)
+# Chờ người dùng kéo xong cửa sổ rồi mới vẽ lại theo kích thước mới
+RESIZE_DELAY_MS = 150
+POLL_MS = 30
+
+
+def category_totals(conn, user_id, month, year):
+    """Tổng chi tiêu theo danh mục; None nếu không có dữ liệu"""
+    query = '''
+        SELECT category, SUM(amount) FROM transactions
+        WHERE user_id = ? AND type = "expense"
+    '''
+    params = [user_id]
+    if month != "Tất cả":
+        query += ' AND strftime("%m", date) = ?'
+        params.append(month.zfill(2))
+    if year != "Tất cả":
+        query += ' AND strftime("%Y", date) = ?'
+        params.append(year)
+    rows = conn.execute(query + ' GROUP BY category', params).fetchall()
+    if not rows:
+        return None
+    return {'window_title': "Biểu Đồ Chi Tiêu Theo Danh Mục",
+            'title': 'Chi Tiêu Theo Danh Mục',
+            'labels': [row[0] for row in rows],
+            'values': [row[1] for row in rows]}
+
+
+def _income_expense(conn, group_expr, where, params):
+    rows = conn.execute(f'''
+        SELECT {group_expr} AS grp,
+               COALESCE(SUM(CASE WHEN type = "income" THEN amount END), 0),
+               COALESCE(SUM(CASE WHEN type = "expense" THEN amount END), 0)
+        FROM transactions WHERE {where}
+        GROUP BY grp ORDER BY grp
+    ''', params).fetchall()
+    return {row[0]: (row[1], row[2]) for row in rows}
+
+
+def monthly_totals(conn, user_id, year):
+    """Thu nhập / chi tiêu 12 tháng của một năm (tháng không có giao dịch = 0)"""
+    totals = _income_expense(conn, 'CAST(strftime("%m", date) AS INTEGER)',
+                             'user_id = ? AND strftime("%Y", date) = ?', (user_id, year))
+    months = range(1, 13)
+    return {'window_title': f"Biểu Đồ Tài Chính Năm {year}",
+            'title': f'Biểu Đồ Tài Chính Theo Tháng - Năm {year}',
+            'xlabel': 'Tháng',
+            'labels': [str(month) for month in months],
+            'income': [totals.get(month, (0, 0))[0] for month in months],
+            'expense': [totals.get(month, (0, 0))[1] for month in months]}
+
+
+def yearly_totals(conn, user_id):
+    """Thu nhập / chi tiêu theo từng năm có dữ liệu; None nếu chưa có giao dịch"""
+    totals = _income_expense(conn, 'strftime("%Y", date)', 'user_id = ?', (user_id,))
+    if not totals:
+        return None
+    years = sorted(totals)
+    return {'window_title': "Biểu Đồ Tài Chính Theo Năm",
+            'title': 'Biểu Đồ Tài Chính Theo Năm',
+            'xlabel': 'Năm',
+            'labels': years,
+            'income': [totals[year][0] for year in years],
+            'expense': [totals[year][1] for year in years]}
+
+
+class Chart:
+    """
+    Figure + FigureCanvasAgg của một cửa sổ (chỉ dùng trên luồng render)
+
+    Lớp con cài update(data): lần đầu tạo artist, các lần sau cập nhật tại chỗ.
+    """
+
+    def __init__(self, width, height):
+        # Import khi vẽ lần đầu, trên luồng render (không làm chậm giao diện)
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        self.figure = Figure(figsize=(width / DPI, height / DPI), dpi=DPI)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot(111)
+        self.size = (width, height)
+
+    def update(self, data):
+        raise NotImplementedError
+
+    def render(self, data, width, height):
+        """Cập nhật dữ liệu, render và trả ảnh PPM (Tk đọc trực tiếp, không cần PIL)"""
+        import numpy as np
+
+        if (width, height) != self.size:
+            self.figure.set_size_inches(width / DPI, height / DPI)
+            self.size = (width, height)
+        self.update(data)
+        self.canvas.draw()
+        rgb = np.asarray(self.canvas.buffer_rgba())[:, :, :3]
+        rows, columns = rgb.shape[:2]
+        return f'P6 {columns} {rows} 255\n'.encode('ascii') + rgb.tobytes()
+
+
+class CategoryChart(Chart):
+    """Biểu đồ tròn chi tiêu theo danh mục"""
+
+    def update(self, data):
+        # Số phần thay đổi theo danh mục nên vẽ lại phần tròn trong cùng Axes
+        # (Figure, canvas và cửa sổ vẫn giữ nguyên)
+        self.ax.clear()
+        self.ax.pie(data['values'], labels=data['labels'], autopct='%1.1f%%',
+                    startangle=90, colors=PIE_COLORS)
+        self.ax.set_title(data['title'], fontsize=14, fontweight='bold')
+
+
+class IncomeExpenseChart(Chart):
+    """Biểu đồ cột thu nhập / chi tiêu kèm phần trăm mỗi cột trong tổng thu + chi của nhóm"""
+
+    def __init__(self, width, height, label_fontsize=9, label_rotation=0):
+        super().__init__(width, height)
+        self.label_fontsize = label_fontsize
+        self.label_rotation = label_rotation
+        self.labels = None
+        self.bars = ()
+        self.texts = ()
+
+        self.ax.set_ylabel('Số tiền (VNĐ)', fontsize=12)
+        self.ax.grid(axis='y', alpha=0.3)
+
+    def _build(self, labels):
+        # Nhóm (tháng / năm) thay đổi: tạo lại cột, các lần sau chỉ set_height
+        for container in self.bars:
+            container.remove()
+        for text in self.texts:
+            text.remove()
+
+        x = range(len(labels))
+        zeros = [0] * len(labels)
+        self.bars = (
+            self.ax.bar([i - BAR_WIDTH / 2 for i in x], zeros, BAR_WIDTH,
+                        label='Thu nhập', color=INCOME_COLOR),
+            self.ax.bar([i + BAR_WIDTH / 2 for i in x], zeros, BAR_WIDTH,
+                        label='Chi tiêu', color=EXPENSE_COLOR),
+        )
+        self.texts = [self.ax.text(rect.get_x() + rect.get_width() / 2, 0, '',
+                                   ha='center', va='bottom', fontsize=self.label_fontsize,
+                                   color='black', rotation=self.label_rotation)
+                      for container in self.bars for rect in container]
+        self.ax.set_xticks(list(x))
+        self.ax.set_xticklabels(labels)
+        self.ax.legend()
+        self.labels = list(labels)
+
+    def update(self, data):
+        if data['labels'] != self.labels:
+            self._build(data['labels'])
+
+        totals = [income + expense for income, expense in zip(data['income'], data['expense'])]
+        rects = [rect for container in self.bars for rect in container]
+        values = list(data['income']) + list(data['expense'])
+        for index, (rect, text, value) in enumerate(zip(rects, self.texts, values)):
+            rect.set_height(value)
+            total = totals[index % len(totals)]
+            # Chỉ hiện phần trăm khi nhóm có giao dịch (tránh chia cho 0)
+            text.set_visible(total > 0)
+            if total > 0:
+                text.set_text(f'{value / total * 100:.0f}%')
+                text.set_y(value)
+
+        self.ax.set_xlabel(data['xlabel'], fontsize=12)
+        self.ax.set_title(data['title'], fontsize=14, fontweight='bold')
+        self.ax.relim()
+        self.ax.autoscale_view()
+
+
+# Loại biểu đồ: (kích thước cửa sổ mặc định, hàm tạo Chart)
+CHART_TYPES = {
+    'category': ((800, 600), CategoryChart),
+    'monthly': ((900, 600), lambda width, height: IncomeExpenseChart(
+        width, height, label_fontsize=8, label_rotation=45)),
+    'yearly': ((900, 600), IncomeExpenseChart),
+}
+
+
+class ChartView:
+    """Một cửa sổ biểu đồ đang mở (trạng thái trên luồng Tk)"""
+
+    def __init__(self, kind, window, label, size):
+        self.kind = kind
+        self.window = window
+        self.label = label
+        self.size = size
+        self.image = None
+        self.chart = None  # Chỉ luồng render đọc / ghi
+        self.key = None
+        self.data = None
+        self.rendering = False
+        self.dirty = False
+        self.closed = False
+        self.resize_job = None
+
+
+class ChartManager:
+    """
+    Giữ một cửa sổ cho mỗi loại biểu đồ và vẽ lại khi dữ liệu thay đổi
+
+    show / refresh / close chỉ gọi trên luồng giao diện; mọi thao tác với
+    matplotlib chạy trên một luồng render duy nhất nên không cần khóa Figure.
+    """
+
+    def __init__(self, root, conn, user_id, filters):
+        """
+        Args:
+            root: Cửa sổ Tk chính
+            conn: Kết nối SQLite của ứng dụng (chỉ dùng trên luồng giao diện)
+            user_id: ID người dùng
+            filters: Hàm trả (tháng, năm) đang chọn trong bộ lọc ("Tất cả" = không lọc)
+        """
+        self.root = root
+        self.conn = conn
+        self.user_id = user_id
+        self.filters = filters
+        self.ledger_version = LedgerVersion(conn)
+        self.views = {}
+        self.executor = None
+        self.results = queue.Queue()
+        self.polling = False
+        self.stats = {'renders': 0, 'refreshes': 0, 'skipped': 0}
+
+    def _params(self, kind):
+        month, year = self.filters()
+        if kind == 'category':
+            return (month, year)
+        if kind == 'monthly':
+            return (str(datetime.now().year) if year == "Tất cả" else year,)
+        return ()
+
+    def _query(self, kind, params):
+        if kind == 'category':
+            return category_totals(self.conn, self.user_id, *params)
+        if kind == 'monthly':
+            return monthly_totals(self.conn, self.user_id, *params)
+        return yearly_totals(self.conn, self.user_id)
+
+    def show(self, kind):
+        """Mở (hoặc đưa lên trước) cửa sổ biểu đồ và vẽ theo dữ liệu hiện tại"""
+        params = self._params(kind)
+        key = (self.ledger_version.current(), params)
+        view = self.views.get(kind)
+        if view is not None:
+            view.window.deiconify()
+            view.window.lift()
+            if key == view.key:
+                return
+
+        data = self._query(kind, params)
+        if data is None:
+            if view is None:
+                messagebox.showinfo("Thông báo", "Không có dữ liệu để hiển thị!")
+            return
+        self._submit(view or self._open(kind), data, key)
+
+    def refresh(self):
+        """Vẽ lại các cửa sổ đang mở nếu sổ giao dịch hoặc bộ lọc đã đổi (gọi sau mỗi lần ghi)"""
+        if not self.views:
+            return
+        version = self.ledger_version.current()
+        for kind, view in list(self.views.items()):
+            params = self._params(kind)
+            key = (version, params)
+            if key == view.key:
+                self.stats['skipped'] += 1
+                continue
+            self.stats['refreshes'] += 1
+            data = self._query(kind, params)
+            if data is None:
+                # Đã xóa hết giao dịch: giữ ảnh cũ, vẽ lại khi có dữ liệu
+                view.key = key
+                continue
+            self._submit(view, data, key)
+
+    def _open(self, kind):
+        (width, height), _ = CHART_TYPES[kind]
+        window = tk.Toplevel(self.root)
+        window.geometry(f"{width}x{height}")
+        window.configure(bg="white")
+        label = tk.Label(window, bg="white", bd=0, highlightthickness=0)
+        label.pack(fill=tk.BOTH, expand=True)
+
+        view = ChartView(kind, window, label, (width, height))
+        self.views[kind] = view
+        window.protocol("WM_DELETE_WINDOW", lambda: self._close_view(view))
+        window.bind('<Configure>', lambda event: self._on_configure(view, event))
+        return view
+
+    def _close_view(self, view):
+        view.closed = True
+        if self.views.get(view.kind) is view:
+            del self.views[view.kind]
+        view.window.destroy()
+
+    def _on_configure(self, view, event):
+        # Sự kiện của widget con cũng tới đây: chỉ xét chính cửa sổ
+        if event.widget is not view.window:
+            return
+        size = (max(event.width, MIN_SIZE[0]), max(event.height, MIN_SIZE[1]))
+        if size == view.size:
+            return
+        view.size = size
+        if view.resize_job is not None:
+            view.window.after_cancel(view.resize_job)
+        view.resize_job = view.window.after(RESIZE_DELAY_MS, lambda: self._rerender(view))
+
+    def _rerender(self, view):
+        view.resize_job = None
+        if not view.closed and view.data is not None:
+            self._submit(view, view.data, view.key)
+
+    def _submit(self, view, data, key):
+        view.window.title(data['window_title'])
+        view.data = data
+        view.key = key
+        # Đang render: chỉ đánh dấu, vẽ tiếp bằng dữ liệu mới nhất khi lượt hiện tại xong
+        if view.rendering:
+            view.dirty = True
+            return
+        view.rendering = True
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='chart-render')
+        self.executor.submit(self._render, view, data, view.size)
+        if not self.polling:
+            self.polling = True
+            self.root.after(POLL_MS, self._poll)
+
+    def _render(self, view, data, size):
+        # Chạy trên luồng render: Figure của mỗi cửa sổ chỉ luồng này chạm tới
+        try:
+            if view.chart is None:
+                view.chart = CHART_TYPES[view.kind][1](*size)
+            self.results.put((view, view.chart.render(data, *size), None))
+        except Exception as e:
+            self.results.put((view, None, e))
+
+    def _poll(self):
+        while True:
+            try:
+                view, ppm, error = self.results.get_nowait()
+            except queue.Empty:
+                break
+            view.rendering = False
+            if view.closed:
+                continue
+            if error is not None:
+                print(f"Lỗi vẽ biểu đồ: {error}")
+            else:
+                self.stats['renders'] += 1
+                view.image = tk.PhotoImage(master=view.window, data=ppm, format='PPM')
+                view.label.config(image=view.image)
+            if view.dirty:
+                view.dirty = False
+                self._submit(view, view.data, view.key)
+
+        if any(view.rendering for view in self.views.values()):
+            self.root.after(POLL_MS, self._poll)
+        else:
+            self.polling = False
+
+    def close(self):
+        """Đóng các cửa sổ biểu đồ và dừng luồng render"""
+        for view in list(self.views.values()):
+            self._close_view(view)
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
@@ -0,0 +1,131 @@
+"""
+Module quản lý lịch sử hội thoại của ChatBot theo ngân sách token
+Giữ nguyên văn N lượt gần nhất, gộp các lượt cũ hơn thành bản tóm tắt ngắn
+và chỉ gửi một bản dữ liệu tài chính mới nhất trong mỗi request.
+"""
+
+
+def estimate_tokens(text):
+    """Ước lượng số token của văn bản (~3 ký tự/token với tiếng Việt có dấu)"""
+    if not text:
+        return 0
+    return (len(text) + 2) // 3
+
+
+def _shorten(text, max_chars):
+    """Rút gọn văn bản về một dòng, tối đa max_chars ký tự"""
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars - 1].rstrip() + "…"
+
+
+class ChatHistoryManager:
+    """Lịch sử chat có giới hạn token, dùng để dựng nội dung gửi cho Gemini"""
+
+    def __init__(self, token_budget=4000, keep_turns=6, summary_token_budget=500):
+        """
+        Args:
+            token_budget: Số token tối đa cho phần lịch sử (tóm tắt + các lượt giữ lại)
+            keep_turns: Số lượt hỏi/đáp gần nhất được giữ nguyên văn
+            summary_token_budget: Số token tối đa của bản tóm tắt các lượt cũ
+        """
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.summary_token_budget = summary_token_budget
+
+        self.turns = []           # [(câu hỏi, câu trả lời), ...]
+        self.summary_lines = []   # Tóm tắt các lượt cũ đã gộp
+        self.context = None       # Dữ liệu tài chính mới nhất
+        self.last_request_stats = {}
+
+    def clear(self):
+        """Xóa toàn bộ lịch sử"""
+        self.turns = []
+        self.summary_lines = []
+        self.context = None
+        self.last_request_stats = {}
+
+    def set_context(self, context):
+        """Cập nhật dữ liệu tài chính (thay thế bản cũ, không cộng dồn)"""
+        self.context = context
+
+    def _turn_tokens(self, turn):
+        return estimate_tokens(turn[0]) + estimate_tokens(turn[1])
+
+    def _summary_text(self):
+        return "\n".join(self.summary_lines)
+
+    def history_tokens(self):
+        """Số token ước lượng của phần lịch sử hiện tại"""
+        return (estimate_tokens(self._summary_text()) +
+                sum(self._turn_tokens(turn) for turn in self.turns))
+
+    def add_turn(self, user_message, model_reply):
+        """Lưu một lượt hỏi/đáp và gộp các lượt cũ nếu vượt giới hạn"""
+        self.turns.append((user_message, model_reply))
+        self._compact()
+
+    def _compact(self):
+        """Gộp các lượt cũ vào bản tóm tắt cho tới khi nằm trong ngân sách token"""
+        while self.turns and (len(self.turns) > self.keep_turns or
+                              self.history_tokens() > self.token_budget):
+            question, answer = self.turns.pop(0)
+            self.summary_lines.append(
+                f"- Hỏi: {_shorten(question, 100)} → Đáp: {_shorten(answer, 160)}")
+
+            # Bỏ bớt các dòng tóm tắt cũ nhất nếu tóm tắt quá dài
+            while (len(self.summary_lines) > 1 and
+                   estimate_tokens(self._summary_text()) > self.summary_token_budget):
+                self.summary_lines.pop(0)
+
+    def build_contents(self, user_message):
+        """
+        Dựng danh sách nội dung gửi cho model
+
+        Thứ tự: [dữ liệu tài chính + tóm tắt] -> các lượt gần nhất -> câu hỏi mới.
+        Dữ liệu tài chính chỉ xuất hiện một lần ở đầu, không lặp lại theo từng lượt.
+        """
+        contents = []
+
+        preamble = []
+        if self.context:
+            preamble.append(f"Dữ liệu tài chính hiện tại của tôi:\n{self.context.strip()}")
+        if self.summary_lines:
+            preamble.append(f"Tóm tắt cuộc trò chuyện trước đó:\n{self._summary_text()}")
+        if preamble:
+            contents.append({'role': 'user', 'parts': ["\n\n".join(preamble)]})
+            contents.append({'role': 'model', 'parts': ["Đã nắm thông tin."]})
+
+        for question, answer in self.turns:
+            contents.append({'role': 'user', 'parts': [question]})
+            contents.append({'role': 'model', 'parts': [answer]})
+
+        contents.append({'role': 'user', 'parts': [user_message]})
+
+        self.measure(contents, history_turns=len(self.turns))
+        return contents
+
+    def measure(self, contents, history_turns=0):
+        """Ghi nhận số token ước lượng của request sắp gửi"""
+        self.last_request_stats = {
+            'estimated_prompt_tokens': sum(estimate_tokens(part)
+                                           for item in contents
+                                           for part in item['parts']),
+            'context_tokens': estimate_tokens(self.context),
+            'summary_tokens': estimate_tokens(self._summary_text()),
+            'history_turns': history_turns,
+        }
+
+    def record_usage(self, prompt_tokens=None, output_tokens=None, tool_calls=None):
+        """Ghi lại số token thực tế do API trả về (và số lần gọi hàm) cho request gần nhất"""
+        if prompt_tokens is not None:
+            self.last_request_stats['prompt_tokens'] = prompt_tokens
+        if output_tokens is not None:
+            self.last_request_stats['output_tokens'] = output_tokens
+        if tool_calls:
+            self.last_request_stats['tool_calls'] = tool_calls
+
+    def token_stats(self):
+        """Thống kê token của request gần nhất"""
+        return dict(self.last_request_stats)
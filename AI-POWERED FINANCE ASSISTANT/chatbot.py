@@ -3,37 +3,25 @@ Module ChatBot AI sử dụng Google Gemini
 Hỗ trợ phân tích và tư vấn tài chính cá nhân
 """
 
-import google.generativeai as genai
-from config import GOOGLE_API_KEY
+from llm_backend import get_backend, backend_configured, extract_function_calls, GeminiError
 import sqlite3
 from datetime import datetime
+from ledger_version import LedgerVersion
+from chat_history import ChatHistoryManager
+from response_cache import ResponseCache
+from finance_tools import FinanceTools, TOOL_DECLARATIONS
+from transaction_index import TransactionIndex
+
+MODEL_NAME = 'gemini-2.5-flash'
+ADVICE_QUESTION = "Cho tôi lời khuyên tài chính"
+
+# Số vòng gọi hàm tối đa cho một câu hỏi; vòng cuối buộc model trả lời bằng văn bản
+MAX_TOOL_ROUNDS = 3
+
+
+# Vai trò của trợ lý - truyền vào model dưới dạng system instruction
+SYSTEM_PROMPT = """Bạn là trợ lý tài chính thông minh giúp người dùng quản lý chi tiêu cá nhân.
 
-class FinanceChatBot:
-    def __init__(self, user_id, db_connection):
-        """Khởi tạo ChatBot với Google Gemini API"""
-        self.user_id = user_id
-        self.conn = db_connection
-        self.cursor = self.conn.cursor()
-        
-        # Kiểm tra API Key
-        if not GOOGLE_API_KEY or GOOGLE_API_KEY.strip() == "":
-            self.model = None
-            self.chat = None
-            return
-        
-        try:
-            # Cấu hình Google Gemini
-            genai.configure(api_key=GOOGLE_API_KEY)
-            
-            # Khởi tạo model (sử dụng gemini-2.5-flash - stable và miễn phí)
-            self.model = genai.GenerativeModel('gemini-2.5-flash')
-            
-            # Khởi tạo chat session
-            self.chat = self.model.start_chat(history=[])
-            
-            # System prompt
-            system_prompt = """Bạn là trợ lý tài chính thông minh giúp người dùng quản lý chi tiêu cá nhân.
-            
 Nhiệm vụ của bạn:
 - Phân tích dữ liệu chi tiêu và đưa ra lời khuyên cụ thể
 - Trả lời câu hỏi về tài chính cá nhân
@@ -43,29 +31,135 @@ Nhiệm vụ của bạn:
 
 Luôn trả lời bằng tiếng Việt, ngắn gọn, dễ hiểu và hữu ích.
 Sử dụng emoji phù hợp để làm câu trả lời sinh động hơn."""
-            
-            # Gửi system prompt
-            self.chat.send_message(system_prompt)
+
+# Bổ sung khi ChatBot tự truy vấn dữ liệu bằng function calling
+TOOLS_PROMPT = """
+
+Hôm nay là {today}. Khi câu hỏi cần số liệu thu chi, hãy gọi các hàm được cung cấp
+với đúng khoảng thời gian / danh mục người dùng hỏi (tự đổi "tháng trước", "quý này",
+"từ đầu năm"... thành ngày cụ thể), chỉ lấy dữ liệu cần thiết và không bịa số liệu.
+Câu hỏi chung không cần số liệu thì trả lời trực tiếp, không gọi hàm."""
+
+
+try:
+    from config import GOOGLE_API_KEY
+except ImportError:
+    GOOGLE_API_KEY = None
+
+
+class FinanceChatBot:
+    def __init__(self, user_id, db_connection, history_token_budget=4000,
+                 history_keep_turns=6, backend=None, use_tools=True, use_retrieval=True):
+        """
+        Khởi tạo ChatBot với Google Gemini API
+        
+        Args:
+            history_token_budget: Ngân sách token cho lịch sử hội thoại gửi kèm
+            history_keep_turns: Số lượt gần nhất được giữ nguyên văn
+            backend: Backend LLM (mặc định theo cấu hình, xem llm_backend.py)
+            use_tools: Cho model tự gọi hàm truy vấn dữ liệu (finance_tools.py)
+                thay vì gửi kèm tổng quan tháng trong mọi tin nhắn
+            use_retrieval: Gửi kèm bảng giao dịch khớp với câu hỏi (cửa hàng,
+                mô tả, danh mục) tìm bằng chỉ mục cục bộ (transaction_index.py)
+        """
+        self.user_id = user_id
+        self.conn = db_connection
+        self.cursor = self.conn.cursor()
+        self.history_token_budget = history_token_budget
+        self.history_keep_turns = history_keep_turns
+        
+        # Cache context tài chính, khóa theo (phiên bản sổ giao dịch, tháng hiện tại)
+        self.ledger_version = LedgerVersion(self.conn)
+        self._context_cache = {}
+        self._context_cache_key = None
+        self._has_user_id = None
+        
+        # Cache phản hồi cho các prompt tư vấn (chỉ phụ thuộc dữ liệu sổ giao dịch)
+        self.model_name = MODEL_NAME
+        self.response_cache = ResponseCache(self.conn)
+        
+        self.history = None
+        
+        # Chỉ mục giao dịch để trả lời câu hỏi về cửa hàng / mô tả cụ thể
+        self.index = TransactionIndex(self.conn, user_id) if use_retrieval else None
+        
+        # Hàm truy vấn chạy trên luồng nền -> kết nối riêng tới cùng file database
+        self.tools = None
+        if use_tools:
+            db_path = self._database_path()
+            if db_path:
+                self.tools = FinanceTools(db_path, user_id)
+        
+        try:
+            # Backend LLM dùng key riêng của ChatBot (None nếu chưa cấu hình key)
+            # Vai trò trợ lý được truyền qua system instruction nên không cần
+            # gửi thêm tin nhắn khởi tạo (không tốn round trip mạng lúc khởi động)
+            self.client = backend or get_backend(GOOGLE_API_KEY, self.model_name)
         except Exception as e:
             print(f"Lỗi khởi tạo ChatBot: {e}")
-            self.model = None
-            self.chat = None
+            self.client = None
     
     def is_available(self):
         """Kiểm tra ChatBot có sẵn sàng không"""
-        return self.model is not None and self.chat is not None
+        return self.client is not None
     
-    def _check_user_id_column(self):
-        """Kiểm tra xem bảng transactions có cột user_id không"""
+    @staticmethod
+    def is_configured():
+        """Kiểm tra nhanh (chưa tạo ChatBot) đã cấu hình API key và thư viện chưa"""
+        return backend_configured(GOOGLE_API_KEY)
+    
+    def _database_path(self):
+        """Đường dẫn file của database chính ('' nếu là database trong bộ nhớ)"""
         try:
-            self.cursor.execute("PRAGMA table_info(transactions)")
-            columns = [column[1] for column in self.cursor.fetchall()]
-            return 'user_id' in columns
-        except:
-            return False
+            for _, name, path in self.conn.execute("PRAGMA database_list"):
+                if name == 'main':
+                    return path
+        except sqlite3.Error:
+            pass
+        return ''
+    
+    def start_session(self):
+        """Tạo phiên hội thoại nếu chưa có (chỉ tạo đối tượng cục bộ, không gọi mạng)"""
+        if self.history is None:
+            self.history = ChatHistoryManager(token_budget=self.history_token_budget,
+                                              keep_turns=self.history_keep_turns)
+        return self.history
+    
+    def _check_user_id_column(self):
+        """Kiểm tra xem bảng transactions có cột user_id không (chỉ kiểm tra một lần)"""
+        if self._has_user_id is None:
+            try:
+                self.cursor.execute("PRAGMA table_info(transactions)")
+                columns = [column[1] for column in self.cursor.fetchall()]
+                self._has_user_id = 'user_id' in columns
+            except:
+                return False
+        return self._has_user_id
+    
+    def _cached(self, name, compute, *args):
+        """
+        Trả về kết quả đã tính nếu sổ giao dịch và tháng hiện tại không đổi
+        
+        Args:
+            name: Tên loại dữ liệu (summary, trend, ...)
+            compute: Hàm tính dữ liệu khi chưa có trong cache
+        """
+        key = (self.ledger_version.current(), datetime.now().strftime('%Y-%m'))
+        if key != self._context_cache_key:
+            self._context_cache = {}
+            self._context_cache_key = key
+        
+        cache_id = (name,) + args
+        if cache_id not in self._context_cache:
+            self._context_cache[cache_id] = compute(*args)
+        return self._context_cache[cache_id]
     
     def get_user_financial_summary(self):
         """Lấy tổng quan tài chính của user"""
+        return self._cached('summary', self._build_financial_summary)
+    
+    def _build_financial_summary(self):
+        """Truy vấn database và tạo tổng quan tài chính của user"""
         current_month = datetime.now().strftime('%Y-%m')
         
         has_user_id = self._check_user_id_column()
@@ -159,6 +253,10 @@ Sử dụng emoji phù hợp để làm câu trả lời sinh động hơn."""
         Returns:
             limit_amount (float) hoặc None
         """
+        return self._cached('budget_limit', self._query_budget_limit)
+    
+    def _query_budget_limit(self):
+        """Truy vấn hạn mức chi tiêu tháng hiện tại từ database"""
         try:
             month_int = int(datetime.now().strftime('%m'))
             year_int = int(datetime.now().strftime('%Y'))
@@ -173,6 +271,10 @@ Sử dụng emoji phù hợp để làm câu trả lời sinh động hơn."""
     
     def get_spending_trend(self, months=3):
         """Phân tích xu hướng chi tiêu"""
+        return self._cached('trend', self._build_spending_trend, months)
+    
+    def _build_spending_trend(self, months):
+        """Truy vấn database và tạo văn bản xu hướng chi tiêu"""
         has_user_id = self._check_user_id_column()
         
         if has_user_id:
@@ -213,6 +315,191 @@ Sử dụng emoji phù hợp để làm câu trả lời sinh động hơn."""
         
         return trend_text
     
+    def prepare_message(self, user_message, include_data=True):
+        """
+        Chuẩn bị request gửi đến ChatBot (có truy vấn database)
+        
+        Phải gọi trên luồng giao diện vì dùng chung kết nối SQLite với ứng dụng.
+        
+        Returns:
+            dict: {'message': câu hỏi, 'contents': nội dung gửi cho model}
+        """
+        history = self.start_session()
+        use_tools = include_data and self.tools is not None
+        if use_tools:
+            # Model tự gọi hàm lấy đúng số liệu cần, không ghim tổng quan tháng
+            history.set_context(None)
+        elif include_data:
+            # Dữ liệu tài chính được ghim ở đầu request, thay thế bản cũ
+            history.set_context(self.get_user_financial_summary())
+        
+        contents = history.build_contents(user_message)
+        if include_data and self.index is not None:
+            # Chỉ gửi kèm các giao dịch liên quan, không lưu bảng này vào lịch sử
+            retrieved = self.index.build_context(user_message)
+            if retrieved:
+                contents[-1] = {'role': 'user', 'parts': [
+                    f"Dữ liệu liên quan trong sổ giao dịch của tôi:\n{retrieved}\n\n"
+                    f"Câu hỏi: {user_message}"]}
+                history.measure(contents, history_turns=len(history.turns))
+        
+        return {
+            'message': user_message,
+            'contents': contents,
+            'use_tools': use_tools
+        }
+    
+    def prepare_cached_request(self, prompt, display_message):
+        """
+        Chuẩn bị request cho prompt tư vấn chỉ phụ thuộc dữ liệu sổ giao dịch
+        
+        Prompt được gửi độc lập (không kèm lịch sử) để kết quả có thể cache.
+        Nếu cache có sẵn phản hồi, request sẽ không gọi mạng.
+        
+        Args:
+            prompt: Prompt đầy đủ gửi cho model
+            display_message: Câu hỏi ngắn lưu vào lịch sử hội thoại
+        """
+        history = self.start_session()
+        contents = [{'role': 'user', 'parts': [prompt]}]
+        history.measure(contents)
+        
+        cache_key = ResponseCache.make_key(prompt, self.model_name,
+                                           self.ledger_version.current())
+        return {
+            'message': display_message,
+            'contents': contents,
+            'cache_key': cache_key,
+            'cached_reply': self.response_cache.get(cache_key)
+        }
+    
+    def stream_message(self, request, stop_event=None):
+        """
+        Gửi request và trả về từng đoạn phản hồi ngay khi Gemini sinh ra
+        
+        Không dùng kết nối SQLite của giao diện nên có thể chạy trên luồng nền
+        (các hàm model gọi dùng kết nối riêng của FinanceTools).
+        
+        Args:
+            request: Request đã chuẩn bị bởi prepare_message
+            stop_event: threading.Event - khi được set thì dừng nhận phản hồi
+        
+        Yields:
+            str: Từng đoạn văn bản của câu trả lời
+        """
+        history = self.start_session()
+        
+        # Cache hit -> trả về ngay, không gọi mạng
+        if request.get('cached_reply') is not None:
+            request['reply'] = request['cached_reply']
+            history.add_turn(request['message'], request['reply'])
+            yield request['reply']
+            return
+        
+        contents = list(request['contents'])
+        use_tools = request.get('use_tools') and self.tools is not None
+        if use_tools:
+            system_instruction = SYSTEM_PROMPT + TOOLS_PROMPT.format(
+                today=datetime.now().strftime('%Y-%m-%d'))
+            tool_options = {'tools': [{'function_declarations': TOOL_DECLARATIONS}]}
+        else:
+            system_instruction = SYSTEM_PROMPT
+            tool_options = {}
+        
+        parts = []
+        prompt_tokens = output_tokens = None
+        request['tool_calls'] = []
+        for tool_round in range(MAX_TOOL_ROUNDS + 1):
+            if use_tools and tool_round == MAX_TOOL_ROUNDS:
+                # Hết lượt gọi hàm -> buộc trả lời bằng dữ liệu đã có
+                tool_options['tool_config'] = {'function_calling_config': {'mode': 'NONE'}}
+            
+            response = self.client.generate(contents, stream=True,
+                                            system_instruction=system_instruction,
+                                            **tool_options)
+            calls = []
+            for chunk in response:
+                if stop_event is not None and stop_event.is_set():
+                    # Phản hồi bị dừng giữa chừng -> không lưu lượt này vào lịch sử
+                    return
+                if use_tools:
+                    calls.extend(extract_function_calls(chunk))
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunk không có phần văn bản (VD: chỉ có lời gọi hàm / thông tin an toàn)
+                    continue
+                if text:
+                    parts.append(text)
+                    yield text
+            
+            usage = getattr(response, 'usage_metadata', None)
+            if usage is not None:
+                prompt_tokens = (prompt_tokens or 0) + (getattr(usage, 'prompt_token_count', 0) or 0)
+                output_tokens = (output_tokens or 0) + (getattr(usage, 'candidates_token_count', 0) or 0)
+            if not calls:
+                break
+            
+            # Chạy các hàm model yêu cầu rồi gửi kết quả lại trong cùng lượt hỏi
+            request['tool_calls'].extend(calls)
+            contents.append({'role': 'model', 'parts': [
+                {'function_call': {'name': name, 'args': args}} for name, args in calls]})
+            contents.append({'role': 'user', 'parts': [
+                {'function_response': {'name': name, 'response': self.tools.call(name, args)}}
+                for name, args in calls]})
+        
+        # Bị dừng / cửa sổ đã đóng trong lúc chờ model -> không lưu lượt này
+        if stop_event is not None and stop_event.is_set():
+            return
+        
+        # Lưu lượt hỏi/đáp (chỉ câu hỏi gốc, không kèm dữ liệu tài chính)
+        request['reply'] = "".join(parts)
+        history.add_turn(request['message'], request['reply'])
+        history.record_usage(prompt_tokens, output_tokens, len(request['tool_calls']))
+    
+    def complete_request(self, request):
+        """
+        Hoàn tất request sau khi stream xong: lưu phản hồi vào cache nếu cần
+        
+        Gọi trên luồng giao diện (ghi vào SQLite).
+        """
+        if (request.get('cache_key') and request.get('reply')
+                and request.get('cached_reply') is None):
+            self.response_cache.put(request['cache_key'], self.model_name,
+                                    request['reply'])
+    
+    def run_request(self, request):
+        """Gửi request và chờ toàn bộ phản hồi (dùng cho lời gọi đồng bộ)"""
+        try:
+            reply = "".join(self.stream_message(request))
+            self.complete_request(request)
+            return reply
+        except Exception as e:
+            return self.format_error(e)
+    
+    def get_cache_stats(self):
+        """Thống kê hit/miss của cache phản hồi"""
+        return self.response_cache.stats()
+    
+    def get_token_stats(self):
+        """Thống kê token của request gần nhất (ước lượng và thực tế từ API)"""
+        if self.history is None:
+            return {}
+        return self.history.token_stats()
+    
+    @staticmethod
+    def format_error(error):
+        """Chuyển lỗi từ Gemini thành thông báo thân thiện"""
+        if isinstance(error, GeminiError):
+            return f"❌ {error.message}"
+        error_msg = str(error).lower()
+        if "api key" in error_msg or "invalid" in error_msg:
+            return "❌ Lỗi: API Key không hợp lệ. Vui lòng kiểm tra lại config.py"
+        elif "quota" in error_msg or "limit" in error_msg:
+            return "❌ Đã vượt quá giới hạn API. Vui lòng thử lại sau."
+        else:
+            return f"❌ Có lỗi xảy ra: {str(error)}"
+    
     def chat_with_context(self, user_message, include_data=True):
         """
         Gửi tin nhắn đến ChatBot với context tài chính
@@ -226,31 +513,27 @@ Sử dụng emoji phù hợp để làm câu trả lời sinh động hơn."""
         
         try:
             # Thêm context về dữ liệu tài chính nếu cần
-            if include_data:
-                financial_summary = self.get_user_financial_summary()
-                full_message = f"{financial_summary}\n\n❓ Câu hỏi: {user_message}"
-            else:
-                full_message = user_message
-            
-            # Gửi tin nhắn và nhận phản hồi
-            response = self.chat.send_message(full_message)
-            
-            return response.text
-            
+            request = self.prepare_message(user_message, include_data)
         except Exception as e:
-            error_msg = str(e).lower()
-            if "api key" in error_msg or "invalid" in error_msg:
-                return "❌ Lỗi: API Key không hợp lệ. Vui lòng kiểm tra lại config.py"
-            elif "quota" in error_msg or "limit" in error_msg:
-                return "❌ Đã vượt quá giới hạn API. Vui lòng thử lại sau."
-            else:
-                return f"❌ Có lỗi xảy ra: {str(e)}"
+            return self.format_error(e)
+        
+        # Gửi tin nhắn và nhận phản hồi
+        return self.run_request(request)
     
     def get_financial_advice(self):
         """Lấy lời khuyên tài chính tự động"""
         if not self.is_available():
             return "❌ ChatBot chưa được cấu hình. Vui lòng nhập API Key trong file config.py"
         
+        return self.run_request(self.prepare_advice_request())
+    
+    def prepare_advice_request(self):
+        """Chuẩn bị request lời khuyên tài chính (có cache)"""
+        prompt = self._cached('advice_prompt', self._build_advice_prompt)
+        return self.prepare_cached_request(prompt, ADVICE_QUESTION)
+    
+    def _build_advice_prompt(self):
+        """Tạo prompt lời khuyên từ tổng quan, xu hướng và hạn mức"""
         summary = self.get_user_financial_summary()
         trend = self.get_spending_trend(3)
         
@@ -287,14 +570,22 @@ Mỗi lời khuyên nên:
 - Có thể thực hiện được ngay
 - Phù hợp với tình hình tài chính hiện tại và hạn mức nếu có
 """
-
-        return self.chat_with_context(prompt, include_data=False)
+        return prompt
     
     def analyze_category(self, category):
         """Phân tích chi tiêu theo danh mục cụ thể"""
         if not self.is_available():
             return "❌ ChatBot chưa được cấu hình. Vui lòng nhập API Key trong file config.py"
         
+        return self.run_request(self.prepare_category_request(category))
+    
+    def prepare_category_request(self, category):
+        """Chuẩn bị request phân tích danh mục (có cache)"""
+        prompt = self._cached('category_prompt', self._build_category_prompt, category)
+        return self.prepare_cached_request(prompt, f"Phân tích danh mục '{category}'")
+    
+    def _build_category_prompt(self, category):
+        """Truy vấn database và tạo prompt phân tích danh mục"""
         current_month = datetime.now().strftime('%Y-%m')
         has_user_id = self._check_user_id_column()
         
@@ -368,19 +659,13 @@ Hãy phân tích:
 2. Có cách nào tối ưu chi phí cho danh mục này?
 3. Đưa ra 2-3 gợi ý cụ thể để cải thiện.
 """
-        
-        return self.chat_with_context(prompt, include_data=False)
+        return prompt
     
     def ask_question(self, question):
         """Hỏi câu hỏi thông thường"""
         return self.chat_with_context(question, include_data=True)
     
     def clear_history(self):
-        """Reset lịch sử chat"""
-        if not self.is_available():
-            return
-        
-        try:
-            self.chat = self.model.start_chat(history=[])
-        except:
-            pass
+        """Reset lịch sử chat (không cần gọi mạng)"""
+        if self.history is not None:
+            self.history.clear()
@@ -1,24 +1,23 @@
 import sqlite3
+import os
+import threading
+import queue
+import time
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 from datetime import datetime
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
 import calendar
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.enums import TA_CENTER, TA_RIGHT
-import hashlib
+# matplotlib, reportlab, google-generativeai chỉ được import khi vẽ biểu đồ / xuất PDF /
+# gọi AI lần đầu để màn hình đăng nhập hiện nhanh (đo bằng benchmark_startup.py)
+from ledger_version import init_ledger_version
+from category_classifier import CategoryClassifier
+from transaction_parser import parse_amount_input
+from lazy_service import LazyService
+from chart_manager import ChartManager
 
 # Import ChatBot module
 try:
-    from chatbot import FinanceChatBot
+    from chatbot import FinanceChatBot, ADVICE_QUESTION
     CHATBOT_AVAILABLE = True
 except ImportError:
     CHATBOT_AVAILABLE = False
@@ -35,6 +34,9 @@ except ImportError:
 # Import Receipt OCR module
 try:
     from receipt_ocr import ReceiptOCR
+    from receipt_preprocess import format_bytes
+    from ocr_cache import OCRCache
+    from receipt_batch import ReceiptBatchScanner, find_images
     OCR_AVAILABLE = True
 except ImportError:
     OCR_AVAILABLE = False
@@ -42,12 +44,24 @@ except ImportError:
 
 # Import Gold Price module
 try:
-    from gold_price import GoldPriceAPI
+    from quote_service import QuoteService
+    from quote_store import QuoteStore
+    from price_history import PriceHistory
+    from quote_providers import GRAMS_PER_CHI, GRAMS_PER_OUNCE
+    from refresh_scheduler import RefreshScheduler
     GOLD_PRICE_AVAILABLE = True
 except ImportError:
     GOLD_PRICE_AVAILABLE = False
     print("Cảnh báo: Không thể import Gold Price API")
 
+# Import Portfolio module
+try:
+    from portfolio import Portfolio, ASSET_TYPES, init_portfolio_tables
+    PORTFOLIO_AVAILABLE = True
+except ImportError:
+    PORTFOLIO_AVAILABLE = False
+    print("Cảnh báo: Không thể import Portfolio. Vui lòng cài đặt: pip install numpy requests")
+
 class FinanceManager:
     def __init__(self, root, user_id):
         self.root = root
@@ -62,52 +76,104 @@ class FinanceManager:
         # Khởi tạo database
         self.init_database()
         
-        # Khởi tạo ChatBot
+        # Bộ phân loại danh mục học từ lịch sử giao dịch của người dùng
+        self.category_classifier = CategoryClassifier(self.conn, user_id)
+        self.category_user_selected = False
+        
+        # Cửa sổ biểu đồ thu chi: mỗi loại một cửa sổ, vẽ lại khi sổ giao dịch / bộ lọc đổi
+        self.chart_manager = ChartManager(
+            self.root, self.conn, user_id,
+            filters=lambda: (self.filter_month_var.get(), self.filter_year_var.get()))
+        
+        self.latest_quotes = {}
+        self.valuation = None
+        self.portfolio_refresh = None
+        
+        # ChatBot, Nhập bằng AI, Quét hóa đơn và dịch vụ giá chỉ được tạo ở lần dùng
+        # đầu tiên: cửa sổ chính hiện ngay, không chờ cấu hình SDK AI hay mạng
+        self.services = {}
+        # Tài sản nắm giữ, định giá lại mỗi khi có giá mới (cần numpy)
+        if PORTFOLIO_AVAILABLE:
+            self.services['portfolio'] = LazyService(
+                "Portfolio", lambda: Portfolio(self.conn, user_id), probe=Portfolio.is_available)
         if CHATBOT_AVAILABLE:
-            try:
-                self.chatbot = FinanceChatBot(user_id, self.conn)
-            except Exception as e:
-                print(f"Lỗi khởi tạo ChatBot: {e}")
-                self.chatbot = None
-        else:
-            self.chatbot = None
-        
-        # Khởi tạo AI Auto Input
+            self.services['chatbot'] = LazyService(
+                "ChatBot", lambda: FinanceChatBot(user_id, self.conn),
+                probe=FinanceChatBot.is_configured)
         if AI_AUTO_INPUT_AVAILABLE:
-            try:
-                self.ai_auto_input = AIAutoInput()
-            except Exception as e:
-                print(f"Lỗi khởi tạo AI Auto Input: {e}")
-                self.ai_auto_input = None
-        else:
-            self.ai_auto_input = None
-        
-        # Khởi tạo Receipt OCR
+            self.services['ai_auto_input'] = LazyService(
+                "AI Auto Input", self.create_ai_auto_input, probe=AIAutoInput.is_configured)
         if OCR_AVAILABLE:
-            try:
-                self.receipt_ocr = ReceiptOCR()
-            except Exception as e:
-                print(f"Lỗi khởi tạo Receipt OCR: {e}")
-                self.receipt_ocr = None
-        else:
-            self.receipt_ocr = None
-        
-        # Khởi tạo Gold Price API
+            self.services['receipt_ocr'] = LazyService(
+                "Receipt OCR", lambda: ReceiptOCR(cache=OCRCache('finance.db')),
+                probe=ReceiptOCR.is_available)
+        
+        # Số thứ tự lượt phản hồi ChatBot: tăng khi gửi mới / đóng cửa sổ, vòng đọc
+        # của lượt cũ thấy số đã đổi thì bỏ kết quả (không ghi vào cửa sổ mới)
+        self.chat_generation = 0
+        # Cuộc gọi ChatBot đang chạy trên luồng nền (giữ qua lần đóng / mở cửa sổ
+        # tới khi luồng nền kết thúc, để không có hai luồng cùng ghi lịch sử chat)
+        self.chat_busy = False
+        self.chat_stop_event = None
+        
+        # Dịch vụ giá vàng / Bitcoin (chạy nền, dùng chung một HTTP session)
+        self.quote_polling = False
+        self.quote_failed = False
+        # Tỷ giá VNĐ / 1 USD, cập nhật theo giá 'fx' từ dịch vụ giá
+        self.usd_to_vnd = None
         if GOLD_PRICE_AVAILABLE:
-            try:
-                self.gold_api = GoldPriceAPI()
-            except Exception as e:
-                print(f"Lỗi khởi tạo Gold Price API: {e}")
-                self.gold_api = None
-        else:
-            self.gold_api = None
+            self.services['quote_service'] = LazyService(
+                "Gold Price API", lambda: QuoteService(store=QuoteStore('finance.db'),
+                                                       history=PriceHistory('finance.db')),
+                probe=QuoteService.is_available)
 
         # Tạo giao diện
         self.create_widgets()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
         # Load dữ liệu ban đầu
         self.load_transactions()
 
+    def service(self, name):
+        """Dịch vụ theo tên (tạo ở lần gọi đầu), None nếu không có hoặc tạo lỗi"""
+        lazy = self.services.get(name)
+        return lazy.get() if lazy else None
+    
+    @property
+    def chatbot(self):
+        return self.service('chatbot')
+    
+    @property
+    def ai_auto_input(self):
+        return self.service('ai_auto_input')
+    
+    @property
+    def receipt_ocr(self):
+        return self.service('receipt_ocr')
+    
+    @property
+    def quote_service(self):
+        return self.service('quote_service')
+    
+    @property
+    def portfolio(self):
+        return self.service('portfolio')
+    
+    def create_ai_auto_input(self):
+        ai_auto_input = AIAutoInput()
+        ai_auto_input.local_parser.classifier = self.category_classifier
+        return ai_auto_input
+    
+    def service_available(self, name):
+        """Kiểm tra nhanh (có cache, không tạo dịch vụ) để hiển thị trạng thái nút"""
+        lazy = self.services.get(name)
+        return lazy is not None and lazy.available()
+    
+    def update_ai_buttons(self):
+        """Làm mờ nút của tính năng AI chưa cấu hình (vẫn bấm được để xem hướng dẫn)"""
+        for name, (button, color) in self.ai_buttons.items():
+            button.config(bg=color if self.service_available(name) else "#9E9E9E")
+
     def init_database(self):
         """Khởi tạo cơ sở dữ liệu SQLite"""
         self.conn = sqlite3.connect('finance.db')
@@ -178,6 +244,13 @@ class FinanceManager:
             self.cursor.executemany('INSERT INTO categories (name, type) VALUES (?, ?)',
                                    default_categories)
 
+        # Phiên bản sổ giao dịch (dùng làm khóa cho các bộ nhớ đệm)
+        init_ledger_version(self.cursor)
+        
+        # Bảng tài sản nắm giữ và ảnh chụp tài sản ròng theo ngày
+        if PORTFOLIO_AVAILABLE:
+            init_portfolio_tables(self.cursor)
+
         self.conn.commit()
 
     def create_widgets(self):
@@ -215,6 +288,7 @@ class FinanceManager:
         self.category_combo = ttk.Combobox(left_frame, textvariable=self.category_var,
                                           state="readonly", width=25)
         self.category_combo.grid(row=1, column=1, sticky="w", pady=5)
+        self.category_combo.bind("<<ComboboxSelected>>", self.on_category_selected)
         self.update_categories()
 
         # Số tiền
@@ -228,6 +302,7 @@ class FinanceManager:
             row=3, column=0, sticky="w", pady=5)
         self.description_entry = tk.Entry(left_frame, width=27, font=("Arial", 10))
         self.description_entry.grid(row=3, column=1, sticky="w", pady=5)
+        self.description_entry.bind("<KeyRelease>", self.suggest_category)
 
         # Ngày
         tk.Label(left_frame, text="Ngày:", bg="white", font=("Arial", 10)).grid(
@@ -255,14 +330,19 @@ class FinanceManager:
                  cursor="hand2", width=22, height=2).grid(row=5, column=0, columnspan=2, pady=5, sticky="ew")
         
         # Nút Nhập bằng AI
-        tk.Button(left_frame, text="🤖 Nhập bằng AI", command=self.open_ai_auto_input,
+        ai_input_btn = tk.Button(left_frame, text="🤖 Nhập bằng AI", command=self.open_ai_auto_input,
                  bg="#FF5722", fg="white", font=("Arial", 10, "bold"),
-                 cursor="hand2", width=22, height=2).grid(row=6, column=0, columnspan=2, pady=5, sticky="ew")
+                 cursor="hand2", width=22, height=2)
+        ai_input_btn.grid(row=6, column=0, columnspan=2, pady=5, sticky="ew")
         
         # Nút Quét Hóa Đơn
-        tk.Button(left_frame, text="📷 Quét Hóa Đơn", command=self.open_receipt_ocr,
+        ocr_btn = tk.Button(left_frame, text="📷 Quét Hóa Đơn", command=self.open_receipt_ocr,
                  bg="#FF9800", fg="white", font=("Arial", 10, "bold"),
-                 cursor="hand2", width=22, height=2).grid(row=7, column=0, columnspan=2, pady=5, sticky="ew")
+                 cursor="hand2", width=22, height=2)
+        ocr_btn.grid(row=7, column=0, columnspan=2, pady=5, sticky="ew")
+        # Nút tính năng AI và màu gốc (xem update_ai_buttons)
+        self.ai_buttons = {'ai_auto_input': (ai_input_btn, "#FF5722"),
+                           'receipt_ocr': (ocr_btn, "#FF9800")}
 
         # Frame chứa Giá vàng và Bitcoin (xếp dọc)
         price_container = tk.Frame(left_frame, bg="white")
@@ -280,13 +360,19 @@ class FinanceManager:
                                          justify=tk.CENTER, fg="#333", height=4)
         self.gold_price_label.pack(fill=tk.BOTH, expand=True)
         
-        # Nút refresh giá vàng
-        refresh_gold_btn = tk.Button(gold_frame, text="🔄 Cập nhật",
+        # Nút refresh giá vàng và xem lịch sử giá
+        gold_btn_frame = tk.Frame(gold_frame, bg="white")
+        gold_btn_frame.pack(pady=(3, 0))
+        refresh_gold_btn = tk.Button(gold_btn_frame, text="🔄 Cập nhật",
                                      command=self.update_gold_price,
                                      bg="#FFC107", fg="white",
                                      font=("Arial", 7, "bold"),
                                      cursor="hand2", width=10)
-        refresh_gold_btn.pack(pady=(3, 0))
+        refresh_gold_btn.pack(side=tk.LEFT, padx=2)
+        tk.Button(gold_btn_frame, text="📈 Lịch sử",
+                  command=lambda: self.show_price_history('gold'),
+                  bg="#FFC107", fg="white", font=("Arial", 7, "bold"),
+                  cursor="hand2", width=8).pack(side=tk.LEFT, padx=2)
         
         # Frame Giá Bitcoin
         btc_frame = tk.LabelFrame(price_container, text="₿ Giá Bitcoin Hiện Tại",
@@ -300,21 +386,30 @@ class FinanceManager:
                                         justify=tk.CENTER, fg="#333", height=4)
         self.btc_price_label.pack(fill=tk.BOTH, expand=True)
         
-        # Nút refresh giá Bitcoin
-        refresh_btc_btn = tk.Button(btc_frame, text="🔄 Cập nhật",
+        # Nút refresh giá Bitcoin và xem lịch sử giá
+        btc_btn_frame = tk.Frame(btc_frame, bg="white")
+        btc_btn_frame.pack(pady=(3, 0))
+        refresh_btc_btn = tk.Button(btc_btn_frame, text="🔄 Cập nhật",
                                     command=self.update_btc_price,
                                     bg="#F7931A", fg="white",
                                     font=("Arial", 7, "bold"),
                                     cursor="hand2", width=10)
-        refresh_btc_btn.pack(pady=(3, 0))
-        
-        # Tải giá lần đầu
-        self.update_gold_price()
-        self.update_btc_price()
-        
-        # Auto-refresh mỗi 5 phút
-        self.schedule_gold_price_update()
-        self.schedule_btc_price_update()
+        refresh_btc_btn.pack(side=tk.LEFT, padx=2)
+        tk.Button(btc_btn_frame, text="📈 Lịch sử",
+                  command=lambda: self.show_price_history('btc'),
+                  bg="#F7931A", fg="white", font=("Arial", 7, "bold"),
+                  cursor="hand2", width=8).pack(side=tk.LEFT, padx=2)
+        
+        # Nút Tài sản ròng (hiện tổng giá trị tài sản nắm giữ)
+        self.networth_button = tk.Button(price_container, text="💼 Tài Sản Ròng",
+                                         command=self.open_portfolio,
+                                         bg="#3F51B5", fg="white", font=("Arial", 9, "bold"),
+                                         cursor="hand2")
+        self.networth_button.pack(fill=tk.X, pady=(5, 0))
+        
+        # Dịch vụ giá được tạo khi cửa sổ chính đã vẽ xong (Tk rảnh lần đầu)
+        self.price_scheduler = None
+        self.root.after_idle(self.start_price_updates)
 
         # Frame giữa - Danh sách giao dịch
         middle_frame = tk.LabelFrame(main_frame, text="Danh Sách Giao Dịch",
@@ -442,10 +537,13 @@ class FinanceManager:
                                 padx=10, pady=10)
         ai_frame.pack(fill=tk.X, pady=5)
         
-        tk.Button(ai_frame, text="💬 Trợ Lý Tài Chính AI",
+        chatbot_btn = tk.Button(ai_frame, text="💬 Trợ Lý Tài Chính AI",
                  command=self.open_chatbot,
                  bg="#4285F4", fg="white", font=("Arial", 11, "bold"),
-                 cursor="hand2", width=22, height=2).pack(pady=3)
+                 cursor="hand2", width=22, height=2)
+        chatbot_btn.pack(pady=3)
+        self.ai_buttons['chatbot'] = (chatbot_btn, "#4285F4")
+        self.update_ai_buttons()
 
         # Thống kê
         stats_frame = tk.LabelFrame(right_frame, text="Thống Kê",
@@ -553,6 +651,28 @@ class FinanceManager:
         self.category_combo['values'] = categories
         if categories:
             self.category_combo.current(0)
+        self.category_user_selected = False
+        if hasattr(self, 'description_entry'):
+            self.suggest_category()
+
+    def on_category_selected(self, event=None):
+        """Người dùng tự chọn danh mục -> không tự động gợi ý đè lên nữa"""
+        self.category_user_selected = True
+
+    def suggest_category(self, event=None):
+        """Gợi ý danh mục theo mô tả đang nhập (dựa trên lịch sử của người dùng)"""
+        if self.category_user_selected:
+            return
+
+        description = self.description_entry.get().strip()
+        if not description:
+            return
+
+        categories = list(self.category_combo['values'])
+        category, score = self.category_classifier.predict(
+            description, self.type_var.get(), allowed=categories)
+        if category and score >= 0.5:
+            self.category_var.set(category)
 
     def update_filter_categories(self, event=None):
         """Cập nhật danh sách danh mục trong bộ lọc theo loại được chọn"""
@@ -604,13 +724,16 @@ class FinanceManager:
                 INSERT INTO transactions (type, category, amount, description, date, user_id)
                 VALUES (?, ?, ?, ?, ?, ?)
             ''', (trans_type, category, amount, description, date, self.user_id))
+            self.category_classifier.learn(description, category, trans_type)
 
             self.conn.commit()
+            self.category_classifier.apply_learned()
             messagebox.showinfo("Thành công", "Đã thêm giao dịch!")
 
             # Reset form
             self.amount_entry.delete(0, tk.END)
             self.description_entry.delete(0, tk.END)
+            self.category_user_selected = False
 
             # Cập nhật danh sách
             self.load_transactions()
@@ -729,6 +852,9 @@ class FinanceManager:
         
         # Kiểm tra cảnh báo hạn mức
         self.check_budget_warning()
+        
+        # Vẽ lại các biểu đồ đang mở nếu dữ liệu / bộ lọc đã đổi
+        self.chart_manager.refresh()
 
     def check_budget_warning(self):
         """Kiểm tra và hiển thị cảnh báo nếu vượt hạn mức chi tiêu"""
@@ -898,158 +1024,8 @@ class FinanceManager:
             self.load_transactions()
 
     def show_category_chart(self):
-        """Hiển thị biểu đồ theo danh mục"""
-        filter_month = self.filter_month_var.get()
-        filter_year = self.filter_year_var.get()
-
-        query = 'SELECT category, SUM(amount) FROM transactions WHERE type = "expense"'
-        params = []
-
-        if filter_month != "Tất cả":
-            query += ' AND strftime("%m", date) = ?'
-            params.append(filter_month.zfill(2))
-
-        if filter_year != "Tất cả":
-            query += ' AND strftime("%Y", date) = ?'
-            params.append(filter_year)
-
-        query += ' GROUP BY category'
-
-        self.cursor.execute(query, params)
-        data = self.cursor.fetchall()
-
-        if not data:
-            messagebox.showinfo("Thông báo", "Không có dữ liệu để hiển thị!")
-            return
-
-        categories = [row[0] for row in data]
-        amounts = [row[1] for row in data]
-
-        # Tạo cửa sổ mới
-        chart_window = tk.Toplevel(self.root)
-        chart_window.title("Biểu Đồ Chi Tiêu Theo Danh Mục")
-        chart_window.geometry("800x600")
-
-        fig = Figure(figsize=(8, 6))
-        ax = fig.add_subplot(111)
-
-        colors = ['#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', '#9966FF', '#FF9F40']
-        ax.pie(amounts, labels=categories, autopct='%1.1f%%', startangle=90, colors=colors)
-        ax.set_title('Chi Tiêu Theo Danh Mục', fontsize=14, fontweight='bold')
-
-        canvas = FigureCanvasTkAgg(fig, master=chart_window)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
-
-    def show_monthly_chart(self):
-        """Hiển thị biểu đồ theo tháng"""
-        filter_year = self.filter_year_var.get()
-
-        if filter_year == "Tất cả":
-            filter_year = str(datetime.now().year)
-
-        # Lấy dữ liệu thu nhập và chi tiêu theo tháng
-        months = list(range(1, 13))
-        income_data = []
-        expense_data = []
-
-        for month in months:
-            # Thu nhập
-            self.cursor.execute('''
-                SELECT COALESCE(SUM(amount), 0) FROM transactions 
-                WHERE type = "income" AND strftime("%m", date) = ? AND strftime("%Y", date) = ?
-            ''', (str(month).zfill(2), filter_year))
-            income_data.append(self.cursor.fetchone()[0])
-
-            # Chi tiêu
-            self.cursor.execute('''
-                SELECT COALESCE(SUM(amount), 0) FROM transactions 
-                WHERE type = "expense" AND strftime("%m", date) = ? AND strftime("%Y", date) = ?
-            ''', (str(month).zfill(2), filter_year))
-            expense_data.append(self.cursor.fetchone()[0])
-
-        # Tạo cửa sổ mới
-        chart_window = tk.Toplevel(self.root)
-        chart_window.title(f"Biểu Đồ Tài Chính Năm {filter_year}")
-        chart_window.geometry("900x600")
-
-        fig = Figure(figsize=(9, 6))
-        ax = fig.add_subplot(111)
-
-        x = range(1, 13)
-        width = 0.35
-
-        ax.bar([i - width/2 for i in x], income_data, width, label='Thu nhập', color='#4CAF50')
-        ax.bar([i + width/2 for i in x], expense_data, width, label='Chi tiêu', color='#f44336')
-
-        ax.set_xlabel('Tháng', fontsize=12)
-        ax.set_ylabel('Số tiền (VNĐ)', fontsize=12)
-        ax.set_title(f'Biểu Đồ Tài Chính Theo Tháng - Năm {filter_year}',
-                     fontsize=14, fontweight='bold')
-        ax.set_xticks(x)
-        ax.legend()
-        ax.grid(axis='y', alpha=0.3)
-
-        canvas = FigureCanvasTkAgg(fig, master=chart_window)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
-
-    def show_yearly_chart(self):
-        """Hiển thị biểu đồ theo năm"""
-        # Lấy danh sách các năm có dữ liệu
-        self.cursor.execute('''
-            SELECT DISTINCT strftime("%Y", date) FROM transactions 
-            ORDER BY date
-        ''')
-        years = [row[0] for row in self.cursor.fetchall()]
-
-        if not years:
-            messagebox.showinfo("Thông báo", "Không có dữ liệu để hiển thị!")
-            return
-
-        income_data = []
-        expense_data = []
-
-        for year in years:
-            # Thu nhập
-            self.cursor.execute('''
-                SELECT COALESCE(SUM(amount), 0) FROM transactions 
-                WHERE type = "income" AND strftime("%Y", date) = ?
-            ''', (year,))
-            income_data.append(self.cursor.fetchone()[0])
-
-            # Chi tiêu
-            self.cursor.execute('''
-                SELECT COALESCE(SUM(amount), 0) FROM transactions 
-                WHERE type = "expense" AND strftime("%Y", date) = ?
-            ''', (year,))
-            expense_data.append(self.cursor.fetchone()[0])
-
-        # Tạo cửa sổ mới
-        chart_window = tk.Toplevel(self.root)
-        chart_window.title("Biểu Đồ Tài Chính Theo Năm")
-        chart_window.geometry("900x600")
-
-        fig = Figure(figsize=(9, 6))
-        ax = fig.add_subplot(111)
-
-        x = range(len(years))
-        width = 0.35
-
-        ax.bar([i - width/2 for i in x], income_data, width, label='Thu nhập', color='#4CAF50')
-        ax.bar([i + width/2 for i in x], expense_data, width, label='Chi tiêu', color='#f44336')
-
-        ax.set_xlabel('Năm', fontsize=12)
-        ax.set_ylabel('Số tiền (VNĐ)', fontsize=12)
-        ax.set_title('Biểu Đồ Tài Chính Theo Năm', fontsize=14, fontweight='bold')
-        ax.set_xticks(x)
-        ax.set_xticklabels(years)
-        ax.legend()
-        ax.grid(axis='y', alpha=0.3)
-
-        canvas = FigureCanvasTkAgg(fig, master=chart_window)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        """Hiển thị biểu đồ theo danh mục (một cửa sổ, tự cập nhật khi dữ liệu đổi)"""
+        self.chart_manager.show('category')
 
     def export_to_pdf(self):
         """Xuất danh sách giao dịch ra file PDF"""
@@ -1089,13 +1065,21 @@ class FinanceManager:
             return
 
         try:
+            from reportlab.lib import colors
+            from reportlab.lib.pagesizes import A4
+            from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+            from reportlab.lib.units import inch
+            from reportlab.pdfbase import pdfmetrics
+            from reportlab.pdfbase.ttfonts import TTFont
+            from reportlab.lib.enums import TA_CENTER, TA_RIGHT
+
             # Đăng ký font tiếng Việt
             font_name = 'Helvetica'
             font_bold = 'Helvetica-Bold'
 
             # Thử tải font DejaVu Sans từ thư mục hiện tại
             try:
-                import os
                 current_dir = os.path.dirname(os.path.abspath(__file__))
                 dejavu_path = os.path.join(current_dir, 'DejaVuSans.ttf')
                 dejavu_bold_path = os.path.join(current_dir, 'DejaVuSans-Bold.ttf')
@@ -1308,49 +1292,70 @@ class FinanceManager:
             # Định dạng lại ngày tháng theo chuẩn YYYY-MM-DD
             df['date'] = df['date'].dt.strftime('%Y-%m-%d')
 
-            # Lấy danh sách danh mục hiện có để kiểm tra
-            self.cursor.execute('SELECT name, type FROM categories')
-            existing_categories = {(name, type) for name, type in self.cursor.fetchall()}
+            # Thêm danh mục, học mô tả và chèn giao dịch trong một transaction: lỗi giữa
+            # chừng thì rollback toàn bộ, không để lại thay đổi cho lần commit sau
+            with self.conn:
+                # Lấy danh sách danh mục hiện có để kiểm tra
+                self.cursor.execute('SELECT name, type FROM categories')
+                existing_categories = {(name, type) for name, type in self.cursor.fetchall()}
 
-            new_transactions = []
+                new_transactions = []
+                auto_categorized = 0
 
-            # Chuẩn bị dữ liệu để chèn
-            for index, row in df.iterrows():
-                trans_type = row['type']
-                category = str(row['category']).strip() if row['category'] else 'Khác'
-
-                # Kiểm tra và thêm danh mục mới nếu cần
-                if (category, trans_type) not in existing_categories and category != 'Khác':
-                    self.cursor.execute('INSERT INTO categories (name, type) VALUES (?, ?)', (category, trans_type))
-                    existing_categories.add((category, trans_type))
-
-                new_transactions.append((
-                    trans_type,
-                    category,
-                    row['amount'],
-                    row['description'] if row['description'] else '',
-                    row['date'],
-                    self.user_id
-                ))
+                # Chuẩn bị dữ liệu để chèn
+                for index, row in df.iterrows():
+                    trans_type = row['type']
+                    description = '' if pd.isna(row['description']) else str(row['description'])
+                    category = '' if pd.isna(row['category']) else str(row['category']).strip()
 
+                    if category:
+                        self.category_classifier.learn(description, category, trans_type)
+                    else:
+                        # Dòng thiếu danh mục -> đoán theo mô tả
+                        allowed = [name for name, t in existing_categories if t == trans_type]
+                        category, score = self.category_classifier.predict(
+                            description, trans_type, allowed=allowed)
+                        if category and score >= 0.5:
+                            auto_categorized += 1
+                        else:
+                            category = 'Khác'
+
+                    # Kiểm tra và thêm danh mục mới nếu cần
+                    if (category, trans_type) not in existing_categories and category != 'Khác':
+                        self.cursor.execute('INSERT INTO categories (name, type) VALUES (?, ?)', (category, trans_type))
+                        existing_categories.add((category, trans_type))
+
+                    new_transactions.append((
+                        trans_type,
+                        category,
+                        row['amount'],
+                        description,
+                        row['date'],
+                        self.user_id
+                    ))
+
+                # 3. Chèn dữ liệu vào database
+                self.cursor.executemany('''
+                    INSERT INTO transactions (type, category, amount, description, date, user_id)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', new_transactions)
+            
             if not new_transactions:
                 messagebox.showwarning("Cảnh báo", "Không tìm thấy giao dịch hợp lệ nào trong file Excel.")
                 return
-
-            # 3. Chèn dữ liệu vào database
-            self.cursor.executemany('''
-                INSERT INTO transactions (type, category, amount, description, date, user_id)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', new_transactions)
-
-            self.conn.commit()
-            messagebox.showinfo("Thành công", f"Đã nhập thành công {len(new_transactions)} giao dịch từ Excel!")
+            
+            self.category_classifier.apply_learned()
+            message = f"Đã nhập thành công {len(new_transactions)} giao dịch từ Excel!"
+            if auto_categorized:
+                message += f"\n{auto_categorized} giao dịch được tự động phân loại theo mô tả."
+            messagebox.showinfo("Thành công", message)
 
             # Cập nhật danh sách và thống kê
             self.update_categories()  # Cập nhật danh mục mới (nếu có)
             self.load_transactions()
 
         except Exception as e:
+            self.category_classifier.discard_learned()
             messagebox.showerror("Lỗi", f"Lỗi khi đọc file Excel: {e}")
             # print(e) # In lỗi ra console để debug nếu cần
 
@@ -1511,156 +1516,11 @@ class FinanceManager:
 
     def show_monthly_chart(self):
         """Hiển thị biểu đồ theo tháng (có thêm phần trăm)"""
-        filter_year = self.filter_year_var.get()
-
-        if filter_year == "Tất cả":
-            filter_year = str(datetime.now().year)
-
-        # Lấy dữ liệu thu nhập và chi tiêu theo tháng
-        months = list(range(1, 13))
-        income_data = []
-        expense_data = []
-
-        for month in months:
-            month_str = str(month).zfill(2)
-            # Thu nhập
-            self.cursor.execute('''
-                SELECT COALESCE(SUM(amount), 0) FROM transactions 
-                WHERE type = "income" AND strftime("%m", date) = ? AND strftime("%Y", date) = ?
-            ''', (month_str, filter_year))
-            income_data.append(self.cursor.fetchone()[0])
-
-            # Chi tiêu
-            self.cursor.execute('''
-                SELECT COALESCE(SUM(amount), 0) FROM transactions 
-                WHERE type = "expense" AND strftime("%m", date) = ? AND strftime("%Y", date) = ?
-            ''', (month_str, filter_year))
-            expense_data.append(self.cursor.fetchone()[0])
-
-        # Tạo cửa sổ mới
-        chart_window = tk.Toplevel(self.root)
-        chart_window.title(f"Biểu Đồ Tài Chính Năm {filter_year}")
-        chart_window.geometry("900x600")
-
-        fig = Figure(figsize=(9, 6))
-        ax = fig.add_subplot(111)
-
-        x = range(1, 13)
-        width = 0.35
-
-        # Vẽ Bar
-        rects_income = ax.bar([i - width / 2 for i in x], income_data, width, label='Thu nhập', color='#4CAF50')
-        rects_expense = ax.bar([i + width / 2 for i in x], expense_data, width, label='Chi tiêu', color='#f44336')
-
-        ax.set_xlabel('Tháng', fontsize=12)
-        ax.set_ylabel('Số tiền (VNĐ)', fontsize=12)
-        ax.set_title(f'Biểu Đồ Tài Chính Theo Tháng - Năm {filter_year}',
-                     fontsize=14, fontweight='bold')
-        ax.set_xticks(x)
-        ax.legend()
-        ax.grid(axis='y', alpha=0.3)
-
-        # *** THÊM PHẦN TRĂM ***
-        def autolabel(rects, data_list):
-            for i, rect in enumerate(rects):
-                height = rect.get_height()
-                # Tổng thu và chi trong tháng
-                total = income_data[i] + expense_data[i]
-
-                # Chỉ hiển thị phần trăm nếu total > 0 (tránh chia cho 0)
-                if total > 0:
-                    percentage = (data_list[i] / total) * 100
-                    # Vị trí đặt nhãn: trên cùng của cột, dịch sang phải/trái một chút
-                    x_pos = rect.get_x() + rect.get_width() / 2
-                    y_pos = height
-                    ax.text(x_pos, y_pos, f'{percentage:.0f}%',
-                            ha='center', va='bottom', fontsize=8, color='black',
-                            rotation=45)  # Xoay 45 độ để tránh chồng chéo
-
-        autolabel(rects_income, income_data)
-        autolabel(rects_expense, expense_data)
-        # *** HẾT PHẦN THÊM PHẦN TRĂM ***
-
-        canvas = FigureCanvasTkAgg(fig, master=chart_window)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self.chart_manager.show('monthly')
 
     def show_yearly_chart(self):
         """Hiển thị biểu đồ theo năm (có thêm phần trăm)"""
-        # Lấy danh sách các năm có dữ liệu
-        self.cursor.execute('''
-            SELECT DISTINCT strftime("%Y", date) FROM transactions 
-            ORDER BY date
-        ''')
-        years = [row[0] for row in self.cursor.fetchall()]
-
-        if not years:
-            messagebox.showinfo("Thông báo", "Không có dữ liệu để hiển thị!")
-            return
-
-        income_data = []
-        expense_data = []
-
-        for year in years:
-            # Thu nhập
-            self.cursor.execute('''
-                SELECT COALESCE(SUM(amount), 0) FROM transactions 
-                WHERE type = "income" AND strftime("%Y", date) = ?
-            ''', (year,))
-            income_data.append(self.cursor.fetchone()[0])
-
-            # Chi tiêu
-            self.cursor.execute('''
-                SELECT COALESCE(SUM(amount), 0) FROM transactions 
-                WHERE type = "expense" AND strftime("%Y", date) = ?
-            ''', (year,))
-            expense_data.append(self.cursor.fetchone()[0])
-
-        # Tạo cửa sổ mới
-        chart_window = tk.Toplevel(self.root)
-        chart_window.title("Biểu Đồ Tài Chính Theo Năm")
-        chart_window.geometry("900x600")
-
-        fig = Figure(figsize=(9, 6))
-        ax = fig.add_subplot(111)
-
-        x = range(len(years))
-        width = 0.35
-
-        # Vẽ Bar
-        rects_income = ax.bar([i - width / 2 for i in x], income_data, width, label='Thu nhập', color='#4CAF50')
-        rects_expense = ax.bar([i + width / 2 for i in x], expense_data, width, label='Chi tiêu', color='#f44336')
-
-        ax.set_xlabel('Năm', fontsize=12)
-        ax.set_ylabel('Số tiền (VNĐ)', fontsize=12)
-        ax.set_title('Biểu Đồ Tài Chính Theo Năm', fontsize=14, fontweight='bold')
-        ax.set_xticks(x)
-        ax.set_xticklabels(years)
-        ax.legend()
-        ax.grid(axis='y', alpha=0.3)
-
-        # *** THÊM PHẦN TRĂM ***
-        def autolabel_yearly(rects, data_list):
-            for i, rect in enumerate(rects):
-                height = rect.get_height()
-                # Tổng thu và chi trong năm
-                total = income_data[i] + expense_data[i]
-
-                # Chỉ hiển thị phần trăm nếu total > 0
-                if total > 0:
-                    percentage = (data_list[i] / total) * 100
-                    x_pos = rect.get_x() + rect.get_width() / 2
-                    y_pos = height
-                    ax.text(x_pos, y_pos, f'{percentage:.0f}%',
-                            ha='center', va='bottom', fontsize=9, color='black')
-
-        autolabel_yearly(rects_income, income_data)
-        autolabel_yearly(rects_expense, expense_data)
-        # *** HẾT PHẦN THÊM PHẦN TRĂM ***
-
-        canvas = FigureCanvasTkAgg(fig, master=chart_window)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self.chart_manager.show('yearly')
 
     def set_budget_limit(self):
         """Đặt hạn mức chi tiêu hàng tháng"""
@@ -2195,7 +2055,10 @@ class FinanceManager:
             self.show_ai_config_help()
             return
         
-        if not self.chatbot:
+        # Kiểm tra nhanh trước, chưa cấu hình key thì không tạo ChatBot
+        configured = self.service_available('chatbot')
+        if configured and not self.chatbot:
+            self.update_ai_buttons()
             messagebox.showwarning(
                 "Lỗi khởi tạo ChatBot", 
                 "Không thể khởi tạo ChatBot.\n"
@@ -2204,7 +2067,7 @@ class FinanceManager:
             self.show_ai_config_help()
             return
             
-        if not self.chatbot.is_available():
+        if not configured or not self.chatbot.is_available():
             messagebox.showinfo(
                 "Chưa cấu hình API Key", 
                 "Bạn chưa nhập API Key cho ChatBot AI.\n\n"
@@ -2217,6 +2080,9 @@ class FinanceManager:
             self.show_ai_config_help()
             return
         
+        # Tạo chat session lần đầu mở cửa sổ
+        self.chatbot.start_session()
+        
         chatbot_window = tk.Toplevel(self.root)
         chatbot_window.title("🤖 Trợ Lý Tài Chính AI - Google Gemini")
         chatbot_window.geometry("750x650")
@@ -2278,12 +2144,27 @@ class FinanceManager:
         message_entry.focus()
         
         # Nút gửi
-        send_btn = tk.Button(input_frame, text="Gửi ➤",
-                            command=self.send_message,
-                            bg="#34A853", fg="white",
-                            font=("Arial", 10, "bold"),
-                            cursor="hand2", padx=20, relief=tk.FLAT)
-        send_btn.pack(side=tk.LEFT)
+        self.chat_send_btn = tk.Button(input_frame, text="Gửi ➤",
+                                       command=self.send_message,
+                                       bg="#34A853", fg="white",
+                                       font=("Arial", 10, "bold"),
+                                       cursor="hand2", padx=20, relief=tk.FLAT)
+        self.chat_send_btn.pack(side=tk.LEFT)
+        
+        # Nút dừng phản hồi đang sinh
+        self.chat_stop_btn = tk.Button(input_frame, text="⏹ Dừng",
+                                       command=self.stop_chat_response,
+                                       bg="#F44336", fg="white",
+                                       font=("Arial", 10, "bold"),
+                                       cursor="hand2", padx=10, relief=tk.FLAT,
+                                       state=tk.DISABLED)
+        self.chat_stop_btn.pack(side=tk.LEFT, padx=(5, 0))
+        
+        # Lượt của cửa sổ trước chưa kết thúc -> chưa cho gửi (mở lại khi xong)
+        if self.chat_busy:
+            self.chat_send_btn.config(state=tk.DISABLED)
+        chatbot_window.protocol("WM_DELETE_WINDOW",
+                                lambda: self.close_chatbot(chatbot_window))
         
         # Frame các nút gợi ý
         suggestion_frame = tk.LabelFrame(main_frame, text="💡 Câu hỏi gợi ý",
@@ -2292,7 +2173,7 @@ class FinanceManager:
         suggestion_frame.pack(fill=tk.X, pady=(10, 0))
         
         suggestions = [
-            ("💡", "Cho tôi lời khuyên tài chính"),
+            ("💡", ADVICE_QUESTION),
             ("📊", "Phân tích xu hướng chi tiêu"),
             ("💰", "Làm sao để tiết kiệm hiệu quả?"),
             ("🎯", "Tôi nên đặt ngân sách như thế nào?"),
@@ -2327,6 +2208,11 @@ class FinanceManager:
                  cursor="hand2", relief=tk.FLAT,
                  padx=10, pady=4).pack()
         
+        # Số token của request gần nhất (để theo dõi kích thước prompt)
+        self.chat_stats_label = tk.Label(reset_frame, text="", bg="white",
+                                         fg="#999", font=("Arial", 7))
+        self.chat_stats_label.pack()
+        
         # Hiển thị tin nhắn chào mừng
         welcome_msg = """👋 Xin chào! Tôi là trợ lý tài chính AI được hỗ trợ bởi Google Gemini.
 
@@ -2342,7 +2228,10 @@ class FinanceManager:
         self.display_message("Gemini AI", welcome_msg, "bot")
     
     def send_message(self):
-        """Gửi tin nhắn đến ChatBot"""
+        """Gửi tin nhắn đến ChatBot (phản hồi được stream từ luồng nền)"""
+        if self.chat_busy:
+            return
+        
         message = self.message_var.get().strip()
         if not message:
             return
@@ -2351,36 +2240,193 @@ class FinanceManager:
         self.display_message("Bạn", message, "user")
         self.message_var.set("")
         
-        # Hiển thị "đang suy nghĩ..."
+        self._run_chat_request(lambda: self.chatbot.prepare_message(message))
+    
+    def _run_chat_request(self, prepare):
+        """
+        Chuẩn bị request trên luồng giao diện rồi stream phản hồi từ luồng nền
+        
+        Args:
+            prepare: Hàm tạo request của chatbot (có truy vấn database)
+        """
+        # Hiển thị "đang suy nghĩ..." (đánh dấu vị trí để xóa khi có chữ đầu tiên)
+        self.chat_display.mark_set("thinking_start", "end-1c")
+        self.chat_display.mark_gravity("thinking_start", tk.LEFT)
         self.chat_display.insert(tk.END, "\n🤔 Đang phân tích...\n", "system")
         self.chat_display.see(tk.END)
-        self.chat_display.update()
         
-        # Gọi ChatBot
+        # Truy vấn dữ liệu tài chính trên luồng giao diện (kết nối SQLite dùng chung)
+        try:
+            request = prepare()
+        except Exception as e:
+            self.chat_display.delete("thinking_start", "end-1c")
+            self.display_message("Gemini AI", f"❌ Lỗi: {str(e)}", "bot")
+            return
+        
+        # Khóa gửi trùng trong khi đang chờ phản hồi
+        self.chat_busy = True
+        self.chat_send_btn.config(state=tk.DISABLED)
+        self.chat_stop_btn.config(state=tk.NORMAL)
+        
+        # Mỗi lượt có hàng đợi và cờ dừng riêng
+        self.chat_generation += 1
+        self.chat_stop_event = threading.Event()
+        chunk_queue = queue.Queue()
+        threading.Thread(target=self._chat_stream_worker,
+                         args=(request, chunk_queue, self.chat_stop_event),
+                         daemon=True).start()
+        
+        self._chat_response_started = False
+        self.chat_display.after(30, self._poll_chat_stream, self.chat_generation,
+                                chunk_queue, self.chat_stop_event, request)
+    
+    def _chat_stream_worker(self, request, chunk_queue, stop_event):
+        """Luồng nền: nhận từng đoạn phản hồi từ Gemini và đẩy vào hàng đợi"""
+        try:
+            for chunk in self.chatbot.stream_message(request, stop_event):
+                chunk_queue.put(("chunk", chunk))
+        except Exception as e:
+            chunk_queue.put(("error", self.chatbot.format_error(e)))
+        finally:
+            chunk_queue.put(("done", None))
+    
+    def _begin_chat_response(self):
+        """Xóa dòng "đang phân tích" và in tiêu đề tin nhắn của bot"""
+        if not self._chat_response_started:
+            self._chat_response_started = True
+            self.chat_display.delete("thinking_start", "end-1c")
+            self.display_message_header("Gemini AI", "bot")
+    
+    def _poll_chat_stream(self, generation, chunk_queue, stop_event, request):
+        """Lấy các đoạn phản hồi từ hàng đợi và hiển thị (chạy trên luồng giao diện)"""
+        # Lượt cũ (cửa sổ đã đóng / mở lại): bỏ kết quả, không ghi vào cửa sổ mới,
+        # nhưng vẫn đọc tới "done" rồi mới cho gửi lượt mới
+        if generation != self.chat_generation:
+            self._drain_stale_chat_stream(chunk_queue)
+            return
+        if not self.chat_display.winfo_exists():
+            return
+        
+        done = False
+        try:
+            while True:
+                kind, payload = chunk_queue.get_nowait()
+                if kind == "chunk":
+                    self._begin_chat_response()
+                    self.chat_display.insert(tk.END, payload)
+                elif kind == "error":
+                    self._begin_chat_response()
+                    self.chat_display.insert(tk.END, payload)
+                else:
+                    done = True
+                    break
+        except queue.Empty:
+            pass
+        
+        self.chat_display.see(tk.END)
+        
+        if not done:
+            self.chat_display.after(30, self._poll_chat_stream, generation,
+                                    chunk_queue, stop_event, request)
+            return
+        
+        # Kết thúc phản hồi
+        self._begin_chat_response()
+        if stop_event.is_set():
+            self.chat_display.insert(tk.END, "\n⏹ Đã dừng phản hồi.", "system")
+        self.chat_display.insert(tk.END, "\n")
+        self.chat_display.see(tk.END)
+        
+        self.chat_busy = False
+        self.chat_send_btn.config(state=tk.NORMAL)
+        self.chat_stop_btn.config(state=tk.DISABLED)
+        
+        # Lưu phản hồi vào cache (ghi SQLite trên luồng giao diện)
         try:
-            response = self.chatbot.ask_question(message)
+            self.chatbot.complete_request(request)
         except Exception as e:
-            response = f"❌ Lỗi: {str(e)}"
+            print(f"Lỗi lưu cache phản hồi: {e}")
+        self.update_chat_stats()
+    
+    def update_chat_stats(self):
+        """Hiển thị số token của request gần nhất"""
+        stats = self.chatbot.get_token_stats()
+        if not stats:
+            self.chat_stats_label.config(text="")
+            return
         
-        # Xóa "đang suy nghĩ..."
-        self.chat_display.delete("end-2l", "end-1l")
+        prompt_tokens = stats.get('prompt_tokens', stats.get('estimated_prompt_tokens', 0))
+        text = f"🔢 Prompt: {prompt_tokens:,} token"
+        if 'output_tokens' in stats:
+            text += f" • Trả lời: {stats['output_tokens']:,} token"
+        text += f" • Lịch sử: {stats.get('history_turns', 0)} lượt"
+        if stats.get('tool_calls'):
+            text += f" • Truy vấn dữ liệu: {stats['tool_calls']} lần"
+        
+        cache_stats = self.chatbot.get_cache_stats()
+        if cache_stats['hits'] + cache_stats['misses'] > 0:
+            text += (f" • Cache: {cache_stats['hits']}/"
+                     f"{cache_stats['hits'] + cache_stats['misses']} "
+                     f"({cache_stats['hit_rate'] * 100:.0f}%)")
+        self.chat_stats_label.config(text=text)
+    
+    def _drain_stale_chat_stream(self, chunk_queue):
+        """Đọc bỏ phản hồi của lượt cũ tới khi luồng nền kết thúc rồi mở khóa gửi"""
+        try:
+            while True:
+                kind, _ = chunk_queue.get_nowait()
+                if kind == "done":
+                    break
+        except queue.Empty:
+            self.root.after(30, self._drain_stale_chat_stream, chunk_queue)
+            return
         
-        # Hiển thị phản hồi
-        self.display_message("Gemini AI", response, "bot")
+        self.chat_busy = False
+        if self.chat_send_btn.winfo_exists():
+            self.chat_send_btn.config(state=tk.NORMAL)
+    
+    def stop_chat_response(self):
+        """Dừng phản hồi đang được sinh"""
+        if self.chat_busy and self.chat_stop_event is not None:
+            self.chat_stop_event.set()
+            self.chat_stop_btn.config(state=tk.DISABLED)
+    
+    def close_chatbot(self, window):
+        """Đóng cửa sổ ChatBot và dừng cuộc gọi đang chạy (nếu có)"""
+        self.stop_chat_response()
+        # Vòng đọc của lượt đang chạy thấy số thứ tự đã đổi thì chỉ đọc bỏ phần còn
+        # lại; chat_busy giữ nguyên tới khi luồng nền kết thúc
+        self.chat_generation += 1
+        window.destroy()
     
     def send_suggestion(self, suggestion):
         """Gửi câu hỏi gợi ý"""
+        if self.chat_busy:
+            return
+        
+        if suggestion == ADVICE_QUESTION:
+            # Lời khuyên chỉ phụ thuộc dữ liệu sổ giao dịch -> dùng request có cache
+            self.display_message("Bạn", suggestion, "user")
+            self._run_chat_request(self.chatbot.prepare_advice_request)
+            return
+        
         self.message_var.set(suggestion)
         self.send_message()
     
     def reset_chat(self):
         """Reset cuộc trò chuyện"""
+        if self.chat_busy:
+            messagebox.showinfo("Đang trả lời",
+                                "Vui lòng đợi hoặc dừng phản hồi hiện tại trước.")
+            return
+        
         if messagebox.askyesno("Xác nhận", 
             "Bạn có muốn bắt đầu cuộc trò chuyện mới?\n"
             "Lịch sử chat hiện tại sẽ bị xóa."):
             
             self.chatbot.clear_history()
             self.chat_display.delete(1.0, tk.END)
+            self.update_chat_stats()
             
             welcome_msg = "🔄 Đã bắt đầu cuộc trò chuyện mới!\n\n" \
                          "💬 Hãy hỏi tôi bất cứ điều gì về tài chính cá nhân! 😊"
@@ -2388,7 +2434,9 @@ class FinanceManager:
     
     def open_ai_auto_input(self):
         """Mở cửa sổ nhập liệu tự động bằng AI"""
-        if not AI_AUTO_INPUT_AVAILABLE or not self.ai_auto_input or not self.ai_auto_input.is_available():
+        if (not self.service_available('ai_auto_input') or not self.ai_auto_input
+                or not self.ai_auto_input.is_available()):
+            self.update_ai_buttons()
             messagebox.showinfo(
                 "Chức năng chưa sẵn sàng",
                 "Tính năng Nhập bằng AI chưa được cấu hình.\n\n"
@@ -2481,8 +2529,15 @@ class FinanceManager:
                  font=("Arial", 10, "bold"),
                  cursor="hand2", padx=20, relief=tk.FLAT).pack(side=tk.LEFT)
         
+        tk.Button(input_frame, text="📋 Nhiều dòng",
+                 command=lambda: self.open_ai_bulk_input(ai_window),
+                 bg="#FF9800", fg="white",
+                 font=("Arial", 10, "bold"),
+                 cursor="hand2", padx=10, relief=tk.FLAT).pack(side=tk.LEFT, padx=(5, 0))
+        
         # Biến lưu giao dịch đang chờ
         self.pending_transaction = None
+        self.ai_input_busy = False
         
         # Tin nhắn chào mừng
         welcome = "👋 Xin chào! Hãy nói cho tôi biết giao dịch của bạn.\n\n" \
@@ -2494,7 +2549,7 @@ class FinanceManager:
     def process_ai_input(self):
         """Xử lý input từ người dùng với AI"""
         message = self.ai_message_var.get().strip()
-        if not message:
+        if not message or self.ai_input_busy:
             return
         
         # Hiển thị tin nhắn người dùng
@@ -2506,19 +2561,44 @@ class FinanceManager:
         # Hiển thị đang xử lý
         self.ai_chat_display.insert(tk.END, "\n🤖 Đang phân tích...\n", "ai")
         self.ai_chat_display.see(tk.END)
-        self.ai_chat_display.update()
         
         # Lấy danh mục có sẵn
         available_categories = self.get_available_categories()
         
-        # Gọi AI phân tích
-        result = self.ai_auto_input.parse_transaction(message, available_categories)
+        # Gọi AI phân tích ở luồng nền (có thể phải chờ lượt gọi / thử lại)
+        self.ai_input_busy = True
+        result_queue = queue.Queue()
+        
+        def worker():
+            # Luôn đẩy kết quả (None khi lỗi) để vòng đọc dừng và mở khóa ô nhập
+            try:
+                result = self.ai_auto_input.parse_transaction(message, available_categories)
+            except Exception as e:
+                self.ai_auto_input.last_error = f"Lỗi khi phân tích: {e}"
+                result = None
+            result_queue.put(result)
+        
+        threading.Thread(target=worker, daemon=True).start()
+        self.root.after(30, lambda: self._poll_ai_input(result_queue))
+    
+    def _poll_ai_input(self, result_queue):
+        """Chờ kết quả phân tích từ luồng nền rồi hiển thị"""
+        try:
+            result = result_queue.get_nowait()
+        except queue.Empty:
+            self.root.after(30, lambda: self._poll_ai_input(result_queue))
+            return
+        
+        self.ai_input_busy = False
+        if not self.ai_chat_display.winfo_exists():
+            return
         
         # Xóa "đang phân tích"
         self.ai_chat_display.delete("end-2l", "end-1l")
         
         if not result:
-            self.ai_chat_display.insert(tk.END, "\n❌ Lỗi: Không thể phân tích tin nhắn.\n", "error")
+            error = self.ai_auto_input.last_error or "Không thể phân tích tin nhắn."
+            self.ai_chat_display.insert(tk.END, f"\n❌ Lỗi: {error}\n", "error")
             return
         
         if not result.get('is_transaction', False):
@@ -2582,8 +2662,11 @@ class FinanceManager:
                 transaction['date'],
                 self.user_id
             ))
+            self.category_classifier.learn(transaction['description'],
+                                           transaction['category'], transaction['type'])
             
             self.conn.commit()
+            self.category_classifier.apply_learned()
             
             # Hiển thị thành công
             self.ai_chat_display.insert(tk.END, "\n✅ Thành công!\n", "success")
@@ -2606,9 +2689,237 @@ class FinanceManager:
         self.ai_chat_display.insert(tk.END, "Bạn có thể thử lại với mô tả khác.\n")
         self.pending_transaction = None
     
+    @staticmethod
+    def edit_tree_cell(tree, item, column, options=None, readonly=False, on_save=None):
+        """
+        Mở ô sửa đè lên một ô của bảng (Enter / chọn / rời ô để lưu, Esc để hủy)
+        
+        Args:
+            tree: ttk.Treeview
+            item, column: Dòng và cột ('#n') cần sửa
+            options: Danh sách giá trị -> Combobox, None -> ô nhập chữ
+            readonly: Combobox chỉ cho chọn trong danh sách
+            on_save: Hàm nhận giá trị mới (mặc định ghi thẳng vào ô)
+        """
+        x, y, width, height = tree.bbox(item, column)
+        value = tree.set(item, column)
+        if options is not None:
+            editor = ttk.Combobox(tree, values=options, state="readonly" if readonly else "normal")
+            editor.set(value)
+        else:
+            editor = tk.Entry(tree, font=("Arial", 10))
+            editor.insert(0, value)
+            editor.bind('<FocusOut>', lambda e: save())
+        editor.place(x=x, y=y, width=width, height=height)
+        editor.focus()
+        
+        def save(event=None):
+            if not editor.winfo_exists():
+                return
+            new_value = editor.get().strip()
+            editor.destroy()
+            if on_save:
+                on_save(new_value)
+            else:
+                tree.set(item, column, new_value)
+        
+        editor.bind('<Return>', save)
+        editor.bind('<<ComboboxSelected>>', save)
+        editor.bind('<Escape>', lambda e: editor.destroy())
+    
+    def open_ai_bulk_input(self, parent=None):
+        """Mở cửa sổ dán nhiều dòng (nhật ký, tin nhắn...) để AI trích xuất hàng loạt"""
+        bulk_window = tk.Toplevel(parent or self.root)
+        bulk_window.title("📋 Nhập Nhiều Giao Dịch Bằng AI")
+        bulk_window.geometry("900x650")
+        bulk_window.configure(bg="#f5f5f5")
+        
+        main_frame = tk.Frame(bulk_window, bg="white", padx=15, pady=15)
+        main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        # Ô dán văn bản
+        input_frame = tk.LabelFrame(main_frame, text="📝 Dán nội dung (mỗi dòng một hoặc nhiều giao dịch)",
+                                    bg="white", font=("Arial", 10, "bold"), fg="#FF5722")
+        input_frame.pack(fill=tk.X)
+        
+        text_input = tk.Text(input_frame, wrap=tk.WORD, height=10,
+                             font=("Arial", 10), bg="#f9f9f9", relief=tk.FLAT)
+        text_input.pack(fill=tk.X, padx=10, pady=5)
+        text_input.focus()
+        
+        action_frame = tk.Frame(main_frame, bg="white")
+        action_frame.pack(fill=tk.X, pady=8)
+        
+        status_var = tk.StringVar(value="Dán văn bản rồi nhấn 'Phân tích'.")
+        tk.Label(action_frame, textvariable=status_var, bg="white",
+                font=("Arial", 9), fg="#666").pack(side=tk.RIGHT)
+        
+        # Bảng xem lại (nháy đúp vào ô để sửa)
+        review_frame = tk.LabelFrame(main_frame, text="🔎 Xem lại (nháy đúp để sửa)",
+                                     bg="white", font=("Arial", 10, "bold"), fg="#FF5722")
+        review_frame.pack(fill=tk.BOTH, expand=True)
+        
+        columns = ("Loại", "Danh mục", "Số tiền", "Mô tả", "Ngày")
+        review_tree = ttk.Treeview(review_frame, columns=columns,
+                                   show="headings", height=10)
+        review_tree.heading("Loại", text="Loại")
+        review_tree.heading("Danh mục", text="Danh mục")
+        review_tree.heading("Số tiền", text="Số tiền (VNĐ)")
+        review_tree.heading("Mô tả", text="Mô tả")
+        review_tree.heading("Ngày", text="Ngày")
+        review_tree.column("Loại", width=80, anchor="center")
+        review_tree.column("Danh mục", width=110, anchor="center")
+        review_tree.column("Số tiền", width=110, anchor="e")
+        review_tree.column("Mô tả", width=330)
+        review_tree.column("Ngày", width=100, anchor="center")
+        
+        scrollbar = ttk.Scrollbar(review_frame, orient=tk.VERTICAL, command=review_tree.yview)
+        review_tree.configure(yscroll=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        review_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(10, 0), pady=5)
+        
+        type_labels = {'income': "Thu nhập", 'expense': "Chi tiêu"}
+        type_values = {label: value for value, label in type_labels.items()}
+        available_categories = self.get_available_categories()
+        result_queue = queue.Queue()
+        
+        def show_transactions(transactions):
+            for item in review_tree.get_children():
+                review_tree.delete(item)
+            for trans in transactions:
+                review_tree.insert("", tk.END, values=(
+                    type_labels[trans['type']], trans['category'],
+                    f"{trans['amount']:,.0f}", trans['description'], trans['date']))
+        
+        # Phân tích chạy ở luồng nền, kết quả trả về qua hàng đợi
+        def analyze():
+            text = text_input.get("1.0", tk.END).strip()
+            if not text:
+                return
+            analyze_btn.config(state=tk.DISABLED)
+            lines = len([line for line in text.splitlines() if line.strip()])
+            status_var.set(f"⏳ Đang phân tích {lines} dòng...")
+            
+            def worker():
+                try:
+                    result_queue.put(self.ai_auto_input.extract_bulk(text, available_categories))
+                except Exception as e:
+                    result_queue.put({'error': str(e)})
+            
+            threading.Thread(target=worker, daemon=True).start()
+            bulk_window.after(100, poll_result)
+        
+        def poll_result():
+            if not bulk_window.winfo_exists():
+                return
+            try:
+                result = result_queue.get_nowait()
+            except queue.Empty:
+                bulk_window.after(100, poll_result)
+                return
+            
+            analyze_btn.config(state=tk.NORMAL)
+            if 'error' in result:
+                status_var.set(f"❌ Lỗi: {result['error']}")
+                return
+            
+            show_transactions(result['transactions'])
+            status = (f"✅ Tìm thấy {len(result['transactions'])} giao dịch "
+                      f"({result['api_calls']} lần gọi AI)")
+            if result['failed_chunks']:
+                status += f" - ⚠️ {result['failed_chunks']} nhóm dòng không phân tích được"
+            status_var.set(status)
+        
+        # Sửa trực tiếp trên ô của bảng
+        def edit_cell(event):
+            item = review_tree.identify_row(event.y)
+            column = review_tree.identify_column(event.x)
+            if not item or not column:
+                return
+            
+            if column == '#1':
+                self.edit_tree_cell(review_tree, item, column, list(type_values), readonly=True,
+                                    on_save=lambda value: change_type(item, value))
+            elif column == '#2':
+                trans_type = type_values[review_tree.set(item, '#1')]
+                self.edit_tree_cell(review_tree, item, column,
+                                    available_categories.get(trans_type, []), readonly=True)
+            else:
+                self.edit_tree_cell(review_tree, item, column)
+        
+        def change_type(item, type_label):
+            review_tree.set(item, '#1', type_label)
+            # Đổi loại -> danh mục cũ có thể không còn hợp lệ
+            categories = available_categories.get(type_values[type_label], [])
+            if review_tree.set(item, '#2') not in categories:
+                review_tree.set(item, '#2', 'Khác' if 'Khác' in categories else (categories[0] if categories else ''))
+        
+        review_tree.bind('<Double-1>', edit_cell)
+        
+        def delete_selected():
+            for item in review_tree.selection():
+                review_tree.delete(item)
+        
+        # Thêm tất cả giao dịch trong một transaction
+        def insert_all():
+            rows = []
+            for index, item in enumerate(review_tree.get_children(), start=1):
+                type_label, category, amount, description, date = review_tree.item(item, 'values')
+                try:
+                    amount = parse_amount_input(amount)
+                    datetime.strptime(date, '%Y-%m-%d')
+                except ValueError:
+                    messagebox.showerror("Lỗi", f"Dòng {index}: số tiền hoặc ngày không hợp lệ!",
+                                         parent=bulk_window)
+                    return
+                if amount <= 0 or type_label not in type_values or not category:
+                    messagebox.showerror("Lỗi", f"Dòng {index}: dữ liệu không hợp lệ!",
+                                         parent=bulk_window)
+                    return
+                rows.append((type_values[type_label], category, amount, description, date, self.user_id))
+            
+            if not rows:
+                messagebox.showwarning("Cảnh báo", "Không có giao dịch nào để thêm.", parent=bulk_window)
+                return
+            
+            try:
+                with self.conn:
+                    self.cursor.executemany('''
+                        INSERT INTO transactions (type, category, amount, description, date, user_id)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    ''', rows)
+                    for trans_type, category, amount, description, date, user_id in rows:
+                        self.category_classifier.learn(description, category, trans_type)
+            except Exception as e:
+                self.category_classifier.discard_learned()
+                messagebox.showerror("Lỗi", f"Có lỗi xảy ra: {str(e)}", parent=bulk_window)
+                return
+            self.category_classifier.apply_learned()
+            
+            messagebox.showinfo("Thành công", f"Đã thêm {len(rows)} giao dịch!", parent=bulk_window)
+            self.load_transactions()
+            self.check_budget_warning()
+            bulk_window.destroy()
+        
+        analyze_btn = tk.Button(action_frame, text="🤖 Phân tích", command=analyze,
+                                bg="#FF5722", fg="white", font=("Arial", 10, "bold"),
+                                cursor="hand2", padx=15, relief=tk.FLAT)
+        analyze_btn.pack(side=tk.LEFT)
+        
+        bottom_frame = tk.Frame(main_frame, bg="white")
+        bottom_frame.pack(fill=tk.X, pady=(8, 0))
+        
+        tk.Button(bottom_frame, text="🗑️ Xóa dòng đã chọn", command=delete_selected,
+                 bg="#9E9E9E", fg="white", font=("Arial", 10, "bold"),
+                 cursor="hand2", padx=15, relief=tk.FLAT).pack(side=tk.LEFT)
+        tk.Button(bottom_frame, text="✅ Thêm tất cả", command=insert_all,
+                 bg="#4CAF50", fg="white", font=("Arial", 10, "bold"),
+                 cursor="hand2", padx=15, relief=tk.FLAT).pack(side=tk.RIGHT)
+    
     def open_receipt_ocr(self):
         """Mở cửa sổ quét hóa đơn"""
-        if not self.receipt_ocr:
+        if not self.service_available('receipt_ocr') or not self.receipt_ocr:
+            self.update_ai_buttons()
             messagebox.showwarning("Chưa cấu hình",
                                  "Tính năng Quét Hóa Đơn chưa được cấu hình.\n\n"
                                  "Vui lòng:\n"
@@ -2618,7 +2929,7 @@ class FinanceManager:
         
         ocr_window = tk.Toplevel(self.root)
         ocr_window.title("📷 Quét Hóa Đơn - AI OCR")
-        ocr_window.geometry("700x650")
+        ocr_window.geometry("820x650")
         ocr_window.configure(bg="#f5f5f5")
         
         # Frame chính
@@ -2699,6 +3010,13 @@ class FinanceManager:
                                         state=tk.DISABLED)
         self.add_receipt_btn.pack(side=tk.LEFT, padx=5)
         
+        # Nút quét nhiều hóa đơn
+        tk.Button(button_frame, text="🗂️ Quét Nhiều Ảnh",
+                 command=lambda: self.open_receipt_batch(ocr_window),
+                 bg="#795548", fg="white",
+                 font=("Arial", 10, "bold"),
+                 cursor="hand2", padx=20, pady=8).pack(side=tk.RIGHT, padx=5)
+        
         # Hướng dẫn
         help_frame = tk.Frame(main_frame, bg="#E3F2FD", relief=tk.FLAT, bd=1)
         help_frame.pack(fill=tk.X, pady=(10, 0))
@@ -2707,6 +3025,7 @@ class FinanceManager:
 1. Click 'Chọn Ảnh' để chọn ảnh hóa đơn (JPG, PNG)
 2. Click 'Quét Hóa Đơn' để AI phân tích
 3. Kiểm tra thông tin và click 'Thêm Giao Dịch'
+4. Nhiều hóa đơn: click 'Quét Nhiều Ảnh' để quét cả thư mục
 
 📝 Lưu ý: Ảnh nên rõ nét, đủ sáng để AI đọc tốt nhất"""
         
@@ -2764,15 +3083,35 @@ class FinanceManager:
         self.ocr_info_text.delete(1.0, tk.END)
         self.ocr_info_text.insert(1.0, "🔍 Đang quét hóa đơn...\nVui lòng đợi...")
         self.ocr_info_text.config(state=tk.DISABLED)
-        self.ocr_info_text.update()
         
         # Disable buttons
         self.scan_btn.config(state=tk.DISABLED)
         
+        # Gọi API OCR ở luồng nền để giao diện không bị treo
+        image_path = self.current_image_path
+        result_queue = queue.Queue()
+        
+        def worker():
+            try:
+                result_queue.put(self.receipt_ocr.extract_receipt_info(image_path))
+            except Exception as e:
+                result_queue.put({'success': False, 'error': str(e)})
+        
+        threading.Thread(target=worker, daemon=True).start()
+        self.root.after(50, lambda: self._poll_receipt_scan(result_queue))
+    
+    def _poll_receipt_scan(self, result_queue):
+        """Chờ kết quả quét hóa đơn từ luồng nền rồi hiển thị"""
+        try:
+            result = result_queue.get_nowait()
+        except queue.Empty:
+            self.root.after(50, lambda: self._poll_receipt_scan(result_queue))
+            return
+        
+        if not self.scan_btn.winfo_exists():
+            return
+        
         try:
-            # Gọi API OCR
-            result = self.receipt_ocr.extract_receipt_info(self.current_image_path)
-            
             if result['success']:
                 data = result['data']
                 self.current_receipt_data = data
@@ -2788,7 +3127,7 @@ class FinanceManager:
 📅 Ngày: {data['date']}
 🏪 Cửa hàng: {data.get('merchant', 'N/A')}
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
+{self._format_ocr_stats(result.get('stats', {}))}
 ✅ Kiểm tra thông tin và click 'Thêm Giao Dịch' để lưu."""
                 
                 self.ocr_info_text.config(state=tk.NORMAL)
@@ -2821,6 +3160,19 @@ class FinanceManager:
             # Enable lại nút quét
             self.scan_btn.config(state=tk.NORMAL)
     
+    @staticmethod
+    def _format_ocr_stats(stats):
+        """Dòng thống kê dung lượng ảnh gửi cho AI (trước -> sau tiền xử lý)"""
+        if stats.get('cached'):
+            return "⚡ Kết quả từ bộ nhớ đệm (không gọi AI)\n"
+        if not stats.get('original_bytes'):
+            return ""
+        line = (f"📦 Ảnh gửi AI: {format_bytes(stats['original_bytes'])} → "
+                f"{format_bytes(stats['upload_bytes'])}")
+        if 'api_ms' in stats:
+            line += f" ({stats['api_ms'] / 1000:.1f}s)"
+        return line + "\n"
+    
     def add_receipt_transaction(self):
         """Thêm giao dịch từ hóa đơn đã quét"""
         if not self.current_receipt_data:
@@ -2836,8 +3188,10 @@ class FinanceManager:
                 VALUES (?, ?, ?, ?, ?, ?)
             ''', (self.user_id, data['type'], data['amount'], 
                   data['category'], data['description'], data['date']))
+            self.category_classifier.learn(data['description'], data['category'], data['type'])
             
             self.conn.commit()
+            self.category_classifier.apply_learned()
             
             # Cập nhật danh sách
             self.load_transactions()
@@ -2864,144 +3218,675 @@ class FinanceManager:
         except Exception as e:
             messagebox.showerror("Lỗi", f"Không thể thêm giao dịch: {str(e)}")
     
+    def open_receipt_batch(self, parent=None):
+        """Mở cửa sổ quét nhiều hóa đơn cùng lúc (chọn nhiều ảnh hoặc cả thư mục)"""
+        batch_window = tk.Toplevel(parent or self.root)
+        batch_window.title("🗂️ Quét Nhiều Hóa Đơn - AI OCR")
+        batch_window.geometry("1000x650")
+        batch_window.configure(bg="#f5f5f5")
+        
+        main_frame = tk.Frame(batch_window, bg="white", padx=15, pady=15)
+        main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        action_frame = tk.Frame(main_frame, bg="white")
+        action_frame.pack(fill=tk.X, pady=(0, 8))
+        
+        status_var = tk.StringVar(value="Chọn ảnh hoặc thư mục hóa đơn để bắt đầu quét.")
+        tk.Label(action_frame, textvariable=status_var, bg="white",
+                font=("Arial", 9), fg="#666").pack(side=tk.RIGHT)
+        
+        # Bảng kết quả: cột đầu là trạng thái duyệt của từng hóa đơn
+        review_frame = tk.LabelFrame(main_frame, text="🔎 Xem lại (nháy đúp để sửa, Space để nhận/bỏ)",
+                                     bg="white", font=("Arial", 10, "bold"), fg="#FF9800")
+        review_frame.pack(fill=tk.BOTH, expand=True)
+        
+        columns = ("Trạng thái", "Ảnh", "Số tiền", "Danh mục", "Mô tả", "Ngày", "Cửa hàng")
+        review_tree = ttk.Treeview(review_frame, columns=columns,
+                                   show="headings", height=15)
+        widths = {"Trạng thái": 90, "Ảnh": 150, "Số tiền": 100, "Danh mục": 100,
+                  "Mô tả": 230, "Ngày": 90, "Cửa hàng": 140}
+        for column in columns:
+            review_tree.heading(column, text=column)
+            review_tree.column(column, width=widths[column],
+                               anchor="e" if column == "Số tiền" else "w")
+        review_tree.tag_configure('rejected', foreground="#999")
+        review_tree.tag_configure('failed', foreground="#F44336")
+        
+        scrollbar = ttk.Scrollbar(review_frame, orient=tk.VERTICAL, command=review_tree.yview)
+        review_tree.configure(yscroll=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        review_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(10, 0), pady=5)
+        
+        ACCEPTED, REJECTED, PENDING, FAILED = "✅ Nhận", "❌ Bỏ", "⏳ Đang quét", "⚠️ Lỗi"
+        expense_categories = self.get_available_categories()['expense']
+        state = {'scanner': None, 'items': {}, 'types': {}, 'total': 0}
+        
+        def start_scan(image_paths):
+            if not image_paths:
+                return
+            if state['scanner'] is not None:
+                messagebox.showwarning("Đang quét", "Vui lòng đợi lượt quét hiện tại hoàn tất.",
+                                       parent=batch_window)
+                return
+            for item in review_tree.get_children():
+                review_tree.delete(item)
+            state['items'] = {}
+            state['types'] = {}
+            state['total'] = len(image_paths)
+            for index, path in enumerate(image_paths):
+                state['items'][index] = review_tree.insert("", tk.END, values=(
+                    PENDING, os.path.basename(path), "", "", "", "", ""))
+            
+            # Quét song song ở luồng nền, kết quả hiện dần theo thứ tự hoàn thành
+            scanner = ReceiptBatchScanner(self.receipt_ocr)
+            state['scanner'] = scanner
+            scanner.start(image_paths)
+            select_files_btn.config(state=tk.DISABLED)
+            select_folder_btn.config(state=tk.DISABLED)
+            stop_btn.config(state=tk.NORMAL)
+            update_status()
+            batch_window.after(100, poll_results)
+        
+        def select_files():
+            paths = filedialog.askopenfilenames(
+                parent=batch_window, title="Chọn ảnh hóa đơn",
+                filetypes=[("Image files", "*.jpg *.jpeg *.png *.webp *.bmp *.gif"),
+                           ("All files", "*.*")])
+            start_scan(list(paths))
+        
+        def select_folder():
+            folder = filedialog.askdirectory(parent=batch_window, title="Chọn thư mục hóa đơn")
+            if not folder:
+                return
+            paths = find_images(folder)
+            if not paths:
+                messagebox.showinfo("Thông báo", "Không tìm thấy ảnh trong thư mục.", parent=batch_window)
+                return
+            start_scan(paths)
+        
+        def update_status(finished=False):
+            scanner = state['scanner']
+            if scanner is None:
+                return
+            stats = scanner.stats
+            status = f"{stats['done']}/{state['total']} ảnh"
+            if stats['cached']:
+                status += f" - {stats['cached']} từ bộ nhớ đệm"
+            if stats['failed']:
+                status += f" - {stats['failed']} lỗi"
+            status_var.set(("✅ Xong: " if finished else "⏳ Đang quét: ") + status)
+        
+        def poll_results():
+            if not batch_window.winfo_exists():
+                return
+            scanner = state['scanner']
+            while True:
+                try:
+                    index, path, result = scanner.results.get_nowait()
+                except queue.Empty:
+                    break
+                if index is None:
+                    update_status(finished=True)
+                    state['scanner'] = None
+                    select_files_btn.config(state=tk.NORMAL)
+                    select_folder_btn.config(state=tk.NORMAL)
+                    stop_btn.config(state=tk.DISABLED)
+                    return
+                show_result(index, path, result)
+            update_status()
+            batch_window.after(100, poll_results)
+        
+        def show_result(index, path, result):
+            item = state['items'][index]
+            if not result['success']:
+                review_tree.item(item, values=(FAILED, os.path.basename(path), "", "",
+                                               result['error'], "", ""), tags=('failed',))
+                return
+            data = result['data']
+            state['types'][item] = data.get('type', 'expense')
+            review_tree.item(item, values=(
+                ACCEPTED, os.path.basename(path), f"{data['amount']:,.0f}", data['category'],
+                data['description'], data['date'], data.get('merchant', 'N/A')))
+        
+        def stop_scan():
+            if state['scanner'] is not None:
+                state['scanner'].cancel()
+                status_var.set("⏹️ Đang dừng (chờ các ảnh đang quét)...")
+        
+        # Nhận / bỏ các hóa đơn đang chọn (status=None -> đảo trạng thái)
+        def set_status(status=None):
+            for item in review_tree.selection():
+                current = review_tree.set(item, "Trạng thái")
+                if current not in (ACCEPTED, REJECTED):
+                    continue
+                new_status = status or (REJECTED if current == ACCEPTED else ACCEPTED)
+                review_tree.set(item, "Trạng thái", new_status)
+                review_tree.item(item, tags=('rejected',) if new_status == REJECTED else ())
+        
+        # Sửa trực tiếp trên ô (chỉ các hóa đơn đã quét xong)
+        def edit_cell(event):
+            item = review_tree.identify_row(event.y)
+            column = review_tree.identify_column(event.x)
+            if not item or not column or review_tree.set(item, "Trạng thái") not in (ACCEPTED, REJECTED):
+                return
+            
+            col_name = columns[int(column[1:]) - 1]
+            if col_name in ("Trạng thái", "Ảnh"):
+                set_status()
+                return
+            
+            self.edit_tree_cell(review_tree, item, column,
+                                expense_categories if col_name == "Danh mục" else None)
+        
+        review_tree.bind('<Double-1>', edit_cell)
+        review_tree.bind('<space>', lambda e: set_status())
+        
+        # Thêm các hóa đơn được nhận trong một transaction
+        def insert_accepted():
+            rows = []
+            for index, item in enumerate(review_tree.get_children(), start=1):
+                status, filename, amount, category, description, date, merchant = \
+                    review_tree.item(item, 'values')
+                if status != ACCEPTED:
+                    continue
+                try:
+                    amount = parse_amount_input(amount)
+                    datetime.strptime(date, '%Y-%m-%d')
+                except ValueError:
+                    messagebox.showerror("Lỗi", f"Dòng {index} ({filename}): số tiền hoặc ngày không hợp lệ!",
+                                         parent=batch_window)
+                    return
+                if amount <= 0 or not category:
+                    messagebox.showerror("Lỗi", f"Dòng {index} ({filename}): dữ liệu không hợp lệ!",
+                                         parent=batch_window)
+                    return
+                rows.append((self.user_id, state['types'].get(item, 'expense'), amount,
+                             category, description, date))
+            
+            if not rows:
+                messagebox.showwarning("Cảnh báo", "Chưa có hóa đơn nào được nhận.", parent=batch_window)
+                return
+            
+            try:
+                with self.conn:
+                    self.cursor.executemany('''
+                        INSERT INTO transactions (user_id, type, amount, category, description, date)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    ''', rows)
+                    for user_id, trans_type, amount, category, description, date in rows:
+                        self.category_classifier.learn(description, category, trans_type)
+            except Exception as e:
+                self.category_classifier.discard_learned()
+                messagebox.showerror("Lỗi", f"Có lỗi xảy ra: {str(e)}", parent=batch_window)
+                return
+            self.category_classifier.apply_learned()
+            
+            messagebox.showinfo("Thành công", f"Đã thêm {len(rows)} giao dịch từ hóa đơn!",
+                                parent=batch_window)
+            self.load_transactions()
+            self.check_budget_warning()
+            batch_window.destroy()
+        
+        def on_close():
+            stop_scan()
+            batch_window.destroy()
+        
+        batch_window.protocol("WM_DELETE_WINDOW", on_close)
+        
+        select_files_btn = tk.Button(action_frame, text="📁 Chọn nhiều ảnh", command=select_files,
+                                     bg="#2196F3", fg="white", font=("Arial", 10, "bold"),
+                                     cursor="hand2", padx=15, relief=tk.FLAT)
+        select_files_btn.pack(side=tk.LEFT)
+        select_folder_btn = tk.Button(action_frame, text="📂 Chọn thư mục", command=select_folder,
+                                      bg="#2196F3", fg="white", font=("Arial", 10, "bold"),
+                                      cursor="hand2", padx=15, relief=tk.FLAT)
+        select_folder_btn.pack(side=tk.LEFT, padx=5)
+        stop_btn = tk.Button(action_frame, text="⏹️ Dừng", command=stop_scan,
+                             bg="#9E9E9E", fg="white", font=("Arial", 10, "bold"),
+                             cursor="hand2", padx=15, relief=tk.FLAT, state=tk.DISABLED)
+        stop_btn.pack(side=tk.LEFT)
+        
+        bottom_frame = tk.Frame(main_frame, bg="white")
+        bottom_frame.pack(fill=tk.X, pady=(8, 0))
+        
+        tk.Button(bottom_frame, text="✅ Nhận", command=lambda: set_status(ACCEPTED),
+                 bg="#8BC34A", fg="white", font=("Arial", 10, "bold"),
+                 cursor="hand2", padx=15, relief=tk.FLAT).pack(side=tk.LEFT)
+        tk.Button(bottom_frame, text="❌ Bỏ", command=lambda: set_status(REJECTED),
+                 bg="#9E9E9E", fg="white", font=("Arial", 10, "bold"),
+                 cursor="hand2", padx=15, relief=tk.FLAT).pack(side=tk.LEFT, padx=5)
+        tk.Button(bottom_frame, text="💾 Thêm các hóa đơn đã nhận", command=insert_accepted,
+                 bg="#4CAF50", fg="white", font=("Arial", 10, "bold"),
+                 cursor="hand2", padx=15, relief=tk.FLAT).pack(side=tk.RIGHT)
+    
     def update_gold_price(self):
-        """Cập nhật giá vàng hiện tại"""
-        if not GOLD_PRICE_AVAILABLE or not self.gold_api:
+        """Yêu cầu cập nhật giá vàng (lấy trên luồng nền, không chặn giao diện)"""
+        if not self.quote_service:
             self.gold_price_label.config(
                 text="⚠️ Chưa khả dụng\n\nCài: pip install\nrequests",
                 fg="#999"
             )
             return
         
-        try:
-            # Hiển thị đang tải
-            self.gold_price_label.config(text="⏳ Đang tải...", fg="#666")
-            self.gold_price_label.update()
-            
-            # Gọi API
-            result = self.gold_api.get_current_price()
-            
-            if result['success']:
-                price_per_gram = result['price_per_gram']
-                change_24h = result['change_24h']
-                timestamp = result['timestamp']
-                is_reference = 'note' in result
-                
-                # Lấy giá USD/ounce
-                price_usd_ounce = result['price'] / 24500  # Chuyển ngược lại từ VND sang USD
-                
-                # Icon và màu cho thay đổi
-                if change_24h > 0:
-                    change_icon = "📈"
-                    change_color = "#4CAF50"
-                elif change_24h < 0:
-                    change_icon = "📉"
-                    change_color = "#F44336"
-                else:
-                    change_icon = "➡️"
-                    change_color = "#FF9800"
-                
-                # Format text ngắn gọn - hiển thị USD
-                price_text = f"""💎 XAU
-
-${price_usd_ounce:,.0f}"""
-                
-                if not is_reference and change_24h != 0:
-                    price_text += f"\n{change_icon}{abs(change_24h):.1f}%"
-                
-                price_text += f"\n\n{timestamp.strftime('%H:%M')}"
-                
-                self.gold_price_label.config(text=price_text, fg=change_color)
-            else:
-                # Lỗi ngắn gọn
-                self.gold_price_label.config(
-                    text=f"❌ Lỗi\n\nThử lại",
-                    fg="#F44336"
-                )
+        self.gold_price_label.config(text="⏳ Đang tải...", fg="#666")
+        self.request_quotes('gold')
+    
+    def update_btc_price(self):
+        """Yêu cầu cập nhật giá Bitcoin (lấy trên luồng nền, không chặn giao diện)"""
+        if not self.quote_service:
+            self.btc_price_label.config(
+                text="⚠️ Chưa khả dụng\n\nCài: pip install\nrequests",
+                fg="#999"
+            )
+            return
         
-        except Exception as e:
+        self.btc_price_label.config(text="⏳", fg="#666")
+        self.request_quotes('btc')
+    
+    def start_price_updates(self):
+        """Tạo dịch vụ giá, hiện giá đã lưu rồi hẹn giờ cập nhật định kỳ"""
+        # Hiện ngay giá đã lưu (đánh dấu cũ) rồi cập nhật nền
+        self.show_cached_prices()
+        
+        # Auto-refresh mỗi 5 phút (giãn ra khi lỗi, dừng khi thu nhỏ cửa sổ)
+        if self.quote_service:
+            self.price_scheduler = RefreshScheduler(self.root)
+            self.price_scheduler.add('quotes', self.request_quotes)
+            self.price_scheduler.start()
+    
+    def show_cached_prices(self):
+        """Hiện giá đã lưu từ lần chạy trước, sau đó lấy giá mới trên luồng nền"""
+        if not self.quote_service:
+            self.update_gold_price()
+            self.update_btc_price()
+            return
+        
+        for asset in ('fx', 'gold', 'btc'):
+            cached = self.quote_service.cached(asset)
+            if cached is not None:
+                self.show_quote(asset, cached)
+        self.revalue_portfolio(save=False)
+        self.request_quotes()
+    
+    def request_quotes(self, *assets):
+        """Gửi yêu cầu cho dịch vụ giá và bắt đầu đọc kết quả nếu chưa đọc"""
+        self.quote_service.request(*assets)
+        if not self.quote_polling:
+            self.quote_polling = True
+            self.root.after(100, self.poll_quotes)
+    
+    def poll_quotes(self):
+        """Hiển thị kết quả giá từ luồng nền (chạy trên luồng Tk qua after)"""
+        # Đọc busy trước khi lấy kết quả: luồng nền đẩy kết quả trước khi bỏ khỏi pending
+        busy = self.quote_service.busy
+        for asset, result in self.quote_service.poll():
+            self.show_quote(asset, result)
+            # Giá cũ / giá tham khảo kèm 'error' vẫn là một lần gọi API thất bại
+            if not result.get('success') or result.get('error'):
+                self.quote_failed = True
+        
+        if busy:
+            self.root.after(100, self.poll_quotes)
+        else:
+            self.quote_polling = False
+            self.revalue_portfolio()
+            if self.price_scheduler:
+                self.price_scheduler.report(not self.quote_failed)
+            self.quote_failed = False
+    
+    def show_quote(self, asset, result):
+        """Cập nhật giao diện theo một kết quả giá ('fx' chỉ đổi tỷ giá quy đổi VNĐ)"""
+        if result.get('success'):
+            self.latest_quotes[asset] = result
+        if asset == 'fx':
+            if result.get('success'):
+                self.usd_to_vnd = result['rate']
+        elif asset == 'gold':
+            self.show_gold_price(result)
+        elif asset == 'btc':
+            self.show_btc_price(result)
+    
+    @staticmethod
+    def quote_time_text(result):
+        """Dòng thời gian của giá; giá cũ (đã lưu / API lỗi) được đánh dấu"""
+        timestamp = result['timestamp']
+        text = timestamp.strftime('%H:%M' if timestamp.date() == datetime.now().date() else '%d/%m %H:%M')
+        if result.get('stale'):
+            text = f"🕓 {text} (cũ)"
+        return text
+    
+    @staticmethod
+    def price_change_style(change_24h, neutral_color):
+        """Icon và màu cho thay đổi giá 24h"""
+        if change_24h > 0:
+            return "📈", "#4CAF50"
+        if change_24h < 0:
+            return "📉", "#F44336"
+        return "➡️", neutral_color
+    
+    def show_gold_price(self, result):
+        """Hiển thị giá vàng lên nhãn"""
+        if not result.get('success'):
+            # Lỗi ngắn gọn
             self.gold_price_label.config(
-                text=f"❌ Lỗi",
+                text=f"❌ Lỗi\n\nThử lại",
                 fg="#F44336"
             )
-    
-    def update_btc_price(self):
-        """Cập nhật giá Bitcoin hiện tại"""
-        try:
-            # Hiển thị đang tải
-            self.btc_price_label.config(text="⏳", fg="#666")
-            self.btc_price_label.update()
-            
-            # Gọi API CoinGecko (miễn phí, không cần key)
-            import requests
-            url = "https://api.coingecko.com/api/v3/simple/price?ids=bitcoin&vs_currencies=usd&include_24hr_change=true"
-            
-            response = requests.get(url, timeout=5)
-            
-            if response.status_code == 200:
-                data = response.json()
-                price_usd = data['bitcoin']['usd']
-                change_24h = data['bitcoin'].get('usd_24h_change', 0)
-                
-                # Icon và màu cho thay đổi
-                if change_24h > 0:
-                    change_icon = "📈"
-                    change_color = "#4CAF50"
-                elif change_24h < 0:
-                    change_icon = "📉"
-                    change_color = "#F44336"
-                else:
-                    change_icon = "➡️"
-                    change_color = "#F7931A"
-                
-                # Format text ngắn gọn
-                from datetime import datetime
-                price_text = f"""₿ BTC
+            return
+        
+        change_24h = result['change_24h']
+        is_reference = 'note' in result
+        
+        # Lấy giá USD/ounce
+        price_usd_ounce = result['price_usd']
+        change_icon, change_color = self.price_change_style(change_24h, "#FF9800")
+        
+        # Format text ngắn gọn - hiển thị USD
+        price_text = f"""💎 XAU
 
-${price_usd:,.0f}"""
-                
-                if change_24h != 0:
-                    price_text += f"\n{change_icon}{abs(change_24h):.1f}%"
-                
-                price_text += f"\n\n{datetime.now().strftime('%H:%M')}"
-                
-                self.btc_price_label.config(text=price_text, fg=change_color)
-            else:
-                self.btc_price_label.config(
-                    text=f"❌ Lỗi\n\nThử lại",
-                    fg="#F44336"
-                )
+${price_usd_ounce:,.0f}"""
         
-        except Exception as e:
+        if not is_reference and change_24h != 0:
+            price_text += f"\n{change_icon}{abs(change_24h):.1f}%"
+        
+        # Quy đổi VNĐ/chỉ theo tỷ giá thật (chỉ khi đã có tỷ giá)
+        if self.usd_to_vnd:
+            price_per_chi = price_usd_ounce / GRAMS_PER_OUNCE * GRAMS_PER_CHI * self.usd_to_vnd
+            price_text += f"\n≈{price_per_chi / 1e6:,.2f}tr/chỉ"
+        
+        price_text += f"\n\n{self.quote_time_text(result)}"
+        
+        self.gold_price_label.config(text=price_text, fg="#999" if result.get('stale') else change_color)
+    
+    def show_btc_price(self, result):
+        """Hiển thị giá Bitcoin lên nhãn"""
+        if not result.get('success'):
             self.btc_price_label.config(
-                text=f"❌ Lỗi",
+                text=f"❌ Lỗi\n\nThử lại",
                 fg="#F44336"
             )
+            return
+        
+        change_24h = result['change_24h']
+        change_icon, change_color = self.price_change_style(change_24h, "#F7931A")
+        
+        # Format text ngắn gọn
+        price_text = f"""₿ BTC
+
+${result['price_usd']:,.0f}"""
+        
+        if change_24h != 0:
+            price_text += f"\n{change_icon}{abs(change_24h):.1f}%"
+        
+        if self.usd_to_vnd:
+            price_text += f"\n≈{result['price_usd'] * self.usd_to_vnd / 1e9:,.2f} tỷ₫"
+        
+        price_text += f"\n\n{self.quote_time_text(result)}"
+        
+        self.btc_price_label.config(text=price_text, fg="#999" if result.get('stale') else change_color)
+    
+    def show_price_history(self, asset):
+        """Biểu đồ lịch sử giá vàng / Bitcoin (giảm mẫu trong SQLite theo độ rộng biểu đồ)"""
+        if not self.quote_service or self.quote_service.history is None:
+            messagebox.showwarning("Cảnh báo", "Chức năng giá vàng / Bitcoin chưa khả dụng!")
+            return
+        
+        history = self.quote_service.history
+        name, color = {'gold': ("Vàng (USD/ounce)", "#FF9800"),
+                       'btc': ("Bitcoin (USD)", "#F7931A")}[asset]
+        ranges = [("24 giờ", 1), ("7 ngày", 7), ("30 ngày", 30), ("1 năm", 365), ("Tất cả", None)]
+        
+        chart_window = tk.Toplevel(self.root)
+        chart_window.title(f"Lịch Sử Giá {name}")
+        chart_window.geometry("900x550")
+        
+        top_frame = tk.Frame(chart_window, bg="white")
+        top_frame.pack(fill=tk.X, padx=10, pady=5)
+        range_var = tk.StringVar(value="30 ngày")
+        info_label = tk.Label(top_frame, text="", bg="white", fg="#666", font=("Arial", 9))
+        
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        fig = Figure(figsize=(9, 5))
+        ax = fig.add_subplot(111)
+        canvas = FigureCanvasTkAgg(fig, master=chart_window)
+        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        
+        def redraw():
+            days = dict(ranges)[range_var.get()]
+            end_ts = time.time()
+            start_ts = end_ts - days * 86400 if days else None
+            # Mỗi pixel ngang tối đa một điểm: dữ liệu nhiều năm vẫn vẽ nhanh
+            width = max(100, canvas.get_tk_widget().winfo_width())
+            points = history.series(asset, start_ts, end_ts, width)
+            total = history.count(asset)
+            
+            ax.clear()
+            if points:
+                times, prices = zip(*points)
+                ax.plot(times, prices, color=color, linewidth=1.2)
+                fig.autofmt_xdate()
+            else:
+                ax.text(0.5, 0.5, "Chưa có dữ liệu trong khoảng này",
+                        ha='center', va='center', transform=ax.transAxes, color='#999')
+            ax.set_title(f"Lịch Sử Giá {name} - {range_var.get()}", fontsize=13, fontweight='bold')
+            ax.set_ylabel("USD")
+            ax.grid(alpha=0.3)
+            canvas.draw()
+            info_label.config(text=f"Hiển thị {len(points):,} điểm / {total:,} điểm đã lưu")
+        
+        for label, _ in ranges:
+            tk.Radiobutton(top_frame, text=label, variable=range_var, value=label,
+                           command=redraw, bg="white", font=("Arial", 9),
+                           indicatoron=False, padx=8, selectcolor="#FFE0B2").pack(side=tk.LEFT, padx=2)
+        info_label.pack(side=tk.RIGHT)
+        
+        # Vẽ sau khi cửa sổ hiện để biết độ rộng thật của biểu đồ
+        chart_window.after(50, redraw)
     
-    def schedule_btc_price_update(self):
-        """Lên lịch cập nhật giá Bitcoin tự động mỗi 5 phút"""
-        # Auto-refresh sau 5 phút (300000 ms)
-        self.root.after(300000, self.update_btc_price)
-        self.root.after(300000, self.schedule_btc_price_update)
+    def revalue_portfolio(self, save=True):
+        """Định giá lại tài sản theo giá mới nhất và lưu ảnh chụp tài sản ròng của hôm nay"""
+        if not self.portfolio:
+            return
+        
+        self.valuation = self.portfolio.value(self.latest_quotes)
+        # Giá tham khảo cố định không phải giá thật -> không ghi vào lịch sử tài sản ròng
+        if save and not any('note' in quote for quote in self.latest_quotes.values()):
+            self.portfolio.save_snapshot(self.valuation)
+        
+        if self.valuation['by_asset']:
+            self.networth_button.config(text=f"💼 Tài sản: {self.valuation['total']:,.0f} VNĐ")
+        else:
+            self.networth_button.config(text="💼 Tài Sản Ròng")
+        if self.portfolio_refresh:
+            self.portfolio_refresh()
     
-    def schedule_gold_price_update(self):
-        """Lên lịch cập nhật giá vàng tự động mỗi 5 phút"""
-        # Auto-refresh sau 5 phút (300000 ms)
-        self.root.after(300000, self.update_gold_price)
-        self.root.after(300000, self.schedule_gold_price_update)
-
-    def display_message(self, sender, message, tag):
-        """Hiển thị tin nhắn trong chat"""
+    def open_portfolio(self):
+        """Mở cửa sổ quản lý tài sản nắm giữ (vàng, Bitcoin, tiết kiệm)"""
+        if not self.portfolio:
+            messagebox.showerror("Lỗi", "Chức năng tài sản chưa khả dụng!\n\n"
+                                       "Vui lòng cài đặt: pip install numpy requests")
+            return
+        
+        window = tk.Toplevel(self.root)
+        window.title("💼 Tài Sản Ròng")
+        window.geometry("760x520")
+        window.configure(bg="#f5f5f5")
+        
+        main_frame = tk.Frame(window, bg="white", padx=15, pady=15)
+        main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        # Form thêm tài sản
+        form_frame = tk.LabelFrame(main_frame, text="➕ Thêm tài sản", bg="white",
+                                   font=("Arial", 10, "bold"), fg="#3F51B5", padx=10, pady=8)
+        form_frame.pack(fill=tk.X)
+        
+        asset_names = {name: asset for asset, (name, _) in ASSET_TYPES.items()}
+        asset_var = tk.StringVar(value=ASSET_TYPES['gold'][0])
+        quantity_var = tk.StringVar()
+        note_var = tk.StringVar()
+        unit_label = tk.Label(form_frame, text="gram", bg="white", width=6, anchor="w")
+        
+        tk.Label(form_frame, text="Loại:", bg="white").grid(row=0, column=0, sticky="w")
+        asset_combo = ttk.Combobox(form_frame, textvariable=asset_var, values=list(asset_names),
+                                   state="readonly", width=15)
+        asset_combo.grid(row=0, column=1, padx=5)
+        tk.Label(form_frame, text="Số lượng:", bg="white").grid(row=0, column=2, sticky="w")
+        tk.Entry(form_frame, textvariable=quantity_var, width=14).grid(row=0, column=3, padx=5)
+        unit_label.grid(row=0, column=4, sticky="w")
+        tk.Label(form_frame, text="Ghi chú:", bg="white").grid(row=0, column=5, sticky="w")
+        tk.Entry(form_frame, textvariable=note_var, width=18).grid(row=0, column=6, padx=5)
+        tk.Label(form_frame, text="Vàng tính theo gram (1 chỉ = 3.75 g, 1 lượng = 37.5 g)",
+                bg="white", fg="#999", font=("Arial", 8)).grid(row=1, column=0, columnspan=7,
+                                                                 sticky="w", pady=(4, 0))
+        
+        def on_asset_selected(event=None):
+            unit_label.config(text=ASSET_TYPES[asset_names[asset_var.get()]][1])
+        asset_combo.bind("<<ComboboxSelected>>", on_asset_selected)
+        
+        # Bảng tài sản
+        columns = ("Loại", "Số lượng", "Giá trị (VNĐ)", "Ghi chú")
+        tree = ttk.Treeview(main_frame, columns=columns, show="headings", height=10)
+        widths = {"Loại": 140, "Số lượng": 150, "Giá trị (VNĐ)": 170, "Ghi chú": 220}
+        for column in columns:
+            tree.heading(column, text=column)
+            tree.column(column, width=widths[column],
+                        anchor="e" if column in ("Số lượng", "Giá trị (VNĐ)") else "w")
+        tree.pack(fill=tk.BOTH, expand=True, pady=10)
+        
+        total_label = tk.Label(main_frame, text="", bg="white", font=("Arial", 12, "bold"),
+                               fg="#3F51B5", anchor="w", justify=tk.LEFT)
+        total_label.pack(fill=tk.X)
+        
+        def refresh():
+            for item in tree.get_children():
+                tree.delete(item)
+            valuation = self.valuation or self.portfolio.value(self.latest_quotes)
+            for (holding_id, asset, quantity, note), value in zip(self.portfolio.holdings(),
+                                                                   valuation['values']):
+                name, unit = ASSET_TYPES[asset]
+                value_text = "Chưa có giá" if value is None else f"{value:,.0f}"
+                tree.insert("", tk.END, iid=str(holding_id), values=(
+                    name, f"{quantity:,.8g} {unit}", value_text, note or ""))
+            
+            text = f"Tổng tài sản: {valuation['total']:,.0f} VNĐ"
+            if valuation['missing']:
+                missing = ", ".join(ASSET_TYPES[asset][0] for asset in valuation['missing'])
+                text += f"\n⚠️ Chưa có giá: {missing} (chưa tính vào tổng)"
+            total_label.config(text=text)
+        
+        def add_holding():
+            try:
+                quantity = float(quantity_var.get().replace(',', ''))
+            except ValueError:
+                messagebox.showerror("Lỗi", "Số lượng không hợp lệ!", parent=window)
+                return
+            if quantity <= 0:
+                messagebox.showerror("Lỗi", "Số lượng phải lớn hơn 0!", parent=window)
+                return
+            self.portfolio.add(asset_names[asset_var.get()], quantity, note_var.get().strip())
+            quantity_var.set("")
+            note_var.set("")
+            self.revalue_portfolio()
+        
+        def delete_holding():
+            selected = tree.selection()
+            if not selected:
+                messagebox.showwarning("Cảnh báo", "Vui lòng chọn tài sản cần xóa!", parent=window)
+                return
+            if messagebox.askyesno("Xác nhận", "Xóa tài sản đã chọn?", parent=window):
+                for item in selected:
+                    self.portfolio.delete(int(item))
+                self.revalue_portfolio()
+        
+        tk.Button(form_frame, text="Thêm", command=add_holding, bg="#4CAF50", fg="white",
+                 font=("Arial", 9, "bold"), cursor="hand2", padx=10).grid(row=0, column=7, padx=5)
+        
+        bottom_frame = tk.Frame(main_frame, bg="white")
+        bottom_frame.pack(fill=tk.X, pady=(10, 0))
+        tk.Button(bottom_frame, text="🗑️ Xóa", command=delete_holding,
+                 bg="#F44336", fg="white", font=("Arial", 10, "bold"),
+                 cursor="hand2", padx=15, relief=tk.FLAT).pack(side=tk.LEFT)
+        tk.Button(bottom_frame, text="📈 Biểu đồ tài sản ròng", command=self.show_networth_chart,
+                 bg="#3F51B5", fg="white", font=("Arial", 10, "bold"),
+                 cursor="hand2", padx=15, relief=tk.FLAT).pack(side=tk.RIGHT)
+        
+        def on_close():
+            self.portfolio_refresh = None
+            window.destroy()
+        
+        window.protocol("WM_DELETE_WINDOW", on_close)
+        self.portfolio_refresh = refresh
+        refresh()
+    
+    def show_networth_chart(self):
+        """Biểu đồ tài sản ròng theo ngày (đọc các ảnh chụp đã lưu)"""
+        snapshots = self.portfolio.snapshots()
+        if not snapshots:
+            messagebox.showinfo("Thông báo", "Chưa có dữ liệu tài sản ròng.\n"
+                                            "Dữ liệu được ghi mỗi ngày khi có giá mới.")
+            return
+        
+        chart_window = tk.Toplevel(self.root)
+        chart_window.title("Biểu Đồ Tài Sản Ròng")
+        chart_window.geometry("900x550")
+        
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        fig = Figure(figsize=(9, 5.5))
+        ax = fig.add_subplot(111)
+        days = [day for day, _, _ in snapshots]
+        
+        # Đường tổng và vùng xếp chồng theo loại tài sản
+        assets = [asset for asset in ASSET_TYPES
+                  if any(asset in breakdown for _, _, breakdown in snapshots)]
+        colors = {'gold': "#FFC107", 'btc': "#F7931A", 'vnd': "#4CAF50", 'usd': "#2196F3"}
+        ax.stackplot(days, *[[breakdown.get(asset, 0) for _, _, breakdown in snapshots]
+                             for asset in assets],
+                     labels=[ASSET_TYPES[asset][0] for asset in assets],
+                     colors=[colors[asset] for asset in assets], alpha=0.35)
+        ax.plot(days, [total for _, total, _ in snapshots], color="#3F51B5",
+                linewidth=2, marker='o' if len(snapshots) < 60 else None, label="Tổng")
+        
+        ax.set_title("Tài Sản Ròng Theo Ngày", fontsize=14, fontweight='bold')
+        ax.set_ylabel("VNĐ")
+        ax.yaxis.set_major_formatter(lambda value, _: f"{value / 1e6:,.0f}tr")
+        ax.legend(loc='upper left')
+        ax.grid(alpha=0.3)
+        fig.autofmt_xdate()
+        
+        canvas = FigureCanvasTkAgg(fig, master=chart_window)
+        canvas.draw()
+        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+    
+    def on_close(self):
+        """Đóng ứng dụng: dừng dịch vụ giá chạy nền rồi hủy cửa sổ"""
+        if self.price_scheduler:
+            self.price_scheduler.stop()
+        self.chart_manager.close()
+        # Chỉ dừng dịch vụ đã được tạo, không tạo mới lúc thoát
+        lazy = self.services.get('quote_service')
+        if lazy and lazy.instance:
+            lazy.instance.stop()
+        self.root.destroy()
+
+    def display_message_header(self, sender, tag):
+        """Hiển thị dòng tiêu đề (người gửi, thời gian) của một tin nhắn"""
         current_time = datetime.now().strftime("%H:%M")
         
         self.chat_display.insert(tk.END, f"\n{'─' * 80}\n")
         self.chat_display.insert(tk.END, f"{sender}", tag)
         self.chat_display.insert(tk.END, f" • {current_time}\n", "time")
+    
+    def display_message(self, sender, message, tag):
+        """Hiển thị tin nhắn trong chat"""
+        self.display_message_header(sender, tag)
         self.chat_display.insert(tk.END, f"{message}\n")
         self.chat_display.see(tk.END)
 
 def hash_password(password):
     """Mã hóa mật khẩu bằng SHA-256"""
+    import hashlib
     return hashlib.sha256(password.encode()).hexdigest()
 
 class LoginWindow:
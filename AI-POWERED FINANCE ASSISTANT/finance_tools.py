@@ -0,0 +1,237 @@
+"""
+Module các hàm tổng hợp dữ liệu tài chính cho ChatBot gọi (function calling)
+Thay vì gửi kèm tổng quan tháng hiện tại trong mọi tin nhắn, model tự gọi
+đúng hàm với khoảng thời gian / danh mục cần thiết và chỉ nhận về số liệu đó.
+Các hàm chạy trên luồng nền của ChatBot nên dùng kết nối SQLite riêng.
+"""
+
+import sqlite3
+import threading
+from datetime import datetime, date
+
+MAX_ROWS = 20
+
+# Khai báo hàm cho Gemini (schema kiểu OpenAPI)
+_PERIOD_PROPERTIES = {
+    'start_date': {'type': 'STRING', 'description': "Ngày bắt đầu, định dạng YYYY-MM-DD"},
+    'end_date': {'type': 'STRING', 'description': "Ngày kết thúc (tính cả ngày này), định dạng YYYY-MM-DD"},
+}
+
+TOOL_DECLARATIONS = [
+    {
+        'name': 'spend_by_category',
+        'description': "Tổng thu hoặc chi theo từng danh mục trong một khoảng thời gian, "
+                       "kèm tổng cộng và số giao dịch.",
+        'parameters': {
+            'type': 'OBJECT',
+            'properties': dict(_PERIOD_PROPERTIES, **{
+                'type': {'type': 'STRING', 'description': "'expense' (chi tiêu, mặc định) hoặc 'income' (thu nhập)"},
+                'category': {'type': 'STRING', 'description': "Chỉ tính một danh mục (tùy chọn)"},
+            }),
+            'required': ['start_date', 'end_date'],
+        },
+    },
+    {
+        'name': 'spending_trend',
+        'description': "Thu, chi và số dư theo từng tháng trong các tháng gần đây "
+                       "(có thể lọc theo danh mục chi tiêu).",
+        'parameters': {
+            'type': 'OBJECT',
+            'properties': {
+                'months': {'type': 'INTEGER', 'description': "Số tháng gần nhất (1-24, mặc định 6)"},
+                'category': {'type': 'STRING', 'description': "Chỉ tính một danh mục chi tiêu (tùy chọn)"},
+            },
+        },
+    },
+    {
+        'name': 'budget_status',
+        'description': "Hạn mức chi tiêu của một tháng, số đã chi và phần trăm đã dùng.",
+        'parameters': {
+            'type': 'OBJECT',
+            'properties': {
+                'month': {'type': 'INTEGER', 'description': "Tháng 1-12 (mặc định tháng hiện tại)"},
+                'year': {'type': 'INTEGER', 'description': "Năm (mặc định năm hiện tại)"},
+            },
+        },
+    },
+    {
+        'name': 'largest_transactions',
+        'description': "Các giao dịch có số tiền lớn nhất trong một khoảng thời gian.",
+        'parameters': {
+            'type': 'OBJECT',
+            'properties': dict(_PERIOD_PROPERTIES, **{
+                'type': {'type': 'STRING', 'description': "'expense' (mặc định) hoặc 'income'"},
+                'category': {'type': 'STRING', 'description': "Chỉ lấy một danh mục (tùy chọn)"},
+                'limit': {'type': 'INTEGER', 'description': "Số giao dịch (1-20, mặc định 5)"},
+            }),
+            'required': ['start_date', 'end_date'],
+        },
+    },
+]
+
+
+def _parse_date(value, name):
+    try:
+        return datetime.strptime(str(value), '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"{name} phải có định dạng YYYY-MM-DD")
+
+
+def _trans_type(value):
+    value = (value or 'expense').lower()
+    if value not in ('income', 'expense'):
+        raise ValueError("type phải là 'income' hoặc 'expense'")
+    return value
+
+
+def _bounded_int(value, default, low, high):
+    try:
+        return max(low, min(high, int(value)))
+    except (TypeError, ValueError):
+        return default
+
+
+class FinanceTools:
+    """Các hàm tổng hợp có tham số, đọc dữ liệu của một user"""
+
+    def __init__(self, db_path, user_id):
+        """
+        Args:
+            db_path: Đường dẫn file database (không dùng được với ':memory:')
+            user_id: ID người dùng
+        """
+        self.user_id = user_id
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.calls = 0
+
+        self.handlers = {
+            'spend_by_category': self.spend_by_category,
+            'spending_trend': self.spending_trend,
+            'budget_status': self.budget_status,
+            'largest_transactions': self.largest_transactions,
+        }
+
+    def call(self, name, args):
+        """
+        Thực thi hàm theo yêu cầu của model
+
+        Returns:
+            dict: Kết quả, hoặc {'error': ...} khi tên hàm / tham số không hợp lệ
+        """
+        handler = self.handlers.get(name)
+        if handler is None:
+            return {'error': f"Không có hàm {name}"}
+        self.calls += 1
+        try:
+            with self.lock:
+                return handler(**(args or {}))
+        except (TypeError, ValueError) as e:
+            return {'error': str(e)}
+        except sqlite3.Error as e:
+            return {'error': f"Lỗi truy vấn dữ liệu: {e}"}
+
+    def spend_by_category(self, start_date, end_date, type='expense', category=None):
+        start_date = _parse_date(start_date, 'start_date')
+        end_date = _parse_date(end_date, 'end_date')
+        trans_type = _trans_type(type)
+
+        query = '''
+            SELECT category, SUM(amount), COUNT(*)
+            FROM transactions
+            WHERE user_id = ? AND type = ? AND date(date) BETWEEN ? AND ?
+        '''
+        params = [self.user_id, trans_type, start_date, end_date]
+        if category:
+            query += ' AND category = ?'
+            params.append(category)
+        query += ' GROUP BY category ORDER BY SUM(amount) DESC'
+        rows = self.conn.execute(query, params).fetchall()
+
+        total = sum(row[1] for row in rows)
+        return {
+            'start_date': start_date, 'end_date': end_date, 'type': trans_type,
+            'total': total,
+            'transaction_count': sum(row[2] for row in rows),
+            'categories': [{'category': name, 'amount': amount, 'count': count,
+                            'percent': round(amount / total * 100, 1) if total else 0}
+                           for name, amount, count in rows[:MAX_ROWS]],
+        }
+
+    def spending_trend(self, months=6, category=None):
+        months = _bounded_int(months, 6, 1, 24)
+        if category:
+            query = '''
+                SELECT strftime('%Y-%m', date) AS month, 0, SUM(amount)
+                FROM transactions
+                WHERE user_id = ? AND type = 'expense' AND category = ?
+                GROUP BY month ORDER BY month DESC LIMIT ?
+            '''
+            params = (self.user_id, category, months)
+        else:
+            query = '''
+                SELECT strftime('%Y-%m', date) AS month,
+                       SUM(CASE WHEN type = 'income' THEN amount ELSE 0 END),
+                       SUM(CASE WHEN type = 'expense' THEN amount ELSE 0 END)
+                FROM transactions
+                WHERE user_id = ?
+                GROUP BY month ORDER BY month DESC LIMIT ?
+            '''
+            params = (self.user_id, months)
+        rows = self.conn.execute(query, params).fetchall()
+
+        result = {'months': [{'month': month, 'expense': expense} if category else
+                             {'month': month, 'income': income, 'expense': expense,
+                              'balance': income - expense}
+                             for month, income, expense in reversed(rows)]}
+        if category:
+            result['category'] = category
+        return result
+
+    def budget_status(self, month=None, year=None):
+        today = date.today()
+        month = _bounded_int(month, today.month, 1, 12)
+        year = _bounded_int(year, today.year, 1900, 9999)
+        period = f"{year:04d}-{month:02d}"
+
+        row = self.conn.execute('''
+            SELECT limit_amount FROM budget_limits
+            WHERE user_id = ? AND month = ? AND year = ?
+        ''', (self.user_id, month, year)).fetchone()
+        spent = self.conn.execute('''
+            SELECT COALESCE(SUM(amount), 0) FROM transactions
+            WHERE user_id = ? AND type = 'expense' AND strftime('%Y-%m', date) = ?
+        ''', (self.user_id, period)).fetchone()[0]
+
+        limit_amount = row[0] if row and row[0] else None
+        result = {'month': period, 'spent': spent, 'limit': limit_amount}
+        if limit_amount:
+            result['used_percent'] = round(spent / limit_amount * 100, 1)
+            result['remaining'] = limit_amount - spent
+        return result
+
+    def largest_transactions(self, start_date, end_date, type='expense', category=None, limit=5):
+        start_date = _parse_date(start_date, 'start_date')
+        end_date = _parse_date(end_date, 'end_date')
+        trans_type = _trans_type(type)
+        limit = _bounded_int(limit, 5, 1, MAX_ROWS)
+
+        query = '''
+            SELECT date, category, amount, description
+            FROM transactions
+            WHERE user_id = ? AND type = ? AND date(date) BETWEEN ? AND ?
+        '''
+        params = [self.user_id, trans_type, start_date, end_date]
+        if category:
+            query += ' AND category = ?'
+            params.append(category)
+        query += ' ORDER BY amount DESC LIMIT ?'
+        params.append(limit)
+
+        rows = self.conn.execute(query, params).fetchall()
+        return {'transactions': [{'date': day, 'category': name, 'amount': amount,
+                                  'description': description or ''}
+                                 for day, name, amount, description in rows]}
+
+    def close(self):
+        self.conn.close()
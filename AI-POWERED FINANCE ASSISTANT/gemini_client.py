@@ -0,0 +1,313 @@
+"""
+Module dùng chung để gọi Google Gemini
+Mỗi tính năng (ChatBot, Nhập bằng AI, Quét hóa đơn) dùng API key riêng mà không
+gọi genai.configure (cấu hình toàn cục). Mọi lời gọi đi qua bộ giới hạn tốc độ
+(token bucket), thử lại với backoff + jitter, circuit breaker và timeout.
+
+google-generativeai không có tham số công khai để gắn client riêng cho từng
+GenerativeModel, nên module gán thuộc tính nội bộ GenerativeModel._client.
+SDK đã ngừng phát triển ở bản 0.8.x; requirements.txt giới hạn phiên bản và
+get_model() kiểm tra thuộc tính này trước khi gán (báo lỗi rõ ràng nếu SDK đổi).
+"""
+
+import random
+import re
+import threading
+import time
+
+import google.generativeai as genai
+import google.ai.generativelanguage as glm
+from google.api_core import exceptions as api_exceptions
+
+from app_config import config_value
+from llm_backend import GeminiError, PLACEHOLDER_KEYS
+
+DEFAULT_MODEL = 'gemini-2.5-flash'
+
+# Giới hạn mặc định cho mỗi API key (có thể ghi đè trong config.py)
+DEFAULT_REQUESTS_PER_MINUTE = 15
+DEFAULT_BURST = 5
+DEFAULT_TIMEOUT = 30          # Giây cho mỗi lời gọi
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_MAX_WAIT = 20         # Giây tối đa chờ lượt gọi trước khi báo bận
+
+# Lỗi tạm thời -> thử lại; lỗi cấu hình -> báo ngay, không tính là sự cố
+RETRYABLE_ERRORS = (
+    api_exceptions.ResourceExhausted,
+    api_exceptions.TooManyRequests,
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.InternalServerError,
+    api_exceptions.DeadlineExceeded,
+    api_exceptions.GatewayTimeout,
+    TimeoutError,
+    ConnectionError,
+)
+QUOTA_ERRORS = (api_exceptions.ResourceExhausted, api_exceptions.TooManyRequests)
+AUTH_ERRORS = (
+    api_exceptions.Unauthenticated,
+    api_exceptions.PermissionDenied,
+)
+
+
+def classify_error(error):
+    """Xác định loại lỗi ('quota', 'timeout', 'auth', ...) của một exception"""
+    if isinstance(error, GeminiError):
+        return error.kind
+    if isinstance(error, QUOTA_ERRORS):
+        return 'quota'
+    if isinstance(error, (api_exceptions.DeadlineExceeded, api_exceptions.GatewayTimeout,
+                          TimeoutError)):
+        return 'timeout'
+    if isinstance(error, RETRYABLE_ERRORS):
+        return 'unavailable'
+    if isinstance(error, AUTH_ERRORS):
+        return 'auth'
+    if isinstance(error, api_exceptions.InvalidArgument):
+        return 'auth' if 'api key' in str(error).lower() else 'invalid'
+    return 'other'
+
+
+def parse_retry_delay(error):
+    """Đọc thời gian chờ server đề nghị (VD: 'Please retry in 23.5s'), None nếu không có"""
+    match = re.search(r'retry in ([\d.]+)\s*s', str(error), re.IGNORECASE)
+    if match:
+        return float(match.group(1))
+    match = re.search(r'retry_delay\s*{\s*seconds:\s*(\d+)', str(error))
+    return float(match.group(1)) if match else None
+
+
+class TokenBucket:
+    """Bộ giới hạn tốc độ token bucket, an toàn khi dùng từ nhiều luồng"""
+
+    def __init__(self, rate_per_minute, burst):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, max_wait):
+        """
+        Lấy một lượt gọi, chờ tối đa max_wait giây
+
+        Returns:
+            bool: True nếu lấy được, False nếu phải chờ quá lâu
+        """
+        deadline = time.monotonic() + max_wait
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    Ngắt mạch khi dịch vụ lỗi liên tục
+
+    closed: gọi bình thường; open: báo lỗi ngay trong reset_timeout giây;
+    half_open: cho một lời gọi thử, thành công thì đóng lại, lỗi thì mở tiếp.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.state = 'closed'
+        self.opened_at = 0.0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """Kiểm tra có được phép gọi không"""
+        with self.lock:
+            if self.state == 'closed':
+                return True
+            # open hoặc half_open: chỉ cho một lời gọi thử sau mỗi reset_timeout giây
+            # (half_open mà quá hạn nghĩa là lời gọi thử trước không báo kết quả)
+            now = time.monotonic()
+            if now - self.opened_at < self.reset_timeout:
+                return False
+            self.state = 'half_open'
+            self.opened_at = now
+            return True
+
+    def retry_after(self):
+        """Số giây còn lại trước khi cho gọi thử"""
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.state = 'closed'
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+
+class GeminiClient:
+    """Client Gemini gắn với một API key, không đụng tới cấu hình toàn cục của genai"""
+
+    def __init__(self, api_key, model_name=DEFAULT_MODEL, limiter=None, breaker=None,
+                 timeout=DEFAULT_TIMEOUT, max_retries=DEFAULT_MAX_RETRIES,
+                 max_wait=DEFAULT_MAX_WAIT):
+        self.model_name = model_name
+        self.limiter = limiter or TokenBucket(DEFAULT_REQUESTS_PER_MINUTE, DEFAULT_BURST)
+        self.breaker = breaker or CircuitBreaker()
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_wait = max_wait
+
+        # Client gRPC riêng cho key này (genai.configure sẽ ghi đè key của tính năng khác)
+        self._service_client = glm.GenerativeServiceClient(
+            client_options={'api_key': api_key})
+        self._models = {}
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'retries': 0, 'errors': 0,
+                      'rate_limited': 0, 'circuit_open': 0}
+
+    def get_model(self, system_instruction=None):
+        """Trả về GenerativeModel dùng client riêng (tạo một lần cho mỗi system instruction)"""
+        with self._lock:
+            model = self._models.get(system_instruction)
+            if model is None:
+                model = genai.GenerativeModel(self.model_name,
+                                              system_instruction=system_instruction)
+                # Thuộc tính nội bộ của SDK (xem docstring module): SDK khác phiên bản
+                # không có thì báo lỗi thay vì âm thầm dùng key toàn cục
+                if not hasattr(model, '_client'):
+                    raise GeminiError('other', detail=(
+                        f"google-generativeai {genai.__version__} không hỗ trợ client riêng "
+                        "cho từng model; cài phiên bản trong requirements.txt"))
+                model._client = self._service_client
+                self._models[system_instruction] = model
+            return model
+
+    def generate(self, contents, stream=False, system_instruction=None, timeout=None,
+                 **kwargs):
+        """
+        Gọi generate_content với giới hạn tốc độ, thử lại và circuit breaker
+
+        Chạy trên luồng nền: hàm có thể chờ (tối đa max_wait giây cho lượt gọi
+        và thời gian backoff giữa các lần thử).
+
+        Với stream=True chỉ bước mở stream được thử lại. Lỗi xảy ra khi đang đọc
+        các chunk không được thử lại (người dùng đã thấy một phần phản hồi); khi
+        duyệt response, lỗi đó được đổi thành GeminiError, lỗi tạm thời có
+        retry_after để người gọi có thể gửi lại cả lượt.
+
+        Raises:
+            GeminiError: Khi hết lượt thử, quá tải, mạch đang ngắt hoặc lỗi cấu hình
+        """
+        model = self.get_model(system_instruction)
+        request_options = {'timeout': timeout or self.timeout}
+        deadline = time.monotonic() + self.max_wait + (timeout or self.timeout) * (self.max_retries + 1)
+
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self.stats['circuit_open'] += 1
+                raise GeminiError('circuit_open', retry_after=self.breaker.retry_after())
+            if not self.limiter.acquire(self.max_wait):
+                self.stats['rate_limited'] += 1
+                raise GeminiError('rate_limited')
+
+            self.stats['calls'] += 1
+            try:
+                response = model.generate_content(contents, stream=stream,
+                                                  request_options=request_options, **kwargs)
+                self.breaker.record_success()
+                return StreamResponse(self, response) if stream else response
+            except Exception as e:
+                kind = classify_error(e)
+                self.stats['errors'] += 1
+                if not isinstance(e, RETRYABLE_ERRORS):
+                    # Lỗi cấu hình / dữ liệu: dịch vụ vẫn hoạt động
+                    self.breaker.record_success()
+                    raise GeminiError(kind, detail=str(e)) from e
+
+                self.breaker.record_failure()
+                delay = self._backoff(attempt, e)
+                if attempt >= self.max_retries or time.monotonic() + delay > deadline:
+                    raise GeminiError(kind, detail=str(e), retry_after=delay) from e
+
+            attempt += 1
+            self.stats['retries'] += 1
+            time.sleep(delay)
+
+    @staticmethod
+    def _backoff(attempt, error, base=1.0, cap=30.0):
+        """Thời gian chờ trước lần thử tiếp theo: exponential backoff + full jitter"""
+        suggested = parse_retry_delay(error)
+        if suggested is not None:
+            return min(cap, suggested + random.uniform(0, 1))
+        return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class StreamResponse:
+    """
+    Bọc response stream của SDK: lỗi giữa chừng được đổi thành GeminiError
+
+    Các thuộc tính khác (usage_metadata, text...) lấy thẳng từ response gốc.
+    """
+
+    def __init__(self, client, response):
+        self._client = client
+        self._response = response
+
+    def __iter__(self):
+        try:
+            yield from self._response
+        except Exception as e:
+            self._client.stats['errors'] += 1
+            retry_after = None
+            if isinstance(e, RETRYABLE_ERRORS):
+                self._client.breaker.record_failure()
+                retry_after = GeminiClient._backoff(0, e)
+            raise GeminiError(classify_error(e), detail=str(e), retry_after=retry_after) from e
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+
+# Bộ giới hạn và circuit breaker dùng chung cho mọi tính năng có cùng API key
+# (quota tính theo key, nên các tính năng dùng chung key phải chia sẻ lượt gọi)
+_shared_lock = threading.Lock()
+_limiters = {}
+_breakers = {}
+
+
+def get_client(api_key, model_name=DEFAULT_MODEL, timeout=DEFAULT_TIMEOUT):
+    """
+    Tạo GeminiClient cho một tính năng
+
+    Returns:
+        GeminiClient hoặc None nếu chưa cấu hình API key
+    """
+    if not api_key or api_key.strip() in PLACEHOLDER_KEYS:
+        return None
+
+    with _shared_lock:
+        limiter = _limiters.get(api_key)
+        if limiter is None:
+            limiter = TokenBucket(
+                config_value('GEMINI_REQUESTS_PER_MINUTE', DEFAULT_REQUESTS_PER_MINUTE),
+                config_value('GEMINI_BURST', DEFAULT_BURST))
+            _limiters[api_key] = limiter
+        breaker = _breakers.setdefault(api_key, CircuitBreaker())
+
+    return GeminiClient(api_key, model_name=model_name, limiter=limiter, breaker=breaker,
+                        timeout=timeout)
@@ -0,0 +1,159 @@
+"""
+Module trích xuất JSON từ phản hồi của AI
+Khi dùng structured output (response_mime_type = application/json) phản hồi
+gần như luôn là JSON hợp lệ; module này xử lý các trường hợp còn lại: khối
+markdown ```json, lời dẫn trước/sau JSON, dấu phẩy thừa, ngoặc kép kiểu “ ”,
+True/False/None kiểu Python và JSON bị cắt cụt (hết token).
+"""
+
+import json
+import re
+import threading
+
+_DECODER = json.JSONDecoder()
+_FENCE_PATTERN = re.compile(r'```(?:json|JSON)?\s*(.*?)```', re.DOTALL)
+_TRAILING_COMMA_PATTERN = re.compile(r',\s*([}\]])')
+_PYTHON_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+_PYTHON_LITERAL_PATTERN = re.compile(r'\b(True|False|None)\b')
+_SMART_QUOTES = str.maketrans({'“': '"', '”': '"', '„': '"'})
+
+
+class JSONExtractError(ValueError):
+    """Không tìm được JSON hợp lệ trong phản hồi"""
+
+    def __init__(self, message, text=''):
+        super().__init__(message)
+        self.text = text
+
+
+def _replace_outside_strings(text, pattern, replacement):
+    """Áp dụng re.sub chỉ trên phần nằm ngoài chuỗi JSON"""
+    parts = re.split(r'("(?:\\.|[^"\\])*")', text)
+    for index in range(0, len(parts), 2):
+        parts[index] = pattern.sub(replacement, parts[index])
+    return ''.join(parts)
+
+
+def close_truncated(text):
+    """
+    Đóng các chuỗi / ngoặc còn mở của JSON bị cắt cụt
+
+    Duyệt từng ký tự một lần, ghi nhớ ngăn xếp ngoặc; phần tử cuối còn dở
+    (VD: '"amount": 45' hoặc '"desc') được giữ nếu đóng lại được, nếu không
+    thì bỏ đi cùng dấu phẩy trước nó.
+    """
+    stack = []
+    in_string = False
+    escaped = False
+    last_safe = None
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+        elif char in '}]':
+            if stack:
+                stack.pop()
+            if not stack:
+                return text[:index + 1]
+        elif char == ',':
+            last_safe = (index, list(stack))
+
+    if not stack:
+        return text
+    candidate = text + ('"' if in_string else '') + ''.join(reversed(stack))
+    try:
+        _DECODER.decode(candidate)
+        return candidate
+    except ValueError:
+        pass
+    if last_safe is not None:
+        index, safe_stack = last_safe
+        return text[:index] + ''.join(reversed(safe_stack))
+    return candidate
+
+
+def _try_decode(text, expect):
+    try:
+        value = json.loads(text)
+    except ValueError:
+        return None
+    if expect is not None and not isinstance(value, expect):
+        return None
+    return value
+
+
+def extract_json(text, expect=None):
+    """
+    Lấy giá trị JSON từ phản hồi của AI
+
+    Args:
+        text: Phản hồi dạng văn bản
+        expect: Kiểu mong đợi (dict, list hoặc tuple các kiểu), None = bất kỳ
+
+    Returns:
+        (giá trị, True nếu phải sửa / tách mới đọc được)
+
+    Raises:
+        JSONExtractError: Khi không tìm được JSON hợp lệ
+    """
+    text = (text or '').strip()
+    value = _try_decode(text, expect)
+    if value is not None:
+        return value, False
+
+    candidates = [match.group(1).strip() for match in _FENCE_PATTERN.finditer(text)]
+    candidates.append(text)
+
+    for candidate in candidates:
+        cleaned = candidate.translate(_SMART_QUOTES)
+        cleaned = _replace_outside_strings(cleaned, _TRAILING_COMMA_PATTERN, r'\1')
+        cleaned = _replace_outside_strings(cleaned, _PYTHON_LITERAL_PATTERN,
+                                           lambda match: _PYTHON_LITERALS[match.group(1)])
+
+        # Thử từng vị trí bắt đầu bằng { hoặc [ (bỏ qua lời dẫn phía trước)
+        for match in re.finditer(r'[{\[]', cleaned):
+            start = match.start()
+            try:
+                value, _ = _DECODER.raw_decode(cleaned, start)
+            except ValueError:
+                value = _try_decode(close_truncated(cleaned[start:]), None)
+            if value is not None and (expect is None or isinstance(value, expect)):
+                return value, True
+
+    raise JSONExtractError("Không tìm thấy JSON hợp lệ trong phản hồi", text)
+
+
+class ParseStats:
+    """
+    Đếm kết quả đọc JSON để theo dõi tỉ lệ lỗi định dạng
+
+    clean: đọc được ngay; recovered: phải tách / sửa cục bộ;
+    repaired: cần một lần gọi AI sửa lại; failed: không dùng được.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {'calls': 0, 'clean': 0, 'recovered': 0, 'repaired': 0, 'failed': 0}
+
+    def record(self, outcome):
+        with self.lock:
+            self.counts['calls'] += 1
+            self.counts[outcome] += 1
+
+    def snapshot(self):
+        """Bản sao số liệu kèm tỉ lệ phản hồi không đọc được ở lần đầu và tỉ lệ thất bại cuối cùng"""
+        with self.lock:
+            counts = dict(self.counts)
+        calls = counts['calls'] or 1
+        counts['first_pass_failure_rate'] = (counts['repaired'] + counts['failed']) / calls
+        counts['failure_rate'] = counts['failed'] / calls
+        return counts
@@ -0,0 +1,77 @@
+"""
+Module khởi tạo trễ các dịch vụ nặng (ChatBot, Nhập bằng AI, Quét hóa đơn, giá)
+Dịch vụ chỉ được tạo ở lần dùng đầu tiên nên cửa sổ chính hiện ngay sau khi
+đăng nhập, không phụ thuộc việc cấu hình / nạp SDK AI hay mạng. Hàm kiểm tra
+nhanh (probe: cấu hình, thư viện đã cài chưa...) quyết định trạng thái nút và có
+được tạo dịch vụ không; kết quả được cache trong PROBE_TTL giây.
+"""
+
+import time
+
+# Số giây dùng lại kết quả kiểm tra khả dụng
+PROBE_TTL = 30
+
+
+class LazyService:
+    """
+    Dịch vụ tạo lần đầu khi gọi get() (chỉ dùng trên luồng giao diện)
+
+    Probe báo chưa dùng được thì get() trả None và chưa tạo (thử lại khi probe
+    đổi kết quả). Tạo lỗi thì get() trả None và không thử lại; last_error giữ
+    thông báo lỗi.
+    """
+
+    def __init__(self, name, factory, probe=None, probe_ttl=PROBE_TTL):
+        """
+        Args:
+            name: Tên hiển thị trong thông báo lỗi
+            factory: Hàm không tham số tạo dịch vụ
+            probe: Hàm kiểm tra nhanh dịch vụ có dùng được không (mặc định luôn True)
+            probe_ttl: Số giây dùng lại kết quả probe
+        """
+        self.name = name
+        self.factory = factory
+        self.probe = probe
+        self.probe_ttl = probe_ttl
+        self.last_error = None
+        self._instance = None
+        self._created = False
+        self._probe_result = None
+        self._probe_time = 0.0
+        self.stats = {'probes': 0, 'init_seconds': None}
+
+    @property
+    def instance(self):
+        """Dịch vụ nếu đã tạo, None nếu chưa (không tạo mới, VD khi đóng ứng dụng)"""
+        return self._instance
+
+    def get(self):
+        """Dịch vụ (tạo ở lần gọi đầu), None nếu probe báo chưa dùng được hoặc tạo lỗi"""
+        if not self._created:
+            if not self.available():
+                return None
+            self._created = True
+            start = time.perf_counter()
+            try:
+                self._instance = self.factory()
+            except Exception as e:
+                print(f"Lỗi khởi tạo {self.name}: {e}")
+                self.last_error = str(e)
+            self.stats['init_seconds'] = time.perf_counter() - start
+        return self._instance
+
+    def available(self):
+        """Kết quả kiểm tra nhanh (có cache), không tạo dịch vụ"""
+        if self._created and self._instance is None:
+            return False
+        if self.probe is None:
+            return True
+        now = time.monotonic()
+        if self._probe_result is None or now - self._probe_time >= self.probe_ttl:
+            self.stats['probes'] += 1
+            try:
+                self._probe_result = bool(self.probe())
+            except Exception:
+                self._probe_result = False
+            self._probe_time = now
+        return self._probe_result
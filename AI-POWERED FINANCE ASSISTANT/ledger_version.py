@@ -0,0 +1,59 @@
+"""
+Module theo dõi phiên bản dữ liệu sổ giao dịch
+Mỗi lần bảng transactions hoặc budget_limits thay đổi, trigger SQLite tăng số
+phiên bản. Các bộ nhớ đệm dùng số này làm khóa để biết dữ liệu đã cũ hay chưa.
+"""
+
+import sqlite3
+
+# Các bảng mà nội dung ảnh hưởng tới phân tích tài chính
+LEDGER_TABLES = ('transactions', 'budget_limits')
+
+
+def init_ledger_version(cursor):
+    """Tạo bảng ledger_meta và các trigger tăng phiên bản (gọi khi khởi tạo DB)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ledger_meta (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO ledger_meta (id, version) VALUES (1, 0)')
+
+    for table in LEDGER_TABLES:
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_version
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE ledger_meta SET version = version + 1 WHERE id = 1;
+                END
+            ''')
+
+
+class LedgerVersion:
+    """Đọc phiên bản sổ giao dịch của một kết nối SQLite
+
+    Chỉ truy vấn lại bảng ledger_meta khi conn.total_changes thay đổi, nên
+    việc kiểm tra liên tục (VD: mỗi tin nhắn chat) không tốn truy vấn nào
+    khi dữ liệu đứng yên.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._seen_changes = None
+        self._version = 0
+
+    def current(self):
+        """Trả về phiên bản hiện tại của sổ giao dịch"""
+        changes = self.conn.total_changes
+        if changes != self._seen_changes:
+            try:
+                row = self.conn.execute(
+                    'SELECT version FROM ledger_meta WHERE id = 1').fetchone()
+                self._version = row[0] if row else changes
+            except sqlite3.Error:
+                # Database cũ chưa có ledger_meta -> dùng số thay đổi của kết nối
+                self._version = changes
+            self._seen_changes = changes
+        return self._version
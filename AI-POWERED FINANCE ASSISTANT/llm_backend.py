@@ -0,0 +1,558 @@
+"""
+Module giao diện backend LLM dùng cho ChatBot, Nhập bằng AI và Quét hóa đơn
+Backend là đối tượng có phương thức:
+
+    generate(contents, stream=False, system_instruction=None, timeout=None, **kwargs)
+
+trả về response có thuộc tính .text, duyệt được từng chunk (mỗi chunk có .text)
+và usage_metadata. GeminiClient (gemini_client.py) là backend thật; module này
+cung cấp FakeBackend (chạy offline, có độ trễ / lỗi / JSON mẫu cấu hình được)
+và CassetteBackend (ghi lại phản hồi thật rồi phát lại) để đo hiệu năng và kiểm
+thử các tính năng AI mà không cần API key hay mạng.
+
+Chọn backend bằng biến môi trường FINANCE_LLM_BACKEND hoặc LLM_BACKEND trong
+config.py: 'gemini' (mặc định), 'fake', 'record', 'replay'.
+"""
+
+import hashlib
+import importlib.util
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime
+
+from app_config import config_value
+from json_extract import extract_json, JSONExtractError
+
+# Giá trị mẫu trong config.py, coi như chưa cấu hình API key
+PLACEHOLDER_KEYS = ("", "YOUR-GOOGLE-API-KEY-HERE", "YOUR_API_KEY_HERE")
+
+
+class GeminiError(Exception):
+    """Lỗi khi gọi LLM, kèm loại lỗi và thông báo thân thiện cho người dùng"""
+
+    MESSAGES = {
+        'quota': "Đã vượt quá giới hạn API. Vui lòng thử lại sau.",
+        'rate_limited': "Hệ thống AI đang bận (quá nhiều yêu cầu). Vui lòng thử lại sau giây lát.",
+        'circuit_open': "Dịch vụ AI tạm thời không phản hồi. Sẽ tự thử lại sau ít phút.",
+        'timeout': "AI phản hồi quá lâu. Vui lòng thử lại.",
+        'unavailable': "Không kết nối được dịch vụ AI. Vui lòng kiểm tra mạng và thử lại.",
+        'auth': "API Key không hợp lệ. Vui lòng kiểm tra lại config.py",
+        'invalid': "Yêu cầu gửi tới AI không hợp lệ.",
+        'other': "Có lỗi xảy ra khi gọi AI.",
+    }
+
+    def __init__(self, kind, detail=None, retry_after=None):
+        self.kind = kind
+        self.detail = detail
+        self.retry_after = retry_after
+        super().__init__(self.message)
+
+    @property
+    def message(self):
+        """Thông báo tiếng Việt hiển thị cho người dùng"""
+        return self.MESSAGES.get(self.kind, self.MESSAGES['other'])
+
+
+def flatten_contents(contents):
+    """Ghép phần văn bản của contents (chuỗi, danh sách, hội thoại role/parts) thành một chuỗi"""
+    if isinstance(contents, str):
+        return contents
+    if isinstance(contents, dict):
+        # Lời gọi hàm / kết quả gọi hàm được tính như văn bản JSON
+        for key in ('function_call', 'function_response'):
+            if key in contents:
+                return json.dumps(contents[key], ensure_ascii=False, default=str)
+        return flatten_contents(contents.get('parts', []))
+    if isinstance(contents, (list, tuple)):
+        return "\n".join(flatten_contents(item) for item in contents)
+    return ""
+
+
+# Tham số của generate() làm đổi phản hồi, nên thuộc khóa cassette
+FINGERPRINT_OPTIONS = ('tools', 'generation_config', 'tool_config')
+
+
+def contents_fingerprint(contents, system_instruction=None, options=None):
+    """
+    Hash ổn định của request (ảnh được băm theo nội dung byte)
+
+    Args:
+        options: dict tham số ảnh hưởng tới phản hồi (tools, generation_config,
+            tool_config); băm theo khóa đã sắp xếp nên không phụ thuộc thứ tự
+    """
+    digest = hashlib.sha256()
+
+    def feed(item):
+        if isinstance(item, str):
+            digest.update(b's' + item.encode('utf-8'))
+        elif isinstance(item, (bytes, bytearray)):
+            digest.update(b'b' + bytes(item))
+        elif isinstance(item, dict):
+            for key in sorted(item):
+                digest.update(b'k' + str(key).encode('utf-8'))
+                feed(item[key])
+        elif isinstance(item, (list, tuple)):
+            digest.update(b'[')
+            for part in item:
+                feed(part)
+            digest.update(b']')
+        elif hasattr(item, 'tobytes'):
+            # Ảnh PIL
+            digest.update(b'i' + str(getattr(item, 'size', '')).encode('utf-8'))
+            digest.update(item.tobytes())
+        else:
+            digest.update(b'o' + repr(item).encode('utf-8'))
+
+    feed(system_instruction or '')
+    feed(contents)
+    if options:
+        # Không có tham số thì khóa giữ nguyên như cassette đã ghi trước đây
+        digest.update(b'o')
+        feed(options)
+    return digest.hexdigest()
+
+
+def json_generation_config(schema):
+    """generation_config yêu cầu Gemini trả JSON đúng schema (structured output)"""
+    return {'response_mime_type': 'application/json', 'response_schema': schema}
+
+
+def has_required_fields(value, schema):
+    """Kiểm tra các trường 'required' của schema (JSON bị cắt cụt có thể thiếu trường)"""
+    if schema.get('type') == 'ARRAY':
+        return all(has_required_fields(item, schema.get('items', {})) for item in value)
+    if schema.get('type') == 'OBJECT':
+        return isinstance(value, dict) and all(field in value for field in schema.get('required', []))
+    return True
+
+
+JSON_REPAIR_PROMPT = """{original}
+
+PHẢN HỒI TRƯỚC KHÔNG PHẢI JSON HỢP LỆ:
+---
+{bad_output}
+---
+Hãy viết lại phản hồi trên thành JSON hợp lệ đúng yêu cầu ở trên.
+CHỈ TRẢ VỀ JSON."""
+
+
+def generate_json(client, contents, schema, stats=None, expect=None, **kwargs):
+    """
+    Gọi LLM với structured output và đọc JSON từ phản hồi
+
+    Phản hồi lệch định dạng được sửa cục bộ (json_extract.extract_json); nếu
+    vẫn không đọc được thì gọi AI thêm đúng một lần để sửa, chỉ gửi lại phần
+    văn bản của request (không gửi lại ảnh).
+
+    Args:
+        client: Backend LLM
+        contents: Nội dung request
+        schema: response_schema của Gemini (dict kiểu OpenAPI)
+        stats: ParseStats để đếm tỉ lệ lỗi định dạng (tùy chọn)
+        expect: Kiểu JSON mong đợi (dict / list)
+
+    Raises:
+        GeminiError: Lỗi khi gọi AI
+        JSONExtractError: Cả lần sửa vẫn không ra JSON hợp lệ
+    """
+    config = json_generation_config(schema)
+    response = client.generate(contents, generation_config=config, **kwargs)
+    try:
+        value, recovered = extract_json(response.text, expect)
+        if has_required_fields(value, schema):
+            if stats is not None:
+                stats.record('recovered' if recovered else 'clean')
+            return value
+    except JSONExtractError:
+        pass
+
+    repair_prompt = JSON_REPAIR_PROMPT.format(original=flatten_contents(contents).strip(),
+                                              bad_output=response.text.strip()[:4000])
+    try:
+        response = client.generate(repair_prompt, generation_config=config, **kwargs)
+        value, _ = extract_json(response.text, expect)
+        if not has_required_fields(value, schema):
+            raise JSONExtractError("Phản hồi thiếu trường bắt buộc", response.text)
+    except (GeminiError, JSONExtractError):
+        if stats is not None:
+            stats.record('failed')
+        raise
+    if stats is not None:
+        stats.record('repaired')
+    return value
+
+
+class UsageMetadata:
+    def __init__(self, prompt_token_count, candidates_token_count):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+
+
+class TextChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class TextResponse:
+    """Response giả lập định dạng của Gemini: .text, duyệt từng chunk, usage_metadata"""
+
+    def __init__(self, text, prompt_text='', chunk_chars=40, chunk_delay=0.0):
+        self.text = text
+        self.chunk_chars = max(1, chunk_chars)
+        self.chunk_delay = chunk_delay
+        self.usage_metadata = UsageMetadata((len(prompt_text) + 2) // 3, (len(text) + 2) // 3)
+
+    def __iter__(self):
+        for start in range(0, len(self.text), self.chunk_chars):
+            if start and self.chunk_delay:
+                time.sleep(self.chunk_delay)
+            yield TextChunk(self.text[start:start + self.chunk_chars])
+
+
+def extract_function_calls(chunk):
+    """
+    Lấy các lời gọi hàm (function calling) trong một chunk / response
+
+    Returns:
+        list: [(tên hàm, dict tham số), ...]
+    """
+    calls = []
+    for candidate in getattr(chunk, 'candidates', None) or []:
+        content = getattr(candidate, 'content', None)
+        for part in getattr(content, 'parts', None) or []:
+            function_call = getattr(part, 'function_call', None)
+            if function_call is not None and function_call.name:
+                calls.append((function_call.name, dict(function_call.args or {})))
+    return calls
+
+
+class FunctionCall:
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+
+class FunctionCallPart:
+    def __init__(self, name, args):
+        self.function_call = FunctionCall(name, args)
+
+
+class FunctionCallContent:
+    def __init__(self, calls):
+        self.parts = [FunctionCallPart(name, args) for name, args in calls]
+
+
+class FunctionCallCandidate:
+    def __init__(self, calls):
+        self.content = FunctionCallContent(calls)
+
+
+class FunctionCallResponse:
+    """Response giả lập khi model yêu cầu gọi hàm (không có phần văn bản, như Gemini)"""
+
+    def __init__(self, calls, prompt_text=''):
+        self.candidates = [FunctionCallCandidate(calls)]
+        self.usage_metadata = UsageMetadata((len(prompt_text) + 2) // 3, 10 * len(calls))
+
+    @property
+    def text(self):
+        raise ValueError("Response chỉ chứa lời gọi hàm, không có văn bản")
+
+    def __iter__(self):
+        yield self
+
+
+def has_function_response(contents):
+    """Request đã chứa kết quả gọi hàm (lượt thứ hai trở đi của vòng function calling)"""
+    if isinstance(contents, dict):
+        return 'function_response' in contents or has_function_response(contents.get('parts', []))
+    if isinstance(contents, (list, tuple)):
+        return any(has_function_response(item) for item in contents)
+    return False
+
+
+def default_fake_tool_rules():
+    """Lời gọi hàm mẫu của ChatBot giả lập: hỏi về chi tiêu -> xem chi tiêu tháng này"""
+    today = datetime.now()
+    month_start = today.strftime('%Y-%m-01')
+    return [
+        ("hạn mức", [('budget_status', {})]),
+        ("xu hướng", [('spending_trend', {'months': 3})]),
+        ("chi tiêu", [('spend_by_category', {'start_date': month_start,
+                                             'end_date': today.strftime('%Y-%m-%d')})]),
+    ]
+
+
+def default_fake_rules():
+    """Phản hồi mẫu cho từng loại prompt của ứng dụng (khớp theo chuỗi con)"""
+    today = datetime.now().strftime('%Y-%m-%d')
+    return [
+        ("CHỈ TRẢ VỀ JSON ARRAY", json.dumps([
+            {"type": "expense", "category": "Khác", "amount": 10000,
+             "description": "Giao dịch thử", "date": today}], ensure_ascii=False)),
+        ("chuyên gia phân tích hóa đơn", json.dumps({
+            "amount": 45000, "category": "Ăn uống", "description": "Cafe đen đá",
+            "date": today, "type": "expense", "merchant": "Cửa hàng thử"}, ensure_ascii=False)),
+        ("CHỈ TRẢ VỀ JSON", json.dumps({
+            "is_transaction": True, "type": "expense", "category": "Khác", "amount": 10000,
+            "description": "Giao dịch thử", "date": today}, ensure_ascii=False)),
+    ]
+
+
+class FakeBackend:
+    """
+    Backend giả lập chạy hoàn toàn offline, kết quả xác định theo seed
+
+    Args:
+        rules: Danh sách (chuỗi con, phản hồi); phản hồi có thể là hàm nhận prompt
+        default_reply: Phản hồi khi không khớp rule nào
+        latency: Giây chờ trước khi trả về (trước chunk đầu tiên khi stream)
+        jitter: Độ trễ ngẫu nhiên thêm vào, trong khoảng [0, jitter]
+        chunk_chars / chunk_delay: Kích thước và độ trễ giữa các chunk khi stream
+        error_rate: Xác suất một lời gọi lỗi
+        error_kinds: Các loại GeminiError được sinh ra khi lỗi
+        fail_first: Số lời gọi đầu tiên luôn lỗi (giả lập sự cố)
+        malformed_rate: Xác suất phản hồi bị lệch định dạng JSON (xem MALFORMED_KINDS)
+        tool_rules: Danh sách (chuỗi con, [(tên hàm, tham số), ...]) - khi request có
+            tools và chưa có kết quả gọi hàm, trả về lời gọi hàm thay cho văn bản
+        seed: Seed cho bộ sinh ngẫu nhiên
+    """
+
+    # Các kiểu lệch định dạng hay gặp: khối markdown kèm lời dẫn, dấu phẩy thừa,
+    # bị cắt cụt, và trả lời bằng văn xuôi (chỉ sửa được bằng cách hỏi lại)
+    MALFORMED_KINDS = ('fence', 'trailing_comma', 'truncated', 'prose')
+
+    def __init__(self, rules=None, default_reply="Đây là phản hồi thử nghiệm từ backend giả lập.",
+                 latency=0.0, jitter=0.0, chunk_chars=40, chunk_delay=0.0,
+                 error_rate=0.0, error_kinds=('unavailable',), fail_first=0,
+                 malformed_rate=0.0, tool_rules=None, seed=0):
+        self.rules = default_fake_rules() if rules is None else list(rules)
+        self.default_reply = default_reply
+        self.latency = latency
+        self.jitter = jitter
+        self.chunk_chars = chunk_chars
+        self.chunk_delay = chunk_delay
+        self.error_rate = error_rate
+        self.error_kinds = tuple(error_kinds)
+        self.fail_first = fail_first
+        self.malformed_rate = malformed_rate
+        self.tool_rules = default_fake_tool_rules() if tool_rules is None else list(tool_rules)
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.stats = {'calls': 0, 'errors': 0, 'max_concurrency': 0}
+        self.prompts = []
+
+    def reply_for(self, prompt_text):
+        """Chọn phản hồi mẫu cho prompt"""
+        for pattern, reply in self.rules:
+            if pattern in prompt_text:
+                return reply(prompt_text) if callable(reply) else reply
+        return self.default_reply
+
+    def tool_calls_for(self, prompt_text):
+        """Chọn lời gọi hàm mẫu cho prompt (None nếu trả lời trực tiếp)"""
+        for pattern, calls in self.tool_rules:
+            if pattern in prompt_text.lower():
+                return calls
+        return None
+
+    def generate(self, contents, stream=False, system_instruction=None, timeout=None, **kwargs):
+        prompt_text = flatten_contents(contents)
+        with self._lock:
+            self.stats['calls'] += 1
+            call_number = self.stats['calls']
+            self.prompts.append(prompt_text)
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            fail = call_number <= self.fail_first or self._random.random() < self.error_rate
+            kind = self._random.choice(self.error_kinds) if fail else None
+            malformed = (self._random.choice(self.MALFORMED_KINDS)
+                         if self.malformed_rate and self._random.random() < self.malformed_rate
+                         else None)
+            self.in_flight += 1
+            self.stats['max_concurrency'] = max(self.stats['max_concurrency'], self.in_flight)
+
+        try:
+            if delay:
+                time.sleep(delay)
+            if fail:
+                with self._lock:
+                    self.stats['errors'] += 1
+                raise GeminiError(kind, detail="fake backend")
+            if kwargs.get('tools') and not has_function_response(contents):
+                calls = self.tool_calls_for(prompt_text)
+                if calls:
+                    return FunctionCallResponse(calls, prompt_text)
+            reply = self.reply_for(prompt_text)
+            if malformed and reply.lstrip()[:1] in ('{', '['):
+                reply = self.malform(reply, malformed)
+            return TextResponse(reply, prompt_text,
+                                self.chunk_chars, self.chunk_delay if stream else 0.0)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    @staticmethod
+    def malform(reply, kind):
+        """Làm lệch định dạng một phản hồi JSON theo kiểu kind"""
+        if kind == 'fence':
+            return f"Đây là kết quả:\n```json\n{reply}\n```\nHy vọng hữu ích!"
+        if kind == 'trailing_comma':
+            return reply[:-1] + ',' + reply[-1:] if reply[-1:] in '}]' else reply
+        if kind == 'truncated':
+            return reply[:max(1, len(reply) * 2 // 3)]
+        return "Mình đã đọc xong nhưng không chắc định dạng, bạn kiểm tra lại giúp nhé."
+
+
+class CassetteStore:
+    """File JSON chứa các phản hồi đã ghi, dùng chung cho mọi backend cùng đường dẫn"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            self.entries = {}
+
+    def get(self, key):
+        with self.lock:
+            return self.entries.get(key)
+
+    def put(self, key, text, prompt_text, function_calls=None):
+        """Lưu phản hồi và ghi ra file (ghi file tạm rồi đổi tên để không hỏng file khi lỗi)"""
+        with self.lock:
+            self.entries[key] = {'text': text, 'prompt': prompt_text[:200]}
+            if function_calls:
+                self.entries[key]['function_calls'] = [list(call) for call in function_calls]
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, ensure_ascii=False, indent=1)
+            os.replace(temp_path, self.path)
+
+
+class CassetteBackend:
+    """
+    Ghi lại (record) hoặc phát lại (replay) phản hồi theo hash của request
+
+    Ở chế độ record, request chưa có trong cassette được chuyển cho backend thật
+    và phản hồi được lưu lại; ở chế độ replay, phản hồi được đọc từ file,
+    không gọi mạng.
+    """
+
+    def __init__(self, store, mode='replay', inner=None):
+        """
+        Args:
+            store: CassetteStore hoặc đường dẫn file cassette
+            mode: 'record' hoặc 'replay'
+            inner: Backend thật (bắt buộc khi record)
+        """
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Chế độ cassette không hợp lệ: {mode}")
+        if mode == 'record' and inner is None:
+            raise ValueError("Chế độ record cần backend thật")
+        self.store = CassetteStore(store) if isinstance(store, str) else store
+        self.mode = mode
+        self.inner = inner
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'recorded': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def generate(self, contents, stream=False, system_instruction=None, timeout=None, **kwargs):
+        options = {name: kwargs[name] for name in FINGERPRINT_OPTIONS
+                   if kwargs.get(name) is not None}
+        key = contents_fingerprint(contents, system_instruction, options)
+        prompt_text = flatten_contents(contents)
+
+        entry = self.store.get(key)
+        if entry is not None:
+            self._count('hits')
+            if entry.get('function_calls'):
+                return FunctionCallResponse(entry['function_calls'], prompt_text)
+            return TextResponse(entry['text'], prompt_text)
+
+        self._count('misses')
+        if self.mode == 'replay':
+            raise GeminiError('unavailable', detail=f"Không có phản hồi đã ghi cho request {key[:12]}")
+
+        response = self.inner.generate(contents, stream=False,
+                                       system_instruction=system_instruction,
+                                       timeout=timeout, **kwargs)
+        calls = extract_function_calls(response)
+        if calls:
+            self.store.put(key, '', prompt_text, calls)
+            self._count('recorded')
+            return FunctionCallResponse(calls, prompt_text)
+        self.store.put(key, response.text, prompt_text)
+        self._count('recorded')
+        return TextResponse(response.text, prompt_text)
+
+
+_cassette_stores = {}
+_cassette_lock = threading.Lock()
+
+
+def backend_mode():
+    """Backend đang cấu hình: 'gemini', 'fake', 'record' hoặc 'replay'"""
+    return os.environ.get('FINANCE_LLM_BACKEND') or config_value('LLM_BACKEND', 'gemini')
+
+
+def backend_configured(api_key):
+    """
+    Kiểm tra nhanh một tính năng AI có dùng được không, để bật / tắt nút
+
+    Không import google-generativeai và không gọi mạng: chỉ xem API key đã
+    cấu hình và thư viện đã cài (backend giả lập / phát lại luôn dùng được).
+    """
+    mode = backend_mode()
+    if mode in ('fake', 'replay'):
+        return True
+    if not api_key or api_key.strip() in PLACEHOLDER_KEYS:
+        return False
+    try:
+        return importlib.util.find_spec('google.generativeai') is not None
+    except ImportError:
+        return False
+
+
+def get_backend(api_key, model_name=None, timeout=None):
+    """
+    Tạo backend LLM cho một tính năng theo cấu hình
+
+    Returns:
+        Backend hoặc None nếu dùng Gemini mà chưa cấu hình API key
+    """
+    mode = backend_mode()
+
+    if mode == 'fake':
+        return FakeBackend(latency=float(os.environ.get('FINANCE_LLM_FAKE_LATENCY', 0)))
+
+    if mode in ('record', 'replay'):
+        path = (os.environ.get('FINANCE_LLM_CASSETTE') or
+                config_value('LLM_CASSETTE', 'llm_cassette.json'))
+        inner = None
+        if mode == 'record':
+            inner = _gemini_backend(api_key, model_name, timeout)
+            if inner is None:
+                return None
+        with _cassette_lock:
+            store = _cassette_stores.get(path)
+            if store is None:
+                store = _cassette_stores[path] = CassetteStore(path)
+        return CassetteBackend(store, mode, inner)
+
+    return _gemini_backend(api_key, model_name, timeout)
+
+
+def _gemini_backend(api_key, model_name=None, timeout=None):
+    # Import khi cần để backend giả lập chạy được cả khi chưa cài google-generativeai
+    from gemini_client import get_client, DEFAULT_MODEL, DEFAULT_TIMEOUT
+    return get_client(api_key, model_name or DEFAULT_MODEL, timeout or DEFAULT_TIMEOUT)
@@ -0,0 +1,206 @@
+"""
+Server giả lập các API giá (CoinGecko, metals.live, open.er-api, Binance)
+Dùng để chạy và đo tải vòng cập nhật giá mà không cần mạng. Giá đi ngẫu nhiên
+quanh một mức gốc; có thể thêm độ trễ và tỉ lệ lỗi cho từng nguồn.
+
+Chạy:
+    python mock_quote_server.py --port 8765 --latency 0.1
+    FINANCE_QUOTE_BASE_URL=http://127.0.0.1:8765 python finance_manager.py
+
+    python mock_quote_server.py --load-test 200                (so sánh với cách gọi cũ)
+    python mock_quote_server.py --load-test 100 --fail coingecko --fail-rate 0.5
+"""
+
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# (đường dẫn, tên nguồn) -- tên trùng QuoteProvider.name để chọn nguồn lỗi bằng --fail
+ROUTES = {
+    '/api/v3/simple/price': 'coingecko',
+    '/v1/spot/gold': 'metals.live',
+    '/v6/latest/USD': 'open.er-api',
+    '/api/v3/ticker/24hr': 'binance',
+}
+
+
+class MarketState:
+    """Giá giả lập đi ngẫu nhiên mỗi lần được đọc"""
+
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.prices = {'btc': 65000.0, 'gold': 2400.0, 'fx': 25400.0}
+
+    def tick(self):
+        with self.lock:
+            for asset, volatility in (('btc', 0.002), ('gold', 0.0005), ('fx', 0.0001)):
+                self.prices[asset] *= 1 + self.rng.gauss(0, volatility)
+            return dict(self.prices)
+
+
+class MockQuoteServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, fail_rate=0.0, fail_sources=()):
+        super().__init__(address, QuoteHandler)
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.fail_sources = set(fail_sources)
+        self.market = MarketState()
+        self.counter_lock = threading.Lock()
+        self.counts = {'requests': 0, 'connections': 0}
+
+    def count(self, key):
+        with self.counter_lock:
+            self.counts[key] += 1
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class QuoteHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 để client giữ kết nối (keep-alive) giữa các request
+    protocol_version = 'HTTP/1.1'
+    # Header và body ghi riêng: tắt Nagle để kết nối giữ lại không chờ delayed ACK (~40 ms)
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.count('connections')
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        server.count('requests')
+        url = urlparse(self.path)
+        source = ROUTES.get(url.path)
+        if source is None:
+            self._send(404, {'error': 'not found'})
+            return
+
+        if server.latency:
+            time.sleep(server.latency * random.uniform(0.5, 1.5))
+        if source in server.fail_sources and random.random() < server.fail_rate:
+            self._send(503, {'error': 'service unavailable'})
+            return
+
+        prices = server.market.tick()
+        now = time.time()
+        if source == 'coingecko':
+            ids = parse_qs(url.query).get('ids', [''])[0].split(',')
+            coins = {'bitcoin': prices['btc'], 'pax-gold': prices['gold']}
+            payload = {coin: {'usd': round(price, 2), 'vnd': round(price * prices['fx']),
+                              'usd_24h_change': round(random.uniform(-3, 3), 2)}
+                       for coin, price in coins.items() if coin in ids}
+        elif source == 'metals.live':
+            payload = [{'price': round(prices['gold'], 2), 'timestamp': int(now * 1000)}]
+        elif source == 'open.er-api':
+            payload = {'result': 'success', 'time_last_update_unix': int(now),
+                       'rates': {'USD': 1, 'VND': round(prices['fx'], 2)}}
+        else:
+            payload = {'symbol': 'BTCUSDT', 'lastPrice': f"{prices['btc']:.2f}",
+                       'priceChangePercent': f"{random.uniform(-3, 3):.2f}"}
+        self._send(200, payload)
+
+
+def start_server(port=0, latency=0.0, fail_rate=0.0, fail_sources=()):
+    """Chạy server trên luồng nền (port=0: chọn cổng trống), trả về server"""
+    server = MockQuoteServer(('127.0.0.1', port), latency, fail_rate, fail_sources)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _summary(name, durations, counts, ticks, failures):
+    durations = sorted(durations)
+    p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+    print(f"{name:<28} {statistics.mean(durations) * 1000:8.1f} {p95 * 1000:8.1f} "
+          f"{counts['requests'] / ticks:8.2f} {counts['connections']:8d} {failures:6d}")
+
+
+def load_test(ticks, latency, fail_rate, fail_sources):
+    """So sánh vòng cập nhật cũ (mỗi mã một requests.get, không giữ kết nối) với QuoteService"""
+    import requests
+    from quote_providers import create_providers
+    from quote_service import QuoteService, create_session
+
+    server = start_server(latency=latency, fail_rate=fail_rate, fail_sources=fail_sources)
+    print(f"Mock server {server.url}, {ticks} lượt, độ trễ {latency * 1000:.0f} ms, "
+          f"lỗi {fail_rate:.0%} ở {', '.join(fail_sources) or '-'}")
+    print(f"{'Cách gọi':<28} {'TB ms':>8} {'p95 ms':>8} {'req/lượt':>8} {'kết nối':>8} {'lỗi':>6}")
+
+    # Cách cũ: vàng và BTC mỗi mã một request riêng, kết nối mới mỗi lần, tỷ giá cố định
+    durations, failures = [], 0
+    for _ in range(ticks):
+        start = time.perf_counter()
+        for path, params in (('/v1/spot/gold', None),
+                             ('/api/v3/simple/price', {'ids': 'bitcoin', 'vs_currencies': 'usd',
+                                                       'include_24hr_change': 'true'})):
+            try:
+                if requests.get(server.url + path, params=params, timeout=5).status_code != 200:
+                    failures += 1
+            except requests.exceptions.RequestException:
+                failures += 1
+        durations.append(time.perf_counter() - start)
+    _summary("requests.get từng mã", durations, server.counts, ticks, failures)
+
+    server.counts = {'requests': 0, 'connections': 0}
+    session = create_session()
+    service = QuoteService(providers=create_providers(session, server.url), session=session,
+                           ttl=0, fallbacks={})
+    durations = []
+    for _ in range(ticks):
+        start = time.perf_counter()
+        service.request()
+        while service.busy:
+            time.sleep(0.0005)
+        service.poll()
+        durations.append(time.perf_counter() - start)
+    _summary("QuoteService (gộp + pool)", durations, server.counts, ticks, service.stats['failures'])
+    service.stop()
+    server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server giả lập API giá vàng / Bitcoin / tỷ giá")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help="Độ trễ trung bình mỗi request (giây)")
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="Tỉ lệ request lỗi 503")
+    parser.add_argument('--fail', nargs='*', default=[], metavar='NGUỒN',
+                        help=f"Nguồn bị lỗi: {', '.join(sorted(set(ROUTES.values())))}")
+    parser.add_argument('--load-test', type=int, metavar='LƯỢT',
+                        help="Chạy server tạm và đo số lượt cập nhật giá")
+    args = parser.parse_args()
+
+    if args.load_test:
+        load_test(args.load_test, args.latency, args.fail_rate, args.fail)
+        return
+
+    server = MockQuoteServer(('127.0.0.1', args.port), args.latency, args.fail_rate, args.fail)
+    print(f"Mock server chạy tại {server.url} (Ctrl+C để dừng)")
+    print(f"Dùng: FINANCE_QUOTE_BASE_URL={server.url} python finance_manager.py")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Module cache kết quả OCR hóa đơn theo nội dung ảnh
+Khóa là SHA-256 của file ảnh: chỉ đúng file đã quét mới được trả lại kết quả.
+Không so khớp gần đúng (perceptual hash): hai hóa đơn cùng mẫu in chỉ khác số
+tiền có hash gần như trùng nhau, trả nhầm dữ liệu của hóa đơn khác.
+Quét lại cùng hóa đơn trả kết quả ngay, không tốn lượt gọi AI.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+class OCRCache:
+    """
+    Cache kết quả OCR lưu trong SQLite
+
+    Dùng kết nối riêng (check_same_thread=False) có khóa, vì OCR chạy trên
+    các luồng nền, không dùng chung kết nối của giao diện.
+    """
+
+    def __init__(self, db_path, max_age_days=90, max_entries=500):
+        """
+        Args:
+            db_path: Đường dẫn file database
+            max_age_days: Tuổi tối đa của một mục cache
+            max_entries: Số mục tối đa, mục ít dùng gần đây nhất bị xóa trước
+        """
+        self.max_age = max_age_days * 86400
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.stats = {'exact_hits': 0, 'misses': 0}
+
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS ocr_cache (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sha256 TEXT NOT NULL,
+                model TEXT NOT NULL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hit_count INTEGER NOT NULL DEFAULT 0,
+                UNIQUE(sha256, model)
+            )
+        ''')
+        self.conn.commit()
+
+        with self.lock:
+            self._evict(time.time())
+            self.conn.commit()
+
+    @staticmethod
+    def file_sha256(image_path):
+        """SHA-256 của nội dung file ảnh"""
+        digest = hashlib.sha256()
+        with open(image_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def get(self, image_path, model):
+        """
+        Tìm kết quả đã cache cho ảnh (chỉ khớp đúng nội dung file)
+
+        Returns:
+            (dict kết quả hoặc None, khóa của ảnh để truyền cho put)
+        """
+        keys = {'sha256': self.file_sha256(image_path)}
+        now = time.time()
+
+        with self.lock:
+            row = self.conn.execute('''
+                SELECT id, result FROM ocr_cache
+                WHERE sha256 = ? AND model = ? AND created_at >= ?
+            ''', (keys['sha256'], model, now - self.max_age)).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None, keys
+
+            self.stats['exact_hits'] += 1
+            self.conn.execute('''
+                UPDATE ocr_cache SET last_used = ?, hit_count = hit_count + 1 WHERE id = ?
+            ''', (now, row[0]))
+            self.conn.commit()
+        return json.loads(row[1]), keys
+
+    def put(self, keys, model, result):
+        """Lưu kết quả OCR và dọn các mục hết hạn / vượt giới hạn"""
+        now = time.time()
+        with self.lock:
+            self.conn.execute('''
+                INSERT INTO ocr_cache (sha256, model, result, created_at, last_used)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(sha256, model) DO UPDATE SET
+                    result = excluded.result,
+                    created_at = excluded.created_at, last_used = excluded.last_used
+            ''', (keys['sha256'], model,
+                  json.dumps(result, ensure_ascii=False), now, now))
+            self._evict(now)
+            self.conn.commit()
+
+    def _evict(self, now):
+        """Xóa mục quá tuổi, sau đó xóa mục ít dùng gần đây nhất nếu vượt max_entries"""
+        self.conn.execute('DELETE FROM ocr_cache WHERE created_at < ?', (now - self.max_age,))
+        self.conn.execute('''
+            DELETE FROM ocr_cache WHERE id IN (
+                SELECT id FROM ocr_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )
+        ''', (self.max_entries,))
+
+    def clear(self):
+        """Xóa toàn bộ cache OCR"""
+        with self.lock:
+            self.conn.execute('DELETE FROM ocr_cache')
+            self.conn.commit()
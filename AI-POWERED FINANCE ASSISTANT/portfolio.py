@@ -0,0 +1,178 @@
+"""
+Module tài sản nắm giữ (vàng, Bitcoin, tiền tiết kiệm) và tài sản ròng
+Mỗi lần dịch vụ giá công bố giá mới, toàn bộ tài sản được định giá lại trong
+một phép tính numpy (số lượng x đơn giá VNĐ theo loại tài sản) và lưu thành
+ảnh chụp theo ngày trong bảng networth_snapshots; biểu đồ tài sản ròng đọc
+thẳng các ảnh chụp này, không phải tính lại lịch sử.
+"""
+
+import importlib.util
+import json
+from datetime import datetime
+
+from quote_providers import GRAMS_PER_OUNCE
+
+# Loại tài sản: (tên hiển thị, đơn vị số lượng)
+ASSET_TYPES = {
+    'gold': ("Vàng", "gram"),
+    'btc': ("Bitcoin", "BTC"),
+    'vnd': ("Tiết kiệm VNĐ", "VNĐ"),
+    'usd': ("Tiết kiệm USD", "USD"),
+}
+_ASSET_INDEX = {asset: index for index, asset in enumerate(ASSET_TYPES)}
+
+
+def init_portfolio_tables(cursor):
+    """Tạo bảng holdings và networth_snapshots (gọi khi khởi tạo DB)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS holdings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            asset TEXT NOT NULL,
+            quantity REAL NOT NULL,
+            note TEXT,
+            updated_at TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS networth_snapshots (
+            user_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            total REAL NOT NULL,
+            breakdown TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (user_id, day)
+        )
+    ''')
+
+
+def unit_prices(quotes):
+    """
+    Đơn giá VNĐ của một đơn vị mỗi loại tài sản, theo thứ tự ASSET_TYPES
+
+    Args:
+        quotes: dict {asset: kết quả QuoteService} ('gold', 'btc', 'fx')
+
+    Returns:
+        numpy array, NaN ở loại chưa có giá
+    """
+    import numpy as np
+
+    def price(asset, key):
+        quote = quotes.get(asset)
+        return float(quote[key]) if quote and quote.get('success') and key in quote else np.nan
+
+    fx = price('fx', 'rate')
+    prices = {
+        'gold': price('gold', 'price_usd') / GRAMS_PER_OUNCE * fx,
+        'btc': price('btc', 'price_usd') * fx,
+        'vnd': 1.0,
+        'usd': fx,
+    }
+    return np.array([prices[asset] for asset in ASSET_TYPES], dtype=float)
+
+
+class Portfolio:
+    """Tài sản nắm giữ của một user (chỉ dùng trên luồng giao diện)"""
+
+    def __init__(self, conn, user_id):
+        """
+        Args:
+            conn: Kết nối SQLite của ứng dụng
+            user_id: ID người dùng
+        """
+        self.conn = conn
+        self.user_id = user_id
+        self._arrays = None
+
+    @staticmethod
+    def is_available():
+        """Đã cài numpy chưa (numpy chỉ được import khi định giá lần đầu)"""
+        return importlib.util.find_spec('numpy') is not None
+
+    def holdings(self):
+        """Danh sách (id, asset, quantity, note) theo loại tài sản"""
+        return self.conn.execute('''
+            SELECT id, asset, quantity, note FROM holdings
+            WHERE user_id = ? ORDER BY asset, id
+        ''', (self.user_id,)).fetchall()
+
+    def add(self, asset, quantity, note=''):
+        if asset not in ASSET_TYPES:
+            raise ValueError(f"Loại tài sản không hợp lệ: {asset}")
+        with self.conn:
+            self.conn.execute('''
+                INSERT INTO holdings (user_id, asset, quantity, note, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (self.user_id, asset, float(quantity), note,
+                  datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+        self._arrays = None
+
+    def delete(self, holding_id):
+        with self.conn:
+            self.conn.execute('DELETE FROM holdings WHERE id = ? AND user_id = ?',
+                              (holding_id, self.user_id))
+        self._arrays = None
+
+    def _load_arrays(self):
+        # Mảng (chỉ số loại tài sản, số lượng) chỉ đọc lại khi tài sản thay đổi
+        if self._arrays is None:
+            import numpy as np
+            rows = [(_ASSET_INDEX[asset], quantity) for _, asset, quantity, _ in self.holdings()
+                    if asset in _ASSET_INDEX]
+            kinds = np.array([kind for kind, _ in rows], dtype=np.intp)
+            quantities = np.array([quantity for _, quantity in rows], dtype=float)
+            self._arrays = (kinds, quantities)
+        return self._arrays
+
+    def value(self, quotes):
+        """
+        Định giá toàn bộ tài sản theo giá mới nhất
+
+        Returns:
+            dict {'total', 'by_asset': {asset: VNĐ},
+                  'values': VNĐ từng dòng holdings() (None nếu chưa có giá),
+                  'missing': các loại đang nắm giữ nhưng chưa có giá}
+        """
+        import numpy as np
+
+        kinds, quantities = self._load_arrays()
+        prices = unit_prices(quotes)
+        values = quantities * prices[kinds]
+
+        known = ~np.isnan(values)
+        by_asset = np.bincount(kinds[known], weights=values[known], minlength=len(ASSET_TYPES))
+        missing = sorted({list(ASSET_TYPES)[kind] for kind in np.unique(kinds[~known])})
+        return {
+            'total': float(by_asset.sum()),
+            'by_asset': {asset: float(by_asset[index]) for asset, index in _ASSET_INDEX.items()
+                         if np.any(kinds[known] == index)},
+            'values': [None if np.isnan(value) else float(value) for value in values],
+            'missing': missing,
+        }
+
+    def save_snapshot(self, valuation, day=None):
+        """Ghi (đè) ảnh chụp tài sản ròng của ngày; bỏ qua nếu chưa có tài sản hoặc còn loại chưa có giá"""
+        if valuation['missing'] or not valuation['by_asset']:
+            return False
+        now = datetime.now()
+        with self.conn:
+            self.conn.execute('''
+                INSERT INTO networth_snapshots (user_id, day, total, breakdown, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(user_id, day) DO UPDATE SET
+                    total = excluded.total, breakdown = excluded.breakdown,
+                    updated_at = excluded.updated_at
+            ''', (self.user_id, day or now.strftime('%Y-%m-%d'), valuation['total'],
+                  json.dumps(valuation['by_asset']), now.strftime('%Y-%m-%d %H:%M:%S')))
+        return True
+
+    def snapshots(self):
+        """Các ảnh chụp theo ngày: list (datetime ngày, tổng VNĐ, dict theo loại)"""
+        rows = self.conn.execute('''
+            SELECT day, total, breakdown FROM networth_snapshots
+            WHERE user_id = ? ORDER BY day
+        ''', (self.user_id,)).fetchall()
+        return [(datetime.strptime(day, '%Y-%m-%d'), total, json.loads(breakdown))
+                for day, total, breakdown in rows]
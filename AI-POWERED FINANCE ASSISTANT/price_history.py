@@ -0,0 +1,125 @@
+"""
+Module lưu lịch sử giá vàng / Bitcoin dạng chuỗi thời gian gọn
+Mỗi lần lấy giá thành công thêm một dòng (asset_id, ts, price) toàn số nguyên:
+ts là epoch giây, price là USD nhân PRICE_SCALE (fixed point). Khi vẽ biểu đồ,
+SQLite gom các điểm thành từng nhóm theo độ rộng (pixel) của biểu đồ và chỉ
+trả giá thấp nhất / cao nhất mỗi nhóm, nên nhiều năm dữ liệu 5 phút vẫn chỉ
+đọc lên vài trăm điểm.
+"""
+
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+# Mã số nguyên của từng loại tài sản (không đổi giá trị đã dùng)
+ASSET_IDS = {'gold': 1, 'btc': 2, 'fx': 3}
+# Giá lưu theo đơn vị 1/100 USD (tỷ giá: 1/100 VNĐ)
+PRICE_SCALE = 100
+
+
+class PriceHistory:
+    """
+    Bảng price_history: khóa chính (asset_id, ts), WITHOUT ROWID để dữ liệu
+    nằm ngay trong B-tree chỉ mục, không tốn thêm bảng rowid.
+
+    Dùng kết nối riêng (check_same_thread=False) có khóa vì QuoteService ghi
+    từ luồng nền, còn biểu đồ đọc trên luồng giao diện.
+    """
+
+    def __init__(self, db_path):
+        """
+        Args:
+            db_path: Đường dẫn file database
+        """
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS price_history (
+                asset_id INTEGER NOT NULL,
+                ts INTEGER NOT NULL,
+                price INTEGER NOT NULL,
+                PRIMARY KEY (asset_id, ts)
+            ) WITHOUT ROWID
+        ''')
+        self.conn.commit()
+
+    def append(self, asset, price, timestamp=None):
+        """
+        Thêm một điểm giá
+
+        Args:
+            asset: 'gold', 'btc' hoặc 'fx'
+            price: Giá USD (với 'fx' là số VNĐ / 1 USD)
+            timestamp: datetime hoặc epoch giây (mặc định bây giờ)
+        """
+        if isinstance(timestamp, datetime):
+            timestamp = timestamp.timestamp()
+        ts = int(timestamp or time.time())
+        with self.lock:
+            self.conn.execute('''
+                INSERT OR REPLACE INTO price_history (asset_id, ts, price) VALUES (?, ?, ?)
+            ''', (ASSET_IDS[asset], ts, round(price * PRICE_SCALE)))
+            self.conn.commit()
+
+    def bounds(self, asset):
+        """(ts đầu, ts cuối) của một tài sản; (None, None) nếu chưa có"""
+        with self.lock:
+            return self.conn.execute('''
+                SELECT MIN(ts), MAX(ts) FROM price_history WHERE asset_id = ?
+            ''', (ASSET_IDS[asset],)).fetchone()
+
+    def count(self, asset):
+        """Số điểm giá đã lưu của một tài sản"""
+        with self.lock:
+            return self.conn.execute('''
+                SELECT COUNT(*) FROM price_history WHERE asset_id = ?
+            ''', (ASSET_IDS[asset],)).fetchone()[0]
+
+    def series(self, asset, start_ts=None, end_ts=None, width=600):
+        """
+        Chuỗi giá đã giảm mẫu cho biểu đồ rộng width pixel
+
+        Chia [start_ts, end_ts] thành width / 2 nhóm; SQLite gom mỗi nhóm trong
+        một lượt quét thành giá thấp nhất / cao nhất (giữ nguyên các đỉnh / đáy),
+        tức tối đa khoảng width điểm.
+
+        Returns:
+            list (datetime, giá USD) theo thời gian tăng dần
+        """
+        if start_ts is None or end_ts is None:
+            first, last = self.bounds(asset)
+            if first is None:
+                return []
+            start_ts = first if start_ts is None else start_ts
+            end_ts = last if end_ts is None else end_ts
+        start_ts, end_ts = int(start_ts), int(end_ts)
+        buckets = max(1, width // 2)
+        span = max(1, end_ts - start_ts + 1)
+
+        with self.lock:
+            rows = self.conn.execute('''
+                SELECT (ts - :start) * :buckets / :span AS bucket,
+                       MIN(ts), MAX(ts), MIN(price), MAX(price)
+                FROM price_history
+                WHERE asset_id = :asset AND ts BETWEEN :start AND :end
+                GROUP BY bucket ORDER BY bucket
+            ''', {'asset': ASSET_IDS[asset], 'start': start_ts, 'end': end_ts,
+                  'buckets': buckets, 'span': span}).fetchall()
+
+        points = []
+        previous = None
+        for _, first_ts, last_ts, low, high in rows:
+            if first_ts == last_ts:
+                points.append((first_ts, low))
+            elif previous is not None and abs(previous - high) < abs(previous - low):
+                # Đi từ giá gần điểm trước hơn để đường nối liền mạch
+                points += [(first_ts, high), (last_ts, low)]
+            else:
+                points += [(first_ts, low), (last_ts, high)]
+            previous = points[-1][1]
+        return [(datetime.fromtimestamp(ts), price / PRICE_SCALE) for ts, price in points]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
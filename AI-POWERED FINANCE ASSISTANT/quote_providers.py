@@ -0,0 +1,196 @@
+"""
+Module các nguồn giá cho QuoteService
+Mỗi provider lấy một nhóm mã trong MỘT lần gọi HTTP: CoinGecko trả cả Bitcoin,
+vàng (PAX Gold, 1 token = 1 troy ounce) lẫn tỷ giá USD/VNĐ (từ giá BTC theo USD
+và VNĐ), nên bình thường mỗi lượt cập nhật chỉ tốn một request. Mã nào provider
+đầu lỗi thì provider kế tiếp có mã đó được gọi bù (metals.live cho vàng,
+open.er-api cho tỷ giá, Binance cho BTC).
+
+Kết quả chuẩn hóa:
+    {'success': True, 'price_usd', 'change_24h', 'timestamp', 'source'}  (gold, btc)
+    {'success': True, 'rate', 'timestamp', 'source'}                    (fx: VNĐ / 1 USD)
+
+Đặt FINANCE_QUOTE_BASE_URL (hoặc QUOTE_BASE_URL trong config.py) để mọi
+provider gọi tới một server khác, VD mock_quote_server.py khi chạy offline.
+"""
+
+import os
+from datetime import datetime
+
+from app_config import config_value
+
+REQUEST_TIMEOUT = 5
+# Tỷ giá tham khảo, chỉ dùng khi không có tỷ giá thật
+REFERENCE_USD_VND = 24500
+GRAMS_PER_OUNCE = 31.1035
+# 1 chỉ vàng = 3.75 gram
+GRAMS_PER_CHI = 3.75
+
+# Thứ tự ưu tiên khi quy tất cả mã về danh sách mặc định
+ASSETS = ('fx', 'gold', 'btc')
+
+
+class ProviderError(Exception):
+    """Provider trả dữ liệu không dùng được (HTTP lỗi, thiếu trường...)"""
+
+
+class QuoteProvider:
+    """Nguồn giá lấy một nhóm mã (assets) bằng một lần gọi HTTP"""
+
+    name = ''
+    base_url = ''
+    assets = ()
+
+    def __init__(self, session=None, base_url=None):
+        if session is None:
+            import requests
+            session = requests
+        self.session = session
+        self.base_url = (base_url or self.base_url).rstrip('/')
+
+    def _get_json(self, path, params=None):
+        response = self.session.get(self.base_url + path, params=params, timeout=REQUEST_TIMEOUT)
+        if response.status_code != 200:
+            raise ProviderError(f"{self.name}: HTTP {response.status_code}")
+        return response.json()
+
+    def _quote(self, price_usd, change_24h=0, timestamp=None):
+        return {'success': True, 'price_usd': float(price_usd), 'change_24h': float(change_24h or 0),
+                'timestamp': timestamp or datetime.now(), 'source': self.name}
+
+    def fetch(self, assets):
+        """
+        Args:
+            assets: Các mã cần lấy (provider có thể trả thêm mã khác lấy được trong cùng request)
+
+        Returns:
+            dict {asset: kết quả chuẩn hóa}
+
+        Raises:
+            ProviderError, requests.exceptions.RequestException, ValueError...
+        """
+        raise NotImplementedError
+
+
+class CoinGeckoProvider(QuoteProvider):
+    """BTC, vàng (PAXG) và tỷ giá USD/VNĐ trong một request simple/price"""
+
+    name = 'coingecko'
+    base_url = 'https://api.coingecko.com'
+    assets = ('btc', 'gold', 'fx')
+    COIN_IDS = {'btc': 'bitcoin', 'gold': 'pax-gold'}
+
+    def fetch(self, assets):
+        data = self._get_json('/api/v3/simple/price', {
+            'ids': ','.join(self.COIN_IDS.values()),
+            'vs_currencies': 'usd,vnd',
+            'include_24hr_change': 'true',
+        })
+        now = datetime.now()
+        quotes = {}
+        for asset, coin in self.COIN_IDS.items():
+            coin_data = data.get(coin) or {}
+            if coin_data.get('usd'):
+                quotes[asset] = self._quote(coin_data['usd'], coin_data.get('usd_24h_change'), now)
+
+        bitcoin = data.get('bitcoin') or {}
+        if bitcoin.get('usd') and bitcoin.get('vnd'):
+            quotes['fx'] = {'success': True, 'rate': bitcoin['vnd'] / bitcoin['usd'],
+                            'timestamp': now, 'source': self.name}
+        return quotes
+
+
+class MetalsLiveProvider(QuoteProvider):
+    """Giá vàng giao ngay (USD/ounce), không có thay đổi 24h"""
+
+    name = 'metals.live'
+    base_url = 'https://api.metals.live'
+    assets = ('gold',)
+
+    def fetch(self, assets):
+        item = self._get_json('/v1/spot/gold')[0]
+        timestamp = item.get('timestamp') or 0
+        return {'gold': self._quote(item['price'], 0,
+                                    datetime.fromtimestamp(timestamp / 1000) if timestamp > 0 else None)}
+
+
+class ExchangeRateProvider(QuoteProvider):
+    """Tỷ giá USD/VNĐ từ open.er-api.com (miễn phí, không cần key)"""
+
+    name = 'open.er-api'
+    base_url = 'https://open.er-api.com'
+    assets = ('fx',)
+
+    def fetch(self, assets):
+        data = self._get_json('/v6/latest/USD')
+        if data.get('result') != 'success':
+            raise ProviderError(f"{self.name}: {data.get('error-type', 'lỗi không rõ')}")
+        updated = data.get('time_last_update_unix')
+        return {'fx': {'success': True, 'rate': float(data['rates']['VND']),
+                       'timestamp': datetime.fromtimestamp(updated) if updated else datetime.now(),
+                       'source': self.name}}
+
+
+class BinanceProvider(QuoteProvider):
+    """Giá BTC/USDT 24h từ Binance"""
+
+    name = 'binance'
+    base_url = 'https://api.binance.com'
+    assets = ('btc',)
+
+    def fetch(self, assets):
+        data = self._get_json('/api/v3/ticker/24hr', {'symbol': 'BTCUSDT'})
+        return {'btc': self._quote(data['lastPrice'], data.get('priceChangePercent'))}
+
+
+def create_providers(session=None, base_url=None):
+    """Danh sách provider theo thứ tự ưu tiên (provider gộp nhiều mã đứng đầu)"""
+    base_url = (base_url or os.environ.get('FINANCE_QUOTE_BASE_URL')
+                or config_value('QUOTE_BASE_URL', None))
+    return [provider(session, base_url) for provider in
+            (CoinGeckoProvider, MetalsLiveProvider, ExchangeRateProvider, BinanceProvider)]
+
+
+def fetch_quotes(providers, assets):
+    """
+    Lấy các mã bằng ít request nhất: gọi lần lượt từng provider cho các mã còn thiếu
+
+    Returns:
+        (dict {asset: kết quả}, dict {asset: lỗi} cho mã không lấy được, số request đã gọi)
+    """
+    import requests
+
+    missing = set(assets)
+    quotes = {}
+    errors = {}
+    calls = 0
+    for provider in providers:
+        wanted = missing.intersection(provider.assets)
+        if not wanted:
+            continue
+        calls += 1
+        try:
+            fetched = provider.fetch(wanted)
+        except (ProviderError, requests.exceptions.RequestException,
+                ValueError, KeyError, IndexError, TypeError) as e:
+            for asset in wanted:
+                errors[asset] = str(e)
+            continue
+        for asset, quote in fetched.items():
+            quotes.setdefault(asset, quote)
+        missing -= set(fetched)
+        if not missing:
+            break
+
+    return quotes, {asset: errors.get(asset, "Không có nguồn giá") for asset in missing}, calls
+
+
+def reference_quotes():
+    """Giá tham khảo cố định, chỉ dùng khi chưa từng lấy được giá thật"""
+    now = datetime.now()
+    return {
+        'gold': {'success': True, 'price_usd': 2050.0, 'change_24h': 0.0, 'timestamp': now,
+                 'source': 'reference', 'note': 'Giá tham khảo'},
+        'fx': {'success': True, 'rate': float(REFERENCE_USD_VND), 'timestamp': now,
+               'source': 'reference', 'note': 'Tỷ giá tham khảo'},
+    }
@@ -0,0 +1,211 @@
+"""
+Module lấy giá vàng / Bitcoin / tỷ giá USD-VNĐ trên luồng nền
+Một luồng duy nhất giữ requests.Session dùng chung (keep-alive, pool kết nối)
+nên các lần cập nhật sau không phải bắt tay TCP/TLS lại. Giao diện chỉ gửi yêu
+cầu và nhận kết quả qua queue.Queue, đọc bằng root.after() trên luồng Tk.
+Các yêu cầu đang chờ được gom thành một lượt và lấy qua quote_providers.py
+(bình thường chỉ một request cho mọi mã).
+Có QuoteStore thì giá lấy được còn trong TTL được trả lại ngay (không gọi
+mạng) và khi API lỗi, giá thật gần nhất được dùng (đánh dấu cũ).
+"""
+
+import importlib.util
+import queue
+import threading
+import time
+
+from app_config import config_value
+from quote_providers import ASSETS, create_providers, fetch_quotes, reference_quotes
+
+# Giá lấy trong khoảng này được dùng lại, không gọi mạng
+# (có thể ghi đè bằng QUOTE_TTL_SECONDS trong config.py)
+DEFAULT_TTL = 60
+
+
+def create_session():
+    """requests.Session có pool kết nối nhỏ, dùng lại kết nối giữa các lần gọi"""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['User-Agent'] = 'AI-Finance-Assistant/1.0'
+    return session
+
+
+def quote_value(result):
+    """Giá trị chính của kết quả: giá USD, hoặc tỷ giá với 'fx'"""
+    return result['rate'] if 'rate' in result else result['price_usd']
+
+
+class QuoteService:
+    """
+    Dịch vụ cập nhật giá chạy nền
+
+    request('gold', 'btc') xếp yêu cầu (bỏ qua mã đang chờ); poll() trả các
+    kết quả (asset, result) đã xong, 'fx' luôn đứng trước trong một lượt. Chỉ
+    gọi request / poll trên luồng giao diện. Kết quả lấy từ cache có
+    'cached': True, giá đã quá TTL có 'stale': True.
+    """
+
+    def __init__(self, providers=None, session=None, store=None, ttl=None, fallbacks=None,
+                 history=None):
+        """
+        Args:
+            providers: Danh sách QuoteProvider theo thứ tự ưu tiên (mặc định create_providers)
+            session: requests.Session dùng chung (mặc định tạo mới)
+            store: QuoteStore lưu giá gần nhất (None = không lưu)
+            ttl: Số giây dùng lại giá đã lấy (mặc định QUOTE_TTL_SECONDS / DEFAULT_TTL)
+            fallbacks: dict {asset: kết quả tham khảo} khi lỗi và chưa có giá lưu
+                (mặc định reference_quotes(): vàng và tỷ giá)
+            history: PriceHistory ghi lại mọi giá lấy được (None = không ghi)
+        """
+        self.session = session or create_session()
+        self.providers = providers if providers is not None else create_providers(self.session)
+        self.assets = tuple(asset for asset in ASSETS
+                            if any(asset in provider.assets for provider in self.providers))
+        self.store = store
+        self.history = history
+        self.ttl = config_value('QUOTE_TTL_SECONDS', DEFAULT_TTL) if ttl is None else ttl
+        self.fallbacks = reference_quotes() if fallbacks is None else fallbacks
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'ticks': 0, 'http_calls': 0, 'failures': 0, 'cache_hits': 0}
+
+        self.thread = threading.Thread(target=self._run, name='quote-service', daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def is_available():
+        """Đã cài requests chưa (không import thư viện, dùng làm probe của LazyService)"""
+        return importlib.util.find_spec('requests') is not None
+
+    def request(self, *assets):
+        """Yêu cầu cập nhật các mã (mặc định tất cả), không chặn"""
+        for asset in assets or self.assets:
+            if asset not in self.assets:
+                continue
+            with self.lock:
+                self.stats['requests'] += 1
+                if asset in self.pending:
+                    continue
+                self.pending.add(asset)
+            self.jobs.put(asset)
+
+    def cached(self, asset):
+        """Giá đã lưu của mã (để hiện ngay khi khởi động), None nếu chưa có"""
+        if self.store is None:
+            return None
+        entry = self.store.get(asset)
+        if entry is None:
+            return None
+        result, fetched_at = entry
+        result['cached'] = True
+        result['stale'] = time.time() - fetched_at >= self.ttl
+        return result
+
+    @property
+    def busy(self):
+        """Còn yêu cầu chưa có kết quả"""
+        with self.lock:
+            return bool(self.pending)
+
+    def poll(self):
+        """Lấy hết các kết quả đã xong: list (asset, result)"""
+        items = []
+        while True:
+            try:
+                items.append(self.results.get_nowait())
+            except queue.Empty:
+                return items
+
+    def _run(self):
+        while True:
+            assets = [self.jobs.get()]
+            # Gom mọi yêu cầu đang chờ vào một lượt -> mỗi provider tối đa một request
+            while True:
+                try:
+                    assets.append(self.jobs.get_nowait())
+                except queue.Empty:
+                    break
+            if None in assets:
+                break
+            self._refresh(assets)
+
+    def _refresh(self, assets):
+        results = {}
+        try:
+            expired = {}
+            for asset in assets:
+                cached = self.cached(asset)
+                if cached is not None and not cached['stale']:
+                    results[asset] = cached
+                    with self.lock:
+                        self.stats['cache_hits'] += 1
+                else:
+                    expired[asset] = cached
+
+            if expired:
+                results.update(self._fetch(expired))
+        except Exception as e:
+            # Lỗi bất ngờ (VD: SQLite "database is locked") không được làm chết luồng nền:
+            # mã chưa có kết quả nhận kết quả lỗi để giao diện báo thất bại và giãn nhịp
+            print(f"Lỗi cập nhật giá: {e}")
+            with self.lock:
+                self.stats['failures'] += 1
+            for asset in assets:
+                results.setdefault(asset, {'success': False, 'error': str(e)})
+        finally:
+            # Đẩy kết quả trước rồi mới bỏ khỏi pending: busy == False nghĩa là mọi kết quả đã nằm trong hàng đợi.
+            # Tỷ giá đứng trước để giao diện quy đổi VNĐ bằng tỷ giá mới nhất.
+            for asset in sorted(results, key=lambda name: name != 'fx'):
+                self.results.put((asset, results[asset]))
+            with self.lock:
+                self.pending.difference_update(assets)
+
+    def _fetch(self, expired):
+        """
+        Gọi mạng lấy các mã hết hạn; mã lỗi dùng giá đã lưu (cũ) hoặc giá tham khảo
+
+        Args:
+            expired: dict {asset: kết quả đã lưu hoặc None}
+        """
+        quotes, errors, calls = fetch_quotes(self.providers, expired)
+        with self.lock:
+            self.stats['ticks'] += 1
+            self.stats['http_calls'] += calls
+            self.stats['failures'] += len(errors)
+
+        # Provider có thể trả thêm mã khác trong cùng request: lưu và công bố luôn
+        results = {}
+        for asset, quote in quotes.items():
+            if self.store is not None:
+                self.store.put(asset, quote)
+            if self.history is not None:
+                self.history.append(asset, quote_value(quote), quote.get('timestamp'))
+            results[asset] = quote
+
+        for asset, error in errors.items():
+            cached = expired[asset]
+            if cached is not None:
+                cached['error'] = error
+                results[asset] = cached
+            elif asset in self.fallbacks:
+                results[asset] = dict(self.fallbacks[asset], error=error)
+            else:
+                results[asset] = {'success': False, 'error': error}
+        return results
+
+    def stop(self):
+        """Dừng luồng nền và đóng các kết nối"""
+        self.jobs.put(None)
+        self.thread.join(timeout=1)
+        self.session.close()
+        if self.store is not None:
+            self.store.close()
+        if self.history is not None:
+            self.history.close()
@@ -0,0 +1,86 @@
+"""
+Module lưu giá vàng / Bitcoin lấy được gần nhất vào SQLite
+Khởi động lại ứng dụng hiện ngay giá đã lưu (đánh dấu là cũ) trong lúc cập
+nhật nền; khi API lỗi vẫn còn giá thật gần nhất thay vì giá cố định.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+
+def _encode(result):
+    data = dict(result)
+    if isinstance(data.get('timestamp'), datetime):
+        data['timestamp'] = data['timestamp'].isoformat()
+    return json.dumps(data, ensure_ascii=False)
+
+
+def _decode(text):
+    data = json.loads(text)
+    if data.get('timestamp'):
+        data['timestamp'] = datetime.fromisoformat(data['timestamp'])
+    return data
+
+
+class QuoteStore:
+    """
+    Giá gần nhất của từng mã, lưu trong bảng quote_cache
+
+    Dùng kết nối riêng (check_same_thread=False) có khóa vì QuoteService ghi
+    từ luồng nền; bản sao trong bộ nhớ giúp đọc không tốn truy vấn.
+    """
+
+    def __init__(self, db_path):
+        """
+        Args:
+            db_path: Đường dẫn file database
+        """
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS quote_cache (
+                asset TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+        ''')
+        self.conn.commit()
+
+        self.latest = {}
+        for asset, data, fetched_at in self.conn.execute(
+                'SELECT asset, data, fetched_at FROM quote_cache').fetchall():
+            try:
+                self.latest[asset] = (_decode(data), fetched_at)
+            except ValueError:
+                # Dòng hỏng: bỏ qua, lần lấy giá thành công sau sẽ ghi đè
+                continue
+
+    def get(self, asset):
+        """
+        Returns:
+            (dict kết quả, thời điểm lấy dạng epoch) hoặc None nếu chưa có
+        """
+        with self.lock:
+            entry = self.latest.get(asset)
+        if entry is None:
+            return None
+        return dict(entry[0]), entry[1]
+
+    def put(self, asset, result, fetched_at=None):
+        """Lưu kết quả lấy giá thành công"""
+        fetched_at = fetched_at or time.time()
+        with self.lock:
+            self.conn.execute('''
+                INSERT INTO quote_cache (asset, data, fetched_at) VALUES (?, ?, ?)
+                ON CONFLICT(asset) DO UPDATE SET
+                    data = excluded.data, fetched_at = excluded.fetched_at
+            ''', (asset, _encode(result), fetched_at))
+            self.conn.commit()
+            self.latest[asset] = (dict(result), fetched_at)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
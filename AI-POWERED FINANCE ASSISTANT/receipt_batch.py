@@ -0,0 +1,113 @@
+"""
+Module quét nhiều hóa đơn cùng lúc
+Các ảnh được quét song song bởi một nhóm luồng có giới hạn; tốc độ gọi API do
+bộ giới hạn token bucket của gemini_client.py kiểm soát (dùng chung theo API
+key). Ảnh bị báo bận / ngắt mạch được xếp lại hàng đợi thay vì báo lỗi ngay.
+Kết quả được đẩy vào queue.Queue theo thứ tự hoàn thành để giao diện hiển thị dần.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+from app_config import config_value
+
+# Số ảnh quét đồng thời (có thể ghi đè bằng OCR_BATCH_CONCURRENCY trong config.py)
+DEFAULT_CONCURRENCY = 3
+# Số lần xếp lại một ảnh khi AI đang bận trước khi báo lỗi
+MAX_REQUEUES = 5
+# Lỗi tạm thời do giới hạn tốc độ -> chờ rồi quét lại
+REQUEUE_ERRORS = ('rate_limited', 'quota', 'circuit_open')
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp', '.gif')
+
+
+def find_images(folder):
+    """Danh sách ảnh trong thư mục (không đệ quy), sắp theo tên"""
+    return sorted(os.path.join(folder, name) for name in os.listdir(folder)
+                  if name.lower().endswith(IMAGE_EXTENSIONS))
+
+
+class ReceiptBatchScanner:
+    """
+    Quét một loạt ảnh hóa đơn bằng ReceiptOCR trên các luồng nền
+
+    Mỗi kết quả là tuple (index, image_path, result) với result giống
+    ReceiptOCR.extract_receipt_info; khi xong hết đẩy thêm (None, None, None).
+    """
+
+    def __init__(self, ocr, max_workers=None):
+        self.ocr = ocr
+        self.max_workers = max_workers or config_value('OCR_BATCH_CONCURRENCY', DEFAULT_CONCURRENCY)
+        self.results = queue.Queue()
+        self.stop_event = threading.Event()
+        self.stats = {'done': 0, 'failed': 0, 'cached': 0, 'requeued': 0}
+        self.stats_lock = threading.Lock()
+        self.executor = None
+
+    def start(self, image_paths):
+        """Bắt đầu quét (không chặn); đọc kết quả từ self.results"""
+        image_paths = list(image_paths)
+        workers = max(1, min(self.max_workers, len(image_paths)))
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='receipt-batch')
+        futures = [self.executor.submit(self._scan, index, path)
+                   for index, path in enumerate(image_paths)]
+
+        # Luồng theo dõi: báo hoàn tất khi mọi ảnh đã xong hoặc đã hủy
+        def wait_all():
+            for future in futures:
+                try:
+                    future.result()
+                except (CancelledError, Exception):
+                    pass
+            self.results.put((None, None, None))
+
+        threading.Thread(target=wait_all, daemon=True).start()
+
+    def cancel(self):
+        """Dừng quét: bỏ các ảnh chưa bắt đầu, ảnh đang quét vẫn chạy nốt"""
+        self.stop_event.set()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _scan(self, index, image_path):
+        result = None
+        for attempt in range(MAX_REQUEUES + 1):
+            if self.stop_event.is_set():
+                return
+            try:
+                result = self.ocr.extract_receipt_info(image_path)
+            except Exception as e:
+                result = {'success': False, 'error': f'Lỗi: {str(e)}'}
+
+            if result.get('error_kind') not in REQUEUE_ERRORS or attempt == MAX_REQUEUES:
+                break
+            # AI đang bận: chờ theo gợi ý của API (hoặc tăng dần) rồi thử lại ảnh này
+            with self.stats_lock:
+                self.stats['requeued'] += 1
+            if self.stop_event.wait(result.get('retry_after') or 2.0 * (attempt + 1)):
+                return
+
+        with self.stats_lock:
+            self.stats['done'] += 1
+            if not result['success']:
+                self.stats['failed'] += 1
+            elif result.get('stats', {}).get('cached'):
+                self.stats['cached'] += 1
+        self.results.put((index, image_path, result))
+
+
+def run_batch(ocr, image_paths, max_workers=None):
+    """Quét đồng bộ một loạt ảnh (dùng cho benchmark / dòng lệnh)"""
+    scanner = ReceiptBatchScanner(ocr, max_workers)
+    start = time.perf_counter()
+    scanner.start(image_paths)
+    results = {}
+    while True:
+        index, path, result = scanner.results.get()
+        if index is None:
+            break
+        results[index] = (path, result)
+    return [results[index] for index in sorted(results)], time.perf_counter() - start, scanner.stats
@@ -3,22 +3,59 @@ Module OCR Hóa Đơn - Tự động đọc và trích xuất thông tin từ 
 Sử dụng Google Gemini Vision API
 """
 
-import google.generativeai as genai
-from config import GOOGLE_API_KEY_OCR
-import json
+from llm_backend import get_backend, backend_configured, generate_json, GeminiError
+from json_extract import JSONExtractError, ParseStats
+import mimetypes
+import time
 from datetime import datetime
-from PIL import Image
+from receipt_preprocess import (preprocess_receipt, DEFAULT_MAX_EDGE, DEFAULT_QUALITY,
+                                DEFAULT_FORMAT)
+
+try:
+    from config import GOOGLE_API_KEY_OCR
+except ImportError:
+    GOOGLE_API_KEY_OCR = None
+
+# Schema structured output của Gemini cho kết quả đọc hóa đơn
+RECEIPT_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'amount': {'type': 'NUMBER'},
+        'category': {'type': 'STRING'},
+        'description': {'type': 'STRING'},
+        'date': {'type': 'STRING'},
+        'type': {'type': 'STRING'},
+        'merchant': {'type': 'STRING'},
+    },
+    'required': ['amount', 'category', 'description', 'date', 'type'],
+}
 
 
 class ReceiptOCR:
     """Class xử lý OCR hóa đơn bằng Google Gemini Vision"""
     
-    def __init__(self):
-        """Khởi tạo Receipt OCR với Google Gemini Vision"""
-        genai.configure(api_key=GOOGLE_API_KEY_OCR)
+    def __init__(self, backend=None, preprocess=True, max_edge=DEFAULT_MAX_EDGE,
+                 quality=DEFAULT_QUALITY, image_format=DEFAULT_FORMAT, grayscale=True,
+                 cache=None):
+        """
+        Khởi tạo Receipt OCR với Google Gemini Vision
         
-        # Sử dụng Gemini 2.5 Flash - multimodal model hỗ trợ ảnh
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+        Args:
+            backend: Backend LLM (mặc định theo cấu hình, xem llm_backend.py)
+            preprocess: Thu nhỏ / nén ảnh trước khi gửi (False = gửi file gốc)
+            max_edge, quality, image_format, grayscale: Tham số tiền xử lý
+                (xem receipt_preprocess.py)
+            cache: OCRCache (tùy chọn) - quét lại cùng ảnh không gọi AI nữa
+        """
+        self.cache = cache
+        self.preprocess = preprocess
+        self.preprocess_options = {'max_edge': max_edge, 'quality': quality,
+                                   'image_format': image_format, 'grayscale': grayscale}
+        # Backend dùng key riêng của OCR (Gemini 2.5 Flash hỗ trợ ảnh)
+        # Ảnh lớn nên cho phép mỗi lời gọi lâu hơn mặc định
+        self.client = backend or get_backend(GOOGLE_API_KEY_OCR, timeout=60)
+        # Thống kê phản hồi lệch định dạng JSON
+        self.json_stats = ParseStats()
     
     def extract_receipt_info(self, image_path):
         """
@@ -28,11 +65,24 @@ class ReceiptOCR:
             image_path: Đường dẫn đến file ảnh hóa đơn
             
         Returns:
-            dict: Thông tin giao dịch đã trích xuất
+            dict: Thông tin giao dịch đã trích xuất, kèm 'stats' (dung lượng ảnh
+                  trước/sau tiền xử lý và thời gian từng bước)
         """
+        stats = {}
         try:
-            # Đọc ảnh
-            img = Image.open(image_path)
+            # Ảnh đã quét trước đó -> trả kết quả ngay
+            cache_keys = None
+            if self.cache is not None:
+                cached, cache_keys = self.cache.get(image_path, self.model_name())
+                if cached is not None:
+                    return {
+                        'success': True,
+                        'data': cached,
+                        'stats': {'cached': True}
+                    }
+            
+            # Đọc và thu nhỏ ảnh (file 12 MP vài MB -> khoảng vài trăm KB)
+            image_part, stats = self.prepare_image(image_path)
             
             # Tạo prompt cho AI
             prompt = """
@@ -81,19 +131,12 @@ CHỈ TRẢ VỀ JSON, KHÔNG GIẢI THÍCH THÊM, KHÔNG THÊM MARKDOWN.
 """
             
             # Gửi ảnh và prompt cho AI
-            response = self.model.generate_content([prompt, img])
-            
-            # Parse JSON từ response
-            result_text = response.text.strip()
-            
-            # Loại bỏ markdown nếu có
-            if result_text.startswith('```json'):
-                result_text = result_text.replace('```json', '').replace('```', '').strip()
-            elif result_text.startswith('```'):
-                result_text = result_text.replace('```', '').strip()
-            
-            # Parse JSON
-            receipt_data = json.loads(result_text)
+            if self.client is None:
+                raise GeminiError('auth')
+            api_start = time.perf_counter()
+            receipt_data = generate_json(self.client, [prompt, image_part], RECEIPT_SCHEMA,
+                                         stats=self.json_stats, expect=dict)
+            stats['api_ms'] = (time.perf_counter() - api_start) * 1000
             
             # Validate dữ liệu
             required_fields = ['amount', 'category', 'description', 'date', 'type']
@@ -114,36 +157,66 @@ CHỈ TRẢ VỀ JSON, KHÔNG GIẢI THÍCH THÊM, KHÔNG THÊM MARKDOWN.
             if 'merchant' not in receipt_data:
                 receipt_data['merchant'] = 'N/A'
             
+            if cache_keys is not None:
+                self.cache.put(cache_keys, self.model_name(), receipt_data)
+            
             return {
                 'success': True,
-                'data': receipt_data
+                'data': receipt_data,
+                'stats': stats
             }
             
-        except json.JSONDecodeError as e:
+        except JSONExtractError as e:
             return {
                 'success': False,
-                'error': f'Lỗi phân tích JSON: {str(e)}\nResponse: {result_text[:200]}'
+                'error': f'AI trả về dữ liệu không đúng định dạng.\nResponse: {e.text[:200]}'
             }
         except FileNotFoundError:
             return {
                 'success': False,
                 'error': 'Không tìm thấy file ảnh'
             }
+        except GeminiError as e:
+            return {
+                'success': False,
+                'error': e.message,
+                'error_kind': e.kind,
+                'retry_after': e.retry_after
+            }
         except Exception as e:
             return {
                 'success': False,
                 'error': f'Lỗi: {str(e)}'
             }
     
+    def model_name(self):
+        """Tên model dùng để phân biệt kết quả trong cache"""
+        return getattr(self.client, 'model_name', type(self.client).__name__)
+    
+    def prepare_image(self, image_path):
+        """
+        Chuẩn bị phần ảnh gửi cho AI
+        
+        Returns:
+            (dict {'mime_type', 'data'}, dict thống kê dung lượng / thời gian)
+        """
+        if not self.preprocess:
+            with open(image_path, 'rb') as f:
+                data = f.read()
+            mime_type = mimetypes.guess_type(image_path)[0] or 'image/jpeg'
+            return ({'mime_type': mime_type, 'data': data},
+                    {'original_bytes': len(data), 'upload_bytes': len(data),
+                     'preprocess_ms': 0.0})
+        
+        result = preprocess_receipt(image_path, **self.preprocess_options)
+        return ({'mime_type': result['mime_type'], 'data': result['data']},
+                {'original_bytes': result['original_bytes'],
+                 'upload_bytes': result['processed_bytes'],
+                 'original_size': result['original_size'],
+                 'upload_size': result['processed_size'],
+                 'preprocess_ms': result['elapsed_ms']})
+    
     @staticmethod
     def is_available():
-        """Kiểm tra xem tính năng OCR có khả dụng không"""
-        try:
-            import google.generativeai
-            from config import GOOGLE_API_KEY_OCR
-            return bool(GOOGLE_API_KEY_OCR and 
-                       GOOGLE_API_KEY_OCR != "YOUR-GOOGLE-API-KEY-HERE")
-        except ImportError:
-            return False
-        except:
-            return False
+        """Kiểm tra xem tính năng OCR có khả dụng không (không import SDK, không gọi mạng)"""
+        return backend_configured(GOOGLE_API_KEY_OCR)
@@ -0,0 +1,127 @@
+"""
+Module tiền xử lý ảnh hóa đơn trước khi gửi cho AI
+Ảnh chụp điện thoại thường 12 MP, vài MB; thời gian upload chiếm phần lớn độ
+trễ OCR. Các bước: xoay theo EXIF -> cắt vùng có nội dung -> thu nhỏ -> ảnh
+xám -> tăng tương phản -> nén lại JPEG/WebP với chất lượng vừa đủ đọc chữ.
+"""
+
+import io
+import os
+import time
+
+from PIL import Image, ImageFilter, ImageOps, features
+
+# Cạnh dài tối đa: Gemini chia ảnh thành ô 768px, 1536px = 2 ô mỗi chiều,
+# vẫn đọc rõ chữ hóa đơn nhiệt (xem benchmark_ocr.py)
+DEFAULT_MAX_EDGE = 1536
+DEFAULT_QUALITY = 75
+DEFAULT_FORMAT = 'JPEG'
+
+MIME_TYPES = {'JPEG': 'image/jpeg', 'WEBP': 'image/webp', 'PNG': 'image/png'}
+
+
+def find_content_box(gray, edge_threshold=48, margin=0.02, analysis_size=400):
+    """
+    Tìm khung chứa nội dung (tờ hóa đơn) trong ảnh xám
+
+    Phân tích trên ảnh thu nhỏ nên rất nhanh. Trả về None nếu không nên cắt
+    (nội dung chiếm gần hết ảnh hoặc vùng tìm được quá nhỏ, có thể do nhiễu).
+    """
+    small = gray.copy()
+    small.thumbnail((analysis_size, analysis_size))
+    width, height = small.size
+    if width < 16 or height < 16:
+        return None
+
+    edges = small.filter(ImageFilter.MedianFilter(3)).filter(ImageFilter.FIND_EDGES)
+    # Bỏ viền 2px mà FIND_EDGES luôn sinh ra ở mép ảnh
+    edges = edges.crop((2, 2, width - 2, height - 2))
+    mask = edges.point(lambda value: 255 if value > edge_threshold else 0)
+    box = mask.getbbox()
+    if box is None:
+        return None
+
+    left, top, right, bottom = box[0] + 2, box[1] + 2, box[2] + 2, box[3] + 2
+    area_fraction = (right - left) * (bottom - top) / float(width * height)
+    if area_fraction > 0.9 or area_fraction < 0.1:
+        return None
+
+    pad_x, pad_y = int(width * margin), int(height * margin)
+    scale_x, scale_y = gray.width / float(width), gray.height / float(height)
+    return (max(0, int((left - pad_x) * scale_x)),
+            max(0, int((top - pad_y) * scale_y)),
+            min(gray.width, int((right + pad_x) * scale_x)),
+            min(gray.height, int((bottom + pad_y) * scale_y)))
+
+
+def preprocess_receipt(image_path, max_edge=DEFAULT_MAX_EDGE, quality=DEFAULT_QUALITY,
+                       image_format=DEFAULT_FORMAT, grayscale=True, crop=True):
+    """
+    Chuẩn bị ảnh hóa đơn để gửi cho AI
+
+    Args:
+        image_path: Đường dẫn ảnh gốc
+        max_edge: Cạnh dài tối đa sau khi thu nhỏ (None = giữ nguyên)
+        quality: Chất lượng nén JPEG/WebP (1-95)
+        image_format: 'JPEG' hoặc 'WEBP' (tự dùng JPEG nếu Pillow không hỗ trợ WebP)
+        grayscale: Chuyển ảnh xám
+        crop: Cắt bỏ nền xung quanh tờ hóa đơn
+
+    Returns:
+        dict: {'data', 'mime_type', 'original_bytes', 'processed_bytes',
+               'original_size', 'processed_size', 'elapsed_ms'}
+    """
+    start = time.perf_counter()
+    original_bytes = os.path.getsize(image_path)
+
+    with Image.open(image_path) as img:
+        original_size = img.size
+        if max_edge and img.format == 'JPEG':
+            # Giải mã JPEG ở độ phân giải thấp hơn (1/2, 1/4, 1/8) - nhanh hơn nhiều
+            # so với giải mã đủ 12 MP rồi mới thu nhỏ; giữ dư gấp đôi để cắt xong vẫn nét
+            img.draft('L' if grayscale else 'RGB', (max_edge * 2, max_edge * 2))
+        img = ImageOps.exif_transpose(img)
+        img = img.convert('L' if grayscale else 'RGB')
+
+    if crop:
+        box = find_content_box(img if grayscale else img.convert('L'))
+        if box:
+            img = img.crop(box)
+
+    if max_edge and max(img.size) > max_edge:
+        img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+    # Tăng tương phản giúp chữ in nhiệt mờ dễ đọc hơn
+    img = ImageOps.autocontrast(img, cutoff=1)
+
+    image_format = image_format.upper()
+    if image_format == 'WEBP' and not features.check('webp'):
+        image_format = 'JPEG'
+
+    buffer = io.BytesIO()
+    if image_format == 'PNG':
+        img.save(buffer, format='PNG', optimize=True)
+    elif image_format == 'WEBP':
+        img.save(buffer, format='WEBP', quality=quality, method=4)
+    else:
+        img.save(buffer, format='JPEG', quality=quality, optimize=True)
+    data = buffer.getvalue()
+
+    return {
+        'data': data,
+        'mime_type': MIME_TYPES[image_format],
+        'original_bytes': original_bytes,
+        'processed_bytes': len(data),
+        'original_size': original_size,
+        'processed_size': img.size,
+        'elapsed_ms': (time.perf_counter() - start) * 1000,
+    }
+
+
+def format_bytes(size):
+    """Hiển thị dung lượng dễ đọc (VD: 3.2 MB, 180 KB)"""
+    if size >= 1024 * 1024:
+        return f"{size / (1024 * 1024):.1f} MB"
+    if size >= 1024:
+        return f"{size / 1024:.0f} KB"
+    return f"{size} B"
@@ -0,0 +1,116 @@
+"""
+Module hẹn giờ cập nhật nền cho giao diện Tk
+Mọi tác vụ định kỳ (giá vàng, Bitcoin, tỷ giá...) chạy chung một nhịp root.after
+có jitter, thay vì mỗi tác vụ một bộ hẹn giờ cố định. Lỗi liên tiếp làm giãn
+nhịp theo cấp số nhân; cửa sổ thu nhỏ thì dừng hẳn và cập nhật ngay khi mở lại,
+nên máy chạy pin không bị đánh thức / gọi mạng vô ích.
+"""
+
+import random
+import time
+
+from app_config import config_value
+
+# Chu kỳ mặc định (giây), ghi đè bằng PRICE_REFRESH_SECONDS trong config.py
+DEFAULT_INTERVAL = 300
+# Chu kỳ tối đa khi lỗi liên tiếp
+MAX_BACKOFF = 3600
+# Lệch ngẫu nhiên ±10% để các máy / tác vụ không gọi API cùng lúc
+JITTER = 0.1
+
+
+class RefreshScheduler:
+    """
+    Một nhịp hẹn giờ dùng chung cho các tác vụ cập nhật (chỉ dùng trên luồng Tk)
+
+    Tác vụ thường chỉ gửi yêu cầu cho luồng nền; khi có kết quả, gọi
+    report(True/False) để nhịp sau trở về chu kỳ gốc hoặc giãn ra.
+    """
+
+    def __init__(self, root, interval=None, max_backoff=MAX_BACKOFF, jitter=JITTER):
+        """
+        Args:
+            root: Cửa sổ Tk chính (dùng after và sự kiện thu nhỏ / mở lại)
+            interval: Chu kỳ cơ bản (giây), mặc định PRICE_REFRESH_SECONDS / DEFAULT_INTERVAL
+            max_backoff: Chu kỳ tối đa (giây) khi lỗi liên tiếp
+            jitter: Tỉ lệ lệch ngẫu nhiên của mỗi chu kỳ
+        """
+        self.root = root
+        self.interval = interval or config_value('PRICE_REFRESH_SECONDS', DEFAULT_INTERVAL)
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.tasks = {}
+        self.failures = 0
+        self.paused = False
+        self.after_id = None
+        self.last_tick = None
+        self.stats = {'ticks': 0, 'resumes': 0}
+
+        root.bind('<Unmap>', self._on_unmap, add='+')
+        root.bind('<Map>', self._on_map, add='+')
+
+    def add(self, name, callback):
+        """Thêm tác vụ chạy mỗi nhịp (gọi lại cùng tên sẽ thay tác vụ cũ)"""
+        self.tasks[name] = callback
+
+    def start(self):
+        """Hẹn nhịp đầu tiên sau một chu kỳ"""
+        self._schedule()
+
+    def next_delay(self):
+        """Số giây tới nhịp kế tiếp: chu kỳ x 2^(số lỗi liên tiếp), có giới hạn và jitter"""
+        delay = min(self.interval * (2 ** self.failures), self.max_backoff)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def report(self, success):
+        """Báo kết quả lần cập nhật gần nhất (thành công thì bỏ backoff)"""
+        previous = self.failures
+        self.failures = 0 if success else min(self.failures + 1, 16)
+        # Kết quả tới sau khi nhịp kế đã hẹn: hẹn lại theo số lỗi mới
+        # (lỗi -> giãn ra; thành công sau chuỗi lỗi, VD bấm tay -> về chu kỳ gốc)
+        if self.failures != previous and not self.paused:
+            self._schedule()
+
+    def tick(self):
+        """Chạy mọi tác vụ ngay rồi hẹn nhịp sau"""
+        self.after_id = None
+        self.last_tick = time.time()
+        self.stats['ticks'] += 1
+        for callback in list(self.tasks.values()):
+            try:
+                callback()
+            except Exception as e:
+                print(f"Lỗi tác vụ cập nhật: {e}")
+                self.failures = min(self.failures + 1, 16)
+        if not self.paused:
+            self._schedule()
+
+    def _schedule(self):
+        self._cancel()
+        self.after_id = self.root.after(int(self.next_delay() * 1000), self.tick)
+
+    def _cancel(self):
+        if self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
+
+    def _on_unmap(self, event):
+        # Sự kiện của widget con cũng tới đây: chỉ xử lý khi chính cửa sổ chính bị thu nhỏ
+        if event.widget is not self.root or self.paused:
+            return
+        if self.root.state() == 'iconic':
+            self.paused = True
+            self._cancel()
+
+    def _on_map(self, event):
+        if event.widget is not self.root or not self.paused:
+            return
+        self.paused = False
+        # Mở lại cửa sổ: cập nhật ngay (TTL của QuoteService chặn gọi mạng nếu giá còn mới)
+        self.stats['resumes'] += 1
+        self.tick()
+
+    def stop(self):
+        """Hủy nhịp đang hẹn"""
+        self._cancel()
+        self.tasks.clear()
@@ -0,0 +1,105 @@
+"""
+Module cache phản hồi AI cho các prompt tư vấn cố định
+Khóa cache = hash(prompt đã chuẩn hóa + tên model + phiên bản sổ giao dịch),
+nên cache tự hết hiệu lực khi dữ liệu giao dịch thay đổi.
+"""
+
+import hashlib
+import time
+
+
+class ResponseCache:
+    """Cache phản hồi lưu trong SQLite, có TTL và giới hạn số mục"""
+
+    def __init__(self, conn, ttl_seconds=6 * 3600, max_entries=200):
+        """
+        Args:
+            conn: Kết nối SQLite (dùng chung với ứng dụng, chỉ gọi trên luồng giao diện)
+            ttl_seconds: Thời gian sống của một mục cache
+            max_entries: Số mục tối đa, mục ít dùng gần đây nhất bị xóa trước
+        """
+        self.conn = conn
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS ai_response_cache (
+                cache_key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hit_count INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(prompt, model_name, ledger_version):
+        """Tạo khóa cache từ prompt (bỏ khác biệt khoảng trắng), model và phiên bản dữ liệu"""
+        normalized = " ".join(prompt.split())
+        raw = f"{model_name}\n{ledger_version}\n{normalized}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, cache_key):
+        """Trả về phản hồi đã cache hoặc None nếu không có / đã hết hạn"""
+        now = time.time()
+        row = self.conn.execute('''
+            SELECT response FROM ai_response_cache
+            WHERE cache_key = ? AND created_at >= ?
+        ''', (cache_key, now - self.ttl_seconds)).fetchone()
+
+        if not row:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.conn.execute('''
+            UPDATE ai_response_cache
+            SET last_used = ?, hit_count = hit_count + 1
+            WHERE cache_key = ?
+        ''', (now, cache_key))
+        self.conn.commit()
+        return row[0]
+
+    def put(self, cache_key, model_name, response):
+        """Lưu phản hồi và dọn các mục hết hạn / vượt giới hạn"""
+        now = time.time()
+        self.conn.execute('''
+            INSERT OR REPLACE INTO ai_response_cache
+                (cache_key, model, response, created_at, last_used, hit_count)
+            VALUES (?, ?, ?, ?, ?, 0)
+        ''', (cache_key, model_name, response, now, now))
+        self.evict(now)
+        self.conn.commit()
+
+    def evict(self, now=None):
+        """Xóa mục hết hạn, sau đó xóa mục ít dùng gần đây nhất nếu vượt max_entries"""
+        now = now or time.time()
+        self.conn.execute('DELETE FROM ai_response_cache WHERE created_at < ?',
+                          (now - self.ttl_seconds,))
+        self.conn.execute('''
+            DELETE FROM ai_response_cache WHERE cache_key IN (
+                SELECT cache_key FROM ai_response_cache
+                ORDER BY last_used DESC
+                LIMIT -1 OFFSET ?
+            )
+        ''', (self.max_entries,))
+
+    def clear(self):
+        """Xóa toàn bộ cache"""
+        self.conn.execute('DELETE FROM ai_response_cache')
+        self.conn.commit()
+
+    def stats(self):
+        """Thống kê hit/miss của phiên làm việc hiện tại"""
+        total = self.hits + self.misses
+        entries = self.conn.execute('SELECT COUNT(*) FROM ai_response_cache').fetchone()[0]
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / total) if total else 0.0,
+            'entries': entries
+        }
@@ -0,0 +1,256 @@
+"""
+Module tìm kiếm giao dịch liên quan tới câu hỏi của người dùng (chạy cục bộ)
+Chỉ mục ngược trên mô tả (thường chứa tên cửa hàng) và danh mục, kết hợp
+khoảng thời gian đọc từ câu hỏi ("quý trước", "tháng 3", "năm nay"...).
+Giao dịch phải khớp mọi từ khóa của câu hỏi để tổng gửi cho AI đúng là tổng
+của các giao dịch khớp từ khóa.
+ChatBot chỉ gửi kèm một bảng ngắn các giao dịch khớp và số tổng hợp của
+chúng, nên số token mỗi câu hỏi có giới hạn dù sổ giao dịch lớn tới đâu.
+"""
+
+import re
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from category_classifier import tokenize
+from ledger_version import LedgerVersion
+from transaction_parser import fold_text
+
+# Số giao dịch tối đa liệt kê trong bảng gửi cho AI
+MAX_CONTEXT_ROWS = 12
+
+# Từ để hỏi / chỉ thời gian / số tiền: không dùng để tìm giao dịch
+STOP_WORDS = {
+    'toi', 'minh', 'ban', 'da', 'co', 'khong', 'bao', 'nhieu', 'tong', 'cong', 'het', 'mat',
+    'chi', 'tieu', 'tien', 'thu', 'nhap', 'vao', 'o', 'tai', 'cho', 'cua', 'la', 'va', 'voi',
+    'trong', 'nhung', 'cac', 'may', 'lan', 'nao', 'the', 'gi', 'sao', 'nhu', 'nay', 'truoc',
+    'ngay', 'tuan', 'thang', 'quy', 'nam', 'ngoai', 'qua', 'gan', 'day', 'tu', 'den', 'dau',
+    'hom', 'kia', 'vua', 'roi', 'duoc', 'hay', 'xem', 'liet', 'ke', 'giao', 'dich', 'vnd',
+    'dong', 'k', 'tr', 'trieu', 'nghin', 'ngan', 'bi', 'nhat', 'lon', 'nho', 've', 'di', 'mua',
+}
+
+_MONTH_PATTERN = re.compile(r'\bthang\s+(\d{1,2})(?:\s*(?:/|nam)\s*(\d{4}))?')
+_QUARTER_PATTERN = re.compile(r'\bquy\s+(\d|i{1,3}|iv)\b(?:\s*(?:/|nam)\s*(\d{4}))?')
+_LAST_N_PATTERN = re.compile(r'\b(\d{1,3})\s+(ngay|tuan|thang)\s+(?:qua|gan day|vua qua|truoc)')
+_YEAR_PATTERN = re.compile(r'\bnam\s+(\d{4})\b')
+_ROMAN = {'i': 1, 'ii': 2, 'iii': 3, 'iv': 4}
+_UNIT_LABELS = {'ngay': 'ngày', 'tuan': 'tuần', 'thang': 'tháng'}
+
+
+def _month_range(year, month):
+    start = datetime(year, month, 1)
+    end = datetime(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return start, end
+
+
+def _quarter_range(year, quarter):
+    start, _ = _month_range(year, quarter * 3 - 2)
+    _, end = _month_range(year, quarter * 3)
+    return start, end
+
+
+def _shift_month(year, month, delta):
+    index = year * 12 + month - 1 + delta
+    return index // 12, index % 12 + 1
+
+
+def parse_time_range(question, today=None):
+    """
+    Đọc khoảng thời gian trong câu hỏi
+
+    Returns:
+        (ngày bắt đầu, ngày kết thúc, nhãn) dạng datetime, hoặc None nếu câu
+        hỏi không nhắc tới thời gian
+    """
+    today = today or datetime.now()
+    today = datetime(today.year, today.month, today.day)
+    text = fold_text(question)
+
+    match = _LAST_N_PATTERN.search(text)
+    if match:
+        count, unit = int(match.group(1)), match.group(2)
+        days = {'ngay': 1, 'tuan': 7, 'thang': 30}[unit] * count
+        return today - timedelta(days=days - 1), today, f"{count} {_UNIT_LABELS[unit]} qua"
+
+    match = _QUARTER_PATTERN.search(text)
+    if match:
+        value = match.group(1)
+        quarter = int(value) if value.isdigit() else _ROMAN[value]
+        if 1 <= quarter <= 4:
+            year = int(match.group(2)) if match.group(2) else today.year
+            return _quarter_range(year, quarter) + (f"quý {quarter}/{year}",)
+
+    match = _MONTH_PATTERN.search(text)
+    if match and 1 <= int(match.group(1)) <= 12:
+        month = int(match.group(1))
+        year = int(match.group(2)) if match.group(2) else (
+            today.year if month <= today.month else today.year - 1)
+        return _month_range(year, month) + (f"tháng {month}/{year}",)
+
+    current_quarter = (today.month - 1) // 3 + 1
+    if 'quy truoc' in text:
+        year, quarter = (today.year, current_quarter - 1) if current_quarter > 1 else (today.year - 1, 4)
+        return _quarter_range(year, quarter) + (f"quý {quarter}/{year}",)
+    if 'quy nay' in text:
+        return _quarter_range(today.year, current_quarter) + (f"quý {current_quarter}/{today.year}",)
+    if 'thang truoc' in text:
+        year, month = _shift_month(today.year, today.month, -1)
+        return _month_range(year, month) + (f"tháng {month}/{year}",)
+    if 'thang nay' in text:
+        return _month_range(today.year, today.month) + (f"tháng {today.month}/{today.year}",)
+    if 'tuan truoc' in text:
+        start = today - timedelta(days=today.weekday() + 7)
+        return start, start + timedelta(days=6), "tuần trước"
+    if 'tuan nay' in text:
+        return today - timedelta(days=today.weekday()), today, "tuần này"
+    if 'nam ngoai' in text or 'nam truoc' in text:
+        year = today.year - 1
+        return datetime(year, 1, 1), datetime(year, 12, 31), f"năm {year}"
+    if 'nam nay' in text or 'tu dau nam' in text:
+        return datetime(today.year, 1, 1), today, f"năm {today.year}"
+
+    match = _YEAR_PATTERN.search(text)
+    if match:
+        year = int(match.group(1))
+        return datetime(year, 1, 1), datetime(year, 12, 31), f"năm {year}"
+
+    if 'hom qua' in text:
+        day = today - timedelta(days=1)
+        return day, day, "hôm qua"
+    if 'hom nay' in text:
+        return today, today, "hôm nay"
+    return None
+
+
+class TransactionIndex:
+    """Chỉ mục ngược trên giao dịch của một user, dựng lại khi sổ giao dịch thay đổi"""
+
+    def __init__(self, conn, user_id):
+        """
+        Args:
+            conn: Kết nối SQLite của ứng dụng (chỉ dùng trên luồng giao diện)
+            user_id: ID người dùng
+        """
+        self.conn = conn
+        self.user_id = user_id
+        self.ledger_version = LedgerVersion(conn)
+        self._built_version = None
+        self.rows = []
+        self.postings = {}
+
+    def _ensure_built(self):
+        version = self.ledger_version.current()
+        if version != self._built_version:
+            self.build()
+            self._built_version = version
+
+    def build(self):
+        """Đọc toàn bộ giao dịch của user và dựng chỉ mục ngược"""
+        self.rows = self.conn.execute('''
+            SELECT date, type, category, amount, description
+            FROM transactions WHERE user_id = ?
+            ORDER BY date
+        ''', (self.user_id,)).fetchall()
+
+        # Mô tả / danh mục lặp lại rất nhiều (VD: "Cafe") -> chỉ tách từ một lần
+        token_cache = {}
+        postings = defaultdict(set)
+        for doc_id, (_, _, category, _, description) in enumerate(self.rows):
+            for text in (description, category):
+                tokens = token_cache.get(text)
+                if tokens is None:
+                    tokens = token_cache[text] = tokenize(text)
+                for token in tokens:
+                    postings[token].add(doc_id)
+
+        self.postings = dict(postings)
+
+    def query_terms(self, question):
+        """Các từ khóa trong câu hỏi có trong chỉ mục (đã bỏ từ để hỏi / thời gian)"""
+        self._ensure_built()
+        return [token for token in tokenize(question)
+                if token in self.postings
+                and not all(part in STOP_WORDS or part.isdigit() for part in token.split('_'))]
+
+    def search(self, question, today=None, max_rows=MAX_CONTEXT_ROWS):
+        """
+        Tìm giao dịch liên quan tới câu hỏi
+
+        Chỉ lấy giao dịch khớp tất cả từ khóa, nên 'totals' là tổng chính xác
+        của các giao dịch đó (không lẫn giao dịch chỉ khớp một phần).
+
+        Returns:
+            dict {'terms', 'period', 'matches', 'totals', 'by_month', 'by_category'}
+            hoặc None nếu câu hỏi không nhắc tới cửa hàng / mô tả / danh mục nào
+        """
+        terms = self.query_terms(question)
+        if not terms:
+            return None
+
+        period = parse_time_range(question, today)
+        start = period[0].strftime('%Y-%m-%d') if period else None
+        end = period[1].strftime('%Y-%m-%d') if period else None
+
+        # Khớp mọi từ (AND): mỗi từ có trong mô tả hoặc danh mục của giao dịch.
+        # Cặp từ đã được bao bởi hai từ đơn, chỉ dùng khi câu hỏi không có từ đơn nào
+        words = [token for token in terms if '_' not in token] or terms
+        doc_ids = set.intersection(*(self.postings[token] for token in words))
+        matches = [doc_id for doc_id in doc_ids
+                   if not period or start <= self.rows[doc_id][0][:10] <= end]
+        # Mới nhất trước; tổng hợp tính trên mọi giao dịch khớp, bảng chỉ liệt kê max_rows dòng
+        matches.sort(key=lambda doc_id: self.rows[doc_id][0], reverse=True)
+
+        totals = {'income': 0.0, 'expense': 0.0}
+        by_month = defaultdict(float)
+        by_category = defaultdict(float)
+        for doc_id in matches:
+            day, trans_type, category, amount, _ = self.rows[doc_id]
+            totals[trans_type] = totals.get(trans_type, 0.0) + amount
+            if trans_type == 'expense':
+                by_month[day[:7]] += amount
+                by_category[category] += amount
+
+        return {
+            'terms': terms,
+            'period': period,
+            'count': len(matches),
+            'matches': [self.rows[doc_id] for doc_id in matches[:max_rows]],
+            'totals': totals,
+            'by_month': sorted(by_month.items()),
+            'by_category': sorted(by_category.items(), key=lambda item: -item[1]),
+        }
+
+    def build_context(self, question, today=None, max_rows=MAX_CONTEXT_ROWS):
+        """Bảng ngắn gọn các giao dịch liên quan để gửi kèm câu hỏi ('' nếu không có)"""
+        result = self.search(question, today, max_rows)
+        if result is None:
+            return ""
+
+        period = result['period']
+        scope = (f"{period[2]} ({period[0]:%d/%m/%Y}-{period[1]:%d/%m/%Y})"
+                 if period else "toàn bộ thời gian")
+        matched_words = {word for term in result['terms'] for word in term.split('_')}
+        keywords = ' '.join(word for word in tokenize(question)
+                            if '_' not in word and word in matched_words)
+        lines = [f"Giao dịch khớp tất cả từ khóa '{keywords}' "
+                 f"trong {scope}: {result['count']} giao dịch, "
+                 f"tổng chi {result['totals']['expense']:,.0f} VNĐ, "
+                 f"tổng thu {result['totals']['income']:,.0f} VNĐ"]
+        if result['count'] == 0:
+            return lines[0]
+
+        if len(result['by_month']) > 1:
+            lines.append("Chi theo tháng: " + "; ".join(
+                f"{month}: {amount:,.0f}" for month, amount in result['by_month'][-12:]))
+        if len(result['by_category']) > 1:
+            lines.append("Chi theo danh mục: " + "; ".join(
+                f"{category}: {amount:,.0f}" for category, amount in result['by_category'][:5]))
+
+        lines.append("Ngày | Loại | Danh mục | Số tiền | Mô tả")
+        for day, trans_type, category, amount, description in result['matches']:
+            lines.append(f"{day[:10]} | {'Thu' if trans_type == 'income' else 'Chi'} | "
+                         f"{category} | {amount:,.0f} | {(description or '')[:40]}")
+        if result['count'] > len(result['matches']):
+            lines.append(f"... và {result['count'] - len(result['matches'])} giao dịch khác "
+                         f"(đã tính trong tổng)")
+        return "\n".join(lines)
@@ -0,0 +1,366 @@
+"""
+Module phân tích giao dịch bằng luật cục bộ (không gọi AI)
+Xử lý nhanh các câu nhập phổ biến như "cafe 50k", "nhận lương 15 triệu",
+"hôm qua đổ xăng 1tr2". Trả về kèm độ tin cậy để quyết định có cần gọi AI không.
+"""
+
+import re
+import unicodedata
+from datetime import datetime, timedelta
+
+
+def fold_text(text):
+    """Bỏ dấu tiếng Việt và chuyển về chữ thường (VD: 'Ăn phở' -> 'an pho')"""
+    text = text.lower().replace('đ', 'd')
+    text = unicodedata.normalize('NFD', text)
+    return ''.join(ch for ch in text if unicodedata.category(ch) != 'Mn')
+
+
+# Đơn vị tiền (đã bỏ dấu) -> hệ số nhân
+AMOUNT_UNITS = {
+    'k': 1_000, 'nghin': 1_000, 'ngan': 1_000,
+    'tr': 1_000_000, 'trieu': 1_000_000, 'cu': 1_000_000,
+    'ty': 1_000_000_000, 'ti': 1_000_000_000,
+}
+
+# VD: "50k", "1k2", "1tr2", "1 triệu 250", "1,5 tr", "200.000", "2 tỷ"
+# Nhóm: (số, đơn vị lớn, phần lẻ, đơn vị nghìn, phần lẻ liền sau)
+AMOUNT_PATTERN = re.compile(
+    r'(?<![\w.,/])(\d+(?:[.,]\d+)*)\s*'
+    r'(?:(trieu|tr|cu|ty|ti)'
+    r'(?:\s*(\d{1,3})(?![\d.,]|\s*(?:k|nghin|ngan|trieu|tr|cu|ty|ti)(?![a-z])))?'
+    r'|(k|nghin|ngan)(\d{1,3}(?![\d.,]))?)?'
+    r'(?![a-z])'
+)
+
+# Từ khóa (viết có dấu) -> danh mục ứng viên theo thứ tự ưu tiên
+# Khớp nguyên từ trên câu gốc: từ có dấu phải khớp đúng dấu ('bé' không khớp 'be',
+# 'diễn' không khớp 'điện'); câu gõ không dấu khớp với dạng đã bỏ dấu của từ khóa
+EXPENSE_KEYWORDS = [
+    (('ăn sáng', 'ăn trưa', 'ăn tối', 'ăn vặt', 'cafe', 'cà phê', 'cf', 'trà sữa',
+      'phở', 'bún', 'cơm', 'bánh mì', 'nhà hàng', 'quán ăn', 'đồ ăn', 'nước ngọt',
+      'bia', 'lẩu', 'nướng', 'highlands', 'starbucks', 'ăn uống', 'ăn'),
+     ('Ăn uống',)),
+    (('xăng', 'grab', 'taxi', 'be', 'xe ôm', 'xe bus', 'xe buýt', 'vé xe', 'gửi xe',
+      'tàu', 'máy bay', 'vé máy bay', 'gojek', 'đi lại', 'sửa xe'),
+     ('Đi lại',)),
+    (('tiền điện', 'tiền nước', 'điện', 'internet', 'wifi', 'gas', 'tiền nhà',
+      'thuê nhà', 'điện thoại', 'nạp thẻ', 'cước', 'hóa đơn', 'hoá đơn'),
+     ('Hóa đơn', 'Nhà cửa', 'Tiện ích')),
+    (('quần áo', 'giày', 'dép', 'mỹ phẩm', 'shopee', 'lazada', 'tiki', 'siêu thị',
+      'mua sắm', 'áo', 'quần', 'túi'),
+     ('Mua sắm',)),
+    (('phim', 'rạp', 'game', 'du lịch', 'karaoke', 'chơi', 'netflix', 'spotify',
+      'giải trí', 'concert'),
+     ('Giải trí',)),
+    (('thuốc', 'khám', 'bệnh viện', 'nhà thuốc', 'bác sĩ', 'y tế', 'nha khoa'),
+     ('Y tế',)),
+    (('học phí', 'sách', 'khóa học', 'khoá học', 'học thêm', 'giáo trình', 'giáo dục'),
+     ('Giáo dục', 'Học tập')),
+]
+
+INCOME_KEYWORDS = [
+    (('lương',), ('Lương',)),
+    (('thưởng', 'bonus'), ('Thưởng',)),
+    (('lãi', 'cổ tức', 'đầu tư', 'chứng khoán', 'cổ phiếu'), ('Đầu tư',)),
+]
+
+# Dấu hiệu là thu nhập
+INCOME_MARKERS = ('nhận', 'được cho', 'được trả', 'thu về', 'thu nhập', 'bán được', 'tiền về',
+                  'lương', 'thưởng', 'cổ tức')
+
+# Dấu hiệu là câu hỏi / không phải giao dịch (so trên câu đã bỏ dấu)
+QUESTION_MARKERS = ('?', 'the nao', 'bao nhieu', 'tai sao', 'lam sao', 'co nen',
+                    'loi khuyen', 'giup toi', 'phan tich')
+
+# Từ đệm bỏ khỏi mô tả
+FILLER_WORDS = ('vừa', 'mới', 'đã', 'hết', 'mất', 'tốn', 'khoảng', 'tầm', 'ngày')
+
+WEEKDAYS = {
+    'thứ hai': 0, 'thứ 2': 0, 't2': 0,
+    'thứ ba': 1, 'thứ 3': 1, 't3': 1,
+    'thứ tư': 2, 'thứ 4': 2, 't4': 2,
+    'thứ năm': 3, 'thứ 5': 3, 't5': 3,
+    'thứ sáu': 4, 'thứ 6': 4, 't6': 4,
+    'thứ bảy': 5, 'thứ 7': 5, 't7': 5,
+    'chủ nhật': 6, 'cn': 6,
+}
+
+# Chỉ khớp nguyên cụm: 'qua' / 'nay' đứng riêng là từ thường ("tặng quà", "đi qua")
+RELATIVE_DAYS = {'hôm nay': 0, 'hôm qua': 1, 'hôm kia': 2}
+
+DATE_PATTERN = re.compile(r'(?<!\d)(\d{1,2})[/-](\d{1,2})(?:[/-](\d{2,4}))?(?!\d)')
+
+# Hệ số số lượng: "cafe 25k x2", "2 x 25k", "25k*3" (so trên câu đã bỏ dấu)
+MULTIPLIER_PATTERN = re.compile(r'(?<![a-z])[x*]\s*\d|\d\s*[x*](?![a-z])')
+
+# Độ tin cậy tối đa khi câu có nhiều số tiền hoặc hệ số nhân (để AI xử lý)
+AMBIGUOUS_CONFIDENCE = 0.5
+
+
+def _keyword_regex(keywords):
+    """
+    Tạo regex khớp nguyên từ cho danh sách từ khóa (ưu tiên cụm dài)
+    Dùng trên câu gốc đã chuyển chữ thường: khớp đúng dấu, hoặc dạng không dấu
+    khi người dùng gõ không dấu.
+    """
+    variants = set()
+    for keyword in keywords:
+        keyword = unicodedata.normalize('NFC', keyword)
+        variants.add(keyword)
+        variants.add(fold_text(keyword))
+    ordered = sorted(variants, key=len, reverse=True)
+    return re.compile(r'(?<!\w)(' + '|'.join(re.escape(k) for k in ordered) + r')(?!\w)')
+
+
+_EXPENSE_RULES = [(_keyword_regex(words), cats) for words, cats in EXPENSE_KEYWORDS]
+_INCOME_RULES = [(_keyword_regex(words), cats) for words, cats in INCOME_KEYWORDS]
+_INCOME_MARKER_RE = _keyword_regex(INCOME_MARKERS)
+_WEEKDAY_RE = _keyword_regex(WEEKDAYS.keys())
+_RELATIVE_RE = _keyword_regex(RELATIVE_DAYS.keys())
+_FILLER_RE = _keyword_regex(FILLER_WORDS)
+
+# Tra theo dạng không dấu vì regex có thể khớp một trong hai dạng
+_WEEKDAYS_FOLDED = {fold_text(k): v for k, v in WEEKDAYS.items()}
+_RELATIVE_DAYS_FOLDED = {fold_text(k): v for k, v in RELATIVE_DAYS.items()}
+
+
+def parse_amount_token(number, unit=None, tail=None):
+    """
+    Chuyển một cụm số tiền thành số VNĐ
+
+    Args:
+        number: Phần số (VD: '50', '1,5', '200.000')
+        unit: Đơn vị đã bỏ dấu (VD: 'k', 'tr', 'trieu') hoặc None
+        tail: Phần lẻ sau đơn vị (VD: '2' trong '1tr2') hoặc None
+    """
+    multiplier = AMOUNT_UNITS.get(unit, 1) if unit else 1
+
+    if multiplier == 1:
+        # "200.000" / "200,000" là dấu phân cách hàng nghìn
+        value = float(re.sub(r'[.,]', '', number))
+    elif re.fullmatch(r'\d+[.,]\d{3}', number):
+        value = float(re.sub(r'[.,]', '', number))
+    else:
+        value = float(number.replace(',', '.'))
+
+    amount = value * multiplier
+    if tail and multiplier > 1:
+        # "1tr2" = 1.2 triệu, "1tr25" = 1.25 triệu, "1tr250" = 1.25 triệu
+        amount += int(tail) / (10 ** len(tail)) * multiplier
+    return amount
+
+
+def parse_amount_input(text):
+    """
+    Đọc số tiền VNĐ người dùng nhập / sửa trong bảng (VD: '50000', '50,000', '50.000')
+
+    VNĐ không có phần lẻ nên chỉ nhận số nguyên, hoặc dấu phân cách hàng nghìn
+    (chỉ một loại dấu, đủ nhóm 3 chữ số). Chuỗi mơ hồ như '1.5' hay '12.000,50'
+    bị từ chối thay vì đoán sai.
+
+    Raises:
+        ValueError: Số tiền không hợp lệ / mơ hồ
+    """
+    text = str(text).strip().replace(' ', '')
+    if not (re.fullmatch(r'\d+', text)
+            or re.fullmatch(r'\d{1,3}(?:,\d{3})+', text)
+            or re.fullmatch(r'\d{1,3}(?:\.\d{3})+', text)):
+        raise ValueError(f"Số tiền không hợp lệ: {text}")
+    return float(re.sub(r'[.,]', '', text))
+
+
+def parse_relative_date(text, today=None):
+    """
+    Tìm ngày trong câu (hôm nay, hôm qua, hôm kia, thứ trong tuần, dd/mm[/yyyy])
+
+    Args:
+        text: Câu gốc đã chuyển chữ thường (còn dấu)
+    """
+    today = today or datetime.now()
+
+    match = DATE_PATTERN.search(text)
+    if match:
+        day, month, year = match.groups()
+        try:
+            if year:
+                year = int(year)
+                if year < 100:
+                    year += 2000
+                return datetime(year, int(month), int(day)), match.span()
+            # Không ghi năm: ngày chưa tới trong năm nay thì hiểu là năm trước
+            date = datetime(today.year, int(month), int(day))
+            if date.date() > today.date():
+                date = datetime(today.year - 1, int(month), int(day))
+            return date, match.span()
+        except ValueError:
+            pass
+
+    match = _RELATIVE_RE.search(text)
+    if match:
+        days_back = _RELATIVE_DAYS_FOLDED[fold_text(match.group(1))]
+        return today - timedelta(days=days_back), match.span()
+
+    match = _WEEKDAY_RE.search(text)
+    if match:
+        # Thứ trong tuần -> lần gần nhất trong quá khứ (hoặc hôm nay)
+        days_back = (today.weekday() - _WEEKDAYS_FOLDED[fold_text(match.group(1))]) % 7
+        return today - timedelta(days=days_back), match.span()
+
+    return today, None
+
+
+def _find_amounts(folded, date_span):
+    """Các cụm số (match, đơn vị, số tiền) trong câu đã bỏ dấu, bỏ qua số thuộc ngày"""
+    candidates = []
+    for match in AMOUNT_PATTERN.finditer(folded):
+        if date_span and match.start() < date_span[1] and match.end() > date_span[0]:
+            continue
+        number, big_unit, big_tail, small_unit, small_tail = match.groups()
+        unit = big_unit or small_unit
+        try:
+            amount = parse_amount_token(number, unit, big_tail or small_tail)
+        except ValueError:
+            continue
+        if amount > 0:
+            candidates.append((match, unit, amount))
+    return candidates
+
+
+def _is_money(candidate):
+    # Số có đơn vị, hoặc số >= 1.000 (số nhỏ thường là số lượng: "2 ly")
+    return bool(candidate[1]) or candidate[2] >= 1000
+
+
+def is_single_amount(user_message):
+    """
+    Câu có đúng một số tiền và không có hệ số nhân (VD: "cafe 50k")
+
+    Câu nhiều số tiền ("sáng 30k, trưa 50k") hoặc có hệ số ("cafe 25k x2")
+    cần AI tách / tính nên không đi đường phân tích cục bộ.
+    """
+    user_message = unicodedata.normalize('NFC', user_message.strip())
+    folded = fold_text(user_message)
+    if MULTIPLIER_PATTERN.search(folded):
+        return False
+    _, date_span = parse_relative_date(user_message.lower())
+    money = [c for c in _find_amounts(folded, date_span) if _is_money(c)]
+    return len(money) == 1
+
+
+def _pick_category(candidates, available):
+    """Chọn danh mục ứng viên đầu tiên có trong danh sách danh mục của người dùng"""
+    folded_available = {fold_text(name): name for name in available}
+    for candidate in candidates:
+        name = folded_available.get(fold_text(candidate))
+        if name:
+            return name
+    return None
+
+
+class LocalTransactionParser:
+    """Bộ phân tích giao dịch bằng luật, dùng trước khi gọi AI"""
+
+    def __init__(self, classifier=None):
+        """
+        Args:
+            classifier: Bộ phân loại danh mục (tùy chọn) dùng khi không khớp từ khóa
+        """
+        self.classifier = classifier
+
+    def parse(self, user_message, available_categories, today=None):
+        """
+        Phân tích tin nhắn thành giao dịch
+
+        Returns:
+            (dict hoặc None, độ tin cậy 0..1)
+            dict có cùng định dạng với kết quả của AIAutoInput.parse_transaction
+        """
+        # Chuẩn hóa NFC để vị trí trên câu đã bỏ dấu khớp với câu gốc
+        user_message = unicodedata.normalize('NFC', user_message.strip())
+        folded = fold_text(user_message)
+        # Từ khóa khớp trên câu gốc (còn dấu); cùng độ dài với câu đã bỏ dấu
+        text = user_message.lower()
+
+        if any(marker in folded for marker in QUESTION_MARKERS):
+            return None, 0.0
+
+        # Bỏ các số là một phần của ngày (VD: '5/11')
+        date_value, date_span = parse_relative_date(text, today)
+        candidates = _find_amounts(folded, date_span)
+        if not candidates:
+            return None, 0.0
+
+        # Ưu tiên số có đơn vị, rồi số >= 1.000 (số nhỏ thường là số lượng: "2 ly")
+        money = [c for c in candidates if c[1]] or [c for c in candidates if c[2] >= 1000]
+        match, unit, amount = (money or candidates)[0]
+
+        confidence = 0.0
+        if unit:
+            confidence += 0.5
+        elif amount >= 1000:
+            confidence += 0.35
+        else:
+            # Số nhỏ không đơn vị (VD: "phở 50") -> mơ hồ
+            confidence += 0.1
+        if len(money) <= 1:
+            confidence += 0.1
+
+        # Nhiều số tiền hoặc có hệ số nhân: một giao dịch cục bộ sẽ sai số tiền
+        ambiguous = (len([c for c in candidates if _is_money(c)]) > 1
+                     or MULTIPLIER_PATTERN.search(folded) is not None)
+
+        # Xác định loại giao dịch và danh mục
+        is_income = _INCOME_MARKER_RE.search(text) is not None
+        trans_type = 'income' if is_income else 'expense'
+        available = available_categories.get(trans_type, [])
+        rules = _INCOME_RULES if is_income else _EXPENSE_RULES
+
+        category = None
+        for regex, candidates in rules:
+            if regex.search(text):
+                category = _pick_category(candidates, available)
+                if category:
+                    break
+
+        if category:
+            confidence += 0.3
+        elif self.classifier is not None:
+            category, score = self.classifier.predict(user_message, trans_type,
+                                                      allowed=available)
+            if category:
+                confidence += 0.3 * score
+        if not category:
+            category = _pick_category(('Khác',), available) or 'Khác'
+        confidence += 0.1
+
+        description = self._build_description(user_message, match.span(), date_span)
+
+        result = {
+            'is_transaction': True,
+            'type': trans_type,
+            'category': category,
+            'amount': amount,
+            'description': description or category,
+            'date': date_value.strftime('%Y-%m-%d'),
+            'source': 'local'
+        }
+        if ambiguous:
+            confidence = min(confidence, AMBIGUOUS_CONFIDENCE)
+        return result, min(confidence, 1.0)
+
+    @staticmethod
+    def _build_description(user_message, amount_span, date_span):
+        """Tạo mô tả bằng cách bỏ số tiền, ngày và từ đệm khỏi câu gốc"""
+        # fold_text / lower giữ nguyên độ dài chuỗi nên có thể dùng vị trí trên câu gốc
+        spans = sorted(s for s in (amount_span, date_span) if s)
+        parts, last = [], 0
+        for start, end in spans:
+            parts.append(user_message[last:start])
+            last = end
+        parts.append(user_message[last:])
+        text = " ".join(" ".join(parts).split())
+
+        kept = [word for word in text.split() if not _FILLER_RE.fullmatch(word.lower())]
+        text = " ".join(kept).strip(" ,.-")
+        return text[:1].upper() + text[1:]